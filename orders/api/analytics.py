@@ -0,0 +1,200 @@
+import datetime
+import math
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from api.models import Order, HourlySales, DailySales
+from api.totals import ORDER_PRICE, ORDER_SHOP
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+GROUPS = ('day', 'hour', 'product', 'city')
+PERCENTILES = (50, 90, 99)
+# longest range of hourly sales, in days
+HOURLY_RANGE_DAYS = 31
+
+
+def truncate_hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def increment(model, period, city, rows, sign=1):
+    '''
+    Add rows of product info, shop, orders, items and revenue to rollup rows of the period and city:
+    missing rollup rows are inserted empty, then all of them are incremented by one CASE update
+    '''
+    rows = list(rows)
+    if not rows:
+        return
+    model.objects.bulk_create([model(shop_id=row['shop_id'], product_info_id=row['product_info_id'], city=city,
+                                     **period) for row in rows], ignore_conflicts=True)
+
+    def delta(field):
+        return Case(*[When(product_info_id=row['product_info_id'], then=Value(sign * row[field])) for row in rows],
+                    default=Value(0))
+
+    model.objects.filter(product_info_id__in=[row['product_info_id'] for row in rows], city=city, **period) \
+        .update(orders=F('orders') + delta('orders'), items=F('items') + delta('items'),
+                revenue=F('revenue') + delta('revenue'))
+
+
+def record_confirmation(confirmed_basket):
+    '''
+    Add orders of the just confirmed basket to hourly and daily rollups
+    '''
+    rows = Order.objects.filter(confirmed_basket=confirmed_basket) \
+        .values('shop_id', product_info_id=F('product_id')) \
+        .annotate(orders=Count('id'), items=Sum('quantity'), revenue=Sum(F('price') * F('quantity'))) \
+        .order_by('product_info_id')
+    rows = list(rows)
+    increment(HourlySales, {'hour': truncate_hour(confirmed_basket.confirmed_at)}, confirmed_basket.city, rows)
+    increment(DailySales, {'date': timezone.localdate(confirmed_basket.confirmed_at)}, confirmed_basket.city, rows)
+
+
+def remove_order(order):
+    '''
+    Take a confirmed order out of rollups, before it is deleted. Rollup rows of deleted product infos
+    are not told apart, an order of one is taken out of any of them of its shop, their sums stay exact
+    '''
+    confirmed_basket = order.confirmed_basket
+    periods = ((HourlySales, {'hour': truncate_hour(confirmed_basket.confirmed_at)}),
+               (DailySales, {'date': timezone.localdate(confirmed_basket.confirmed_at)}))
+    if order.product_id is None:
+        # orders of product infos deleted before snapshots were taken have no shop and are not rolled up
+        if order.shop_id is None:
+            return
+        for model, period in periods:
+            row = model.objects.filter(shop_id=order.shop_id, product_info=None, city=confirmed_basket.city,
+                                       **period).values_list('id', flat=True).first()
+            model.objects.filter(id=row).update(orders=F('orders') - 1, items=F('items') - order.quantity,
+                                                revenue=F('revenue') - order.quantity * order.price)
+        return
+    price = order.price if order.price is not None else order.product.price
+    rows = [{'product_info_id': order.product_id, 'shop_id': order.product.shop_id, 'orders': 1,
+             'items': order.quantity, 'revenue': order.quantity * price}]
+    for model, period in periods:
+        increment(model, period, confirmed_basket.city, rows, -1)
+
+
+def backfill(date_from=None, date_to=None, batch_size=1000):
+    '''
+    Rebuild rollups of confirmation dates in the range from orders, day by day, return number of days rebuilt.
+    Orders of deleted product infos are rolled up by their shop snapshot without product info
+    '''
+    orders = Order.objects.filter(Q(shop__isnull=False) | Q(product__isnull=False), confirmed_basket__isnull=False)
+    first = orders.order_by('confirmed_basket__confirmed_at').values_list('confirmed_basket__confirmed_at', flat=True) \
+        .first()
+    if first is None:
+        return 0
+    date_from = max(date_from or timezone.localdate(first), timezone.localdate(first))
+    date_to = date_to or timezone.localdate()
+
+    days = 0
+    date = date_from
+    while date <= date_to:
+        start = timezone.make_aware(datetime.datetime.combine(date, datetime.time()))
+        end = start + datetime.timedelta(days=1)
+        rows = orders.filter(confirmed_basket__confirmed_at__gte=start, confirmed_basket__confirmed_at__lt=end) \
+            .values(product_info_id=F('product_id'), seller=ORDER_SHOP, city=F('confirmed_basket__city'),
+                    hour=TruncHour('confirmed_basket__confirmed_at')) \
+            .annotate(orders=Count('id'), items=Sum('quantity'), revenue=Sum(ORDER_PRICE * F('quantity'))) \
+            .order_by()
+
+        hourly = [HourlySales(shop_id=row.pop('seller'), **row) for row in rows]
+        daily = {}
+        for row in hourly:
+            key = (row.product_info_id, row.city)
+            if key not in daily:
+                daily[key] = DailySales(shop_id=row.shop_id, product_info_id=row.product_info_id, city=row.city,
+                                        date=date)
+            daily[key].orders += row.orders
+            daily[key].items += row.items
+            daily[key].revenue += row.revenue
+
+        with transaction.atomic():
+            HourlySales.objects.filter(hour__gte=start, hour__lt=end).delete()
+            DailySales.objects.filter(date=date).delete()
+            HourlySales.objects.bulk_create(hourly, batch_size=batch_size)
+            DailySales.objects.bulk_create(daily.values(), batch_size=batch_size)
+        days += 1
+        date += datetime.timedelta(days=1)
+    return days
+
+
+def sales(shop, date_from, date_to, group_by, product_info=None):
+    '''
+    Orders, items and revenue of the shop between dates inclusive, grouped by day, hour, product info or city.
+    Hours are read from hourly rollups, everything else from daily ones
+    '''
+    if group_by == 'hour':
+        start = timezone.make_aware(datetime.datetime.combine(date_from, datetime.time()))
+        end = timezone.make_aware(datetime.datetime.combine(date_to, datetime.time())) + datetime.timedelta(days=1)
+        queryset = HourlySales.objects.filter(shop=shop, hour__gte=start, hour__lt=end)
+        key = 'hour'
+    else:
+        queryset = DailySales.objects.filter(shop=shop, date__gte=date_from, date__lte=date_to)
+        key = {'day': 'date', 'product': 'product_info', 'city': 'city'}[group_by]
+    if product_info is not None:
+        queryset = queryset.filter(product_info_id=product_info)
+    return list(queryset.values(key).annotate(orders=Sum('orders'), items=Sum('items'), revenue=Sum('revenue'))
+                .order_by(key))
+
+
+def revenue_series(results, group_by, date_from, date_to):
+    '''
+    Revenue of every day or hour of the range, periods without sales are zero
+    '''
+    if group_by == 'hour':
+        step = datetime.timedelta(hours=1)
+        moment = timezone.make_aware(datetime.datetime.combine(date_from, datetime.time()))
+        end = timezone.make_aware(datetime.datetime.combine(date_to, datetime.time())) + datetime.timedelta(days=1)
+        revenue = {row['hour']: row['revenue'] for row in results}
+    else:
+        step = datetime.timedelta(days=1)
+        moment, end = date_from, date_to + step
+        revenue = {row['date']: row['revenue'] for row in results}
+    series = []
+    while moment < end:
+        series.append(revenue.get(moment, 0))
+        moment += step
+    return series
+
+
+def series_stats(series, window):
+    '''
+    Percentiles and moving average of the series, vectorized with NumPy when it is installed
+    '''
+    if not series:
+        return {'percentiles': {}, 'moving_average': []}
+    if numpy is not None:
+        values = numpy.asarray(series, dtype=float)
+        percentiles = numpy.percentile(values, PERCENTILES).tolist()
+        if len(values) >= window:
+            moving = (numpy.convolve(values, numpy.ones(window), mode='valid') / window).tolist()
+        else:
+            moving = []
+    else:
+        percentiles = [percentile(sorted(series), rank) for rank in PERCENTILES]
+        moving = []
+        running = sum(series[:window - 1])
+        for position in range(window - 1, len(series)):
+            running += series[position]
+            moving.append(running / window)
+            running -= series[position - window + 1]
+    return {'percentiles': {f'p{rank}': value for rank, value in zip(PERCENTILES, percentiles)},
+            'moving_average': moving}
+
+
+def percentile(values, rank):
+    '''
+    Percentile of sorted values with linear interpolation, as numpy.percentile computes it
+    '''
+    position = (len(values) - 1) * rank / 100
+    lower, upper = math.floor(position), math.ceil(position)
+    return float(values[lower] + (values[upper] - values[lower]) * (position - lower))
@@ -0,0 +1,75 @@
+import hashlib
+
+from django.contrib.auth.models import User
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from api.cache import token_cache
+from api.models import Basket, UserProfile
+
+# password hash is not cached, it is loaded on access
+USER_FIELDS = [field.attname for field in User._meta.concrete_fields if field.attname != 'password']
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    '''
+    Token authentication resolving token to user with profile and basket from token cache, without queries
+    on a warm path. Entries are tagged with user:<id>, the tag is invalidated on changes of user, profile
+    and token by signals in api.models
+    '''
+    KEY_PREFIX = 'auth-token:'
+
+    def authenticate_credentials(self, key):
+        cache_key = self.KEY_PREFIX + hashlib.sha256(key.encode()).hexdigest()
+        entry = token_cache.get(cache_key)
+        if entry is None:
+            entry = self.load(key)
+            if entry is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            versions, entry = entry
+            token_cache.set(cache_key, entry, versions)
+
+        token = self.build(key, entry)
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
+
+    def load(self, key):
+        '''
+        Tag versions and cache entry of the token, None for unknown token.
+        Versions are taken before the user is read, so an invalidation made meanwhile is not lost
+        '''
+        user_id = Token.objects.filter(key=key).values_list('user_id', flat=True).first()
+        if user_id is None:
+            return None
+        versions = token_cache.versions([f'user:{user_id}'])
+        user = User.objects.select_related('userprofile__basket').filter(id=user_id).first()
+        if user is None:
+            return None
+
+        entry = {'user': [getattr(user, field) for field in USER_FIELDS], 'profile': None, 'basket': None}
+        profile = getattr(user, 'userprofile', None)
+        if profile is not None:
+            entry['profile'] = (profile.id, profile.state)
+            basket = getattr(profile, 'basket', None)
+            entry['basket'] = basket.id if basket is not None else None
+        return versions, entry
+
+    def build(self, key, entry):
+        '''
+        Fresh token, user, profile and basket instances of the entry, fields not cached are loaded on access
+        '''
+        db = Token.objects.db
+        user = User.from_db(db, USER_FIELDS, entry['user'])
+        token = Token.from_db(db, ['key', 'user_id'], [key, user.id])
+        token.user = user
+        if entry['profile'] is not None:
+            profile_id, state = entry['profile']
+            profile = UserProfile.from_db(db, ['id', 'user_id', 'state'], [profile_id, user.id, state])
+            profile.user = user
+            if entry['basket'] is not None:
+                basket = Basket.from_db(db, ['id', 'user_id'], [entry['basket'], profile_id])
+                basket.user = profile
+        return token
@@ -0,0 +1,152 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class LRUCache:
+    '''
+    Thread-safe in-process LRU cache limited by number of entries
+    '''
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class ResponseCache:
+    '''
+    Two-tier cache of response data: in-process LRU in front of the shared Django cache.
+    Every entry is stored with versions of its tags (e.g. shop:1, product:2, catalog),
+    invalidating a tag bumps its version in the shared cache, which makes all entries
+    stored with the previous version stale in every process, without a TTL.
+    '''
+    VERSION_PREFIX = 'response-cache-version:'
+    KEY_PREFIX = 'response-cache:'
+
+    def __init__(self, alias, local_size, timeout):
+        self.alias = alias
+        self.local = LRUCache(local_size)
+        self.timeout = timeout
+        self.counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'invalidations': 0}
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def make_key(self, request):
+        '''
+        Key of request by absolute path and sorted query parameters
+        '''
+        query = sorted((key, value) for key, values in request.query_params.lists() for value in values)
+        raw = f'{request.build_absolute_uri(request.path)}?{query}'
+        return self.KEY_PREFIX + hashlib.md5(raw.encode()).hexdigest()
+
+    def versions(self, tags):
+        '''
+        Current versions of tags keyed by their version keys, missing versions are created
+        '''
+        keys = [self.VERSION_PREFIX + tag for tag in tags]
+        versions = self.shared.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # a version key lost by the shared cache must not come back with an old value
+                self.shared.add(key, time.time_ns(), timeout=None)
+                versions[key] = self.shared.get(key)
+        return versions
+
+    def get(self, key):
+        tier = 'local_hits'
+        entry = self.local.get(key)
+        if entry is None:
+            tier = 'shared_hits'
+            entry = self.shared.get(key)
+        if entry is not None:
+            versions, data = entry
+            if self.shared.get_many(list(versions)) == versions:
+                if tier == 'shared_hits':
+                    self.local.set(key, entry)
+                self.counters[tier] += 1
+                return data
+            self.local.delete(key)
+        self.counters['misses'] += 1
+        return None
+
+    def set(self, key, data, versions):
+        '''
+        Store data with tag versions, which should be taken with versions() before data was read
+        so an invalidation made meanwhile is not lost
+        '''
+        entry = (versions, data)
+        self.local.set(key, entry)
+        self.shared.set(key, entry, self.timeout)
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            key = self.VERSION_PREFIX + tag
+            try:
+                self.shared.incr(key)
+            except ValueError:
+                self.shared.add(key, time.time_ns(), timeout=None)
+        self.counters['invalidations'] += len(tags)
+
+    def stats(self):
+        return dict(self.counters, evictions=self.local.evictions, local_size=len(self.local.entries))
+
+    def clear(self):
+        '''
+        Drop local entries and reset counters, shared entries expire by themselves
+        '''
+        self.local.clear()
+        self.local.evictions = 0
+        self.counters = dict.fromkeys(self.counters, 0)
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE['ALIAS'], settings.RESPONSE_CACHE['LOCAL_SIZE'],
+                               settings.RESPONSE_CACHE['TIMEOUT'])
+
+
+def invalidate_shop(shop_id, product_ids=()):
+    '''
+    Drop cached catalog responses depending on the shop and on the given products
+    '''
+    response_cache.invalidate('catalog', f'shop:{shop_id}', *(f'product:{product_id}' for product_id in product_ids))
+
+# token -> user, profile and basket of CachedTokenAuthentication, tagged with user:<id>
+token_cache = ResponseCache(settings.TOKEN_CACHE['ALIAS'], settings.TOKEN_CACHE['LOCAL_SIZE'],
+                            settings.TOKEN_CACHE['TIMEOUT'])
+
+
+def invalidate_user(user_id):
+    '''
+    Drop cached tokens of the user in every process
+    '''
+    token_cache.invalidate(f'user:{user_id}')
@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Sum
+
+from api.models import ProductInfo, ProductParameter, CategoryFacet, ParameterFacet
+
+
+def active_offers():
+    '''
+    Active product infos of enabled shops
+    '''
+    return ProductInfo.objects.filter(is_active=True, shop__user__userprofile__state=True)
+
+
+def filter_offers(offers, filters):
+    '''
+    Apply validated CatalogFilterSerializer data to offers queryset
+    '''
+    if filters.get('category') is not None:
+        offers = offers.filter(product__category_id=filters['category'])
+    if filters.get('shop') is not None:
+        offers = offers.filter(shop_id=filters['shop'])
+    if filters.get('price_min') is not None:
+        offers = offers.filter(price__gte=filters['price_min'])
+    if filters.get('price_max') is not None:
+        offers = offers.filter(price__lte=filters['price_max'])
+    if filters.get('in_stock'):
+        offers = offers.filter(quantity__gt=0)
+    for name, value in filters.get('parameter', []):
+        parameters = ProductParameter.objects.filter(product_info=OuterRef('pk'), parameter__name=name, value=value)
+        offers = offers.filter(Exists(parameters))
+    return offers
+
+
+def is_filtered(filters):
+    '''
+    True when filters narrow the catalog more than to one shop
+    '''
+    return any(value not in (None, False, []) for key, value in filters.items() if key != 'shop')
+
+
+def catalog_facets(offers, filters):
+    '''
+    Offer counts per category and per parameter value, FACETS_LIMIT most frequent parameter values are returned.
+    Without filters, or with the shop filter only, counts are read from facet tables kept by the import
+    '''
+    if is_filtered(filters):
+        categories = offers.values('product__category').annotate(count=Count('id')) \
+            .values_list('product__category', 'count')
+        parameters = ProductParameter.objects.filter(product_info__in=offers) \
+            .values('parameter__name', 'value').annotate(count=Count('id')) \
+            .values_list('parameter__name', 'value', 'count')
+    else:
+        category_facets = CategoryFacet.objects.filter(shop__user__userprofile__state=True)
+        parameter_facets = ParameterFacet.objects.filter(shop__user__userprofile__state=True)
+        if filters.get('shop') is not None:
+            category_facets = category_facets.filter(shop_id=filters['shop'])
+            parameter_facets = parameter_facets.filter(shop_id=filters['shop'])
+        categories = category_facets.values('category').annotate(count=Sum('offers')) \
+            .values_list('category', 'count')
+        parameters = parameter_facets.values('parameter__name', 'value').annotate(count=Sum('offers')) \
+            .values_list('parameter__name', 'value', 'count')
+
+    return {
+        'categories': [{'id': category, 'count': count} for category, count in categories.order_by('-count')],
+        'parameters': [{'name': name, 'value': value, 'count': count}
+                       for name, value, count in parameters.order_by('-count')[:settings.FACETS_LIMIT]],
+    }
+
+
+def refresh_shop_facets(shop):
+    '''
+    Recompute facet tables of the shop from its active product infos
+    '''
+    offers = ProductInfo.objects.filter(shop=shop, is_active=True)
+    categories = offers.values('product__category').annotate(count=Count('id'))
+    parameters = ProductParameter.objects.filter(product_info__in=offers) \
+        .values('parameter', 'value').annotate(count=Count('id'))
+
+    with transaction.atomic(savepoint=False):
+        CategoryFacet.objects.filter(shop=shop).delete()
+        ParameterFacet.objects.filter(shop=shop).delete()
+        CategoryFacet.objects.bulk_create([CategoryFacet(shop=shop, category_id=row['product__category'],
+                                                         offers=row['count']) for row in categories])
+        ParameterFacet.objects.bulk_create([ParameterFacet(shop=shop, parameter_id=row['parameter'],
+                                                           value=row['value'], offers=row['count'])
+                                            for row in parameters.iterator()], batch_size=1000)
@@ -0,0 +1,86 @@
+from collections import defaultdict
+from itertools import groupby
+
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from api.analytics import increment
+from api.cache import invalidate_shop
+from api.catalog import refresh_shop_facets
+from api.etags import bump_shop_version
+from api.models import Basket, DailySales, HourlySales, Order, ProductInfo, ProductParameter, Shop, \
+    StockReservation
+
+
+def duplicate_groups(model, fields):
+    '''
+    Lists of ids of model rows sharing values of fields, the lowest id first
+    '''
+    others = model.objects.filter(**{field: OuterRef(field) for field in fields}).exclude(id=OuterRef('id'))
+    rows = model.objects.filter(Exists(others)).order_by(*fields, 'id').values_list(*fields, 'id')
+    return [[row[-1] for row in group] for _, group in groupby(rows, key=lambda row: row[:-1])]
+
+
+def merge_rollups(model, period, survivor, duplicates):
+    '''
+    Add sales rollup rows of duplicate product infos to the rows of the survivor and delete them
+    '''
+    totals = defaultdict(lambda: dict.fromkeys(('orders', 'items', 'revenue'), 0))
+    for row in model.objects.filter(product_info_id__in=duplicates) \
+            .values('shop_id', 'city', period, 'orders', 'items', 'revenue'):
+        total = totals[(row[period], row['city'], row['shop_id'])]
+        for field in total:
+            total[field] += row[field]
+    for (value, city, shop_id), total in totals.items():
+        increment(model, {period: value}, city, [dict(total, product_info_id=survivor, shop_id=shop_id)])
+    model.objects.filter(product_info_id__in=duplicates).delete()
+
+
+def merge_product_infos(survivor, duplicates):
+    '''
+    Move orders, reservations, sales and missing parameters of duplicate product infos of a product in a shop
+    to the survivor and delete the duplicates. Stock is the survivor's, as duplicates come from the same price list
+    goods imported again, reserved quantities are added up
+    '''
+    Basket.objects.filter(orders__product_id__in=duplicates).update(version=F('version') + 1)
+    Order.objects.filter(product_id__in=duplicates).update(product_id=survivor, updated_at=timezone.now())
+    StockReservation.objects.filter(product_info_id__in=duplicates).update(product_info_id=survivor)
+    reserved = sum(ProductInfo.objects.filter(id__in=duplicates).values_list('reserved', flat=True))
+    ProductInfo.objects.filter(id=survivor).update(reserved=F('reserved') + reserved,
+                                                   quantity=Greatest(F('quantity'), F('reserved') + reserved))
+
+    parameters = ProductParameter.objects.filter(product_info_id=survivor).values('parameter_id')
+    ProductParameter.objects.filter(product_info_id__in=duplicates).exclude(parameter_id__in=parameters) \
+        .update(product_info_id=survivor)
+    merge_rollups(HourlySales, 'hour', survivor, duplicates)
+    merge_rollups(DailySales, 'date', survivor, duplicates)
+    ProductInfo.objects.filter(id__in=duplicates).delete()
+
+
+def deduplicate(dry_run=False):
+    '''
+    Merge product infos of the same product in a shop into the one with the lowest id, then drop parameters
+    repeated for a product info but the first one. Return mapping of entity -> number of removed duplicates,
+    with dry_run nothing is changed
+    '''
+    report = {}
+    groups = duplicate_groups(ProductInfo, ('shop', 'product'))
+    report[ProductInfo.__name__] = sum(len(ids) - 1 for ids in groups)
+    if not dry_run and groups:
+        for survivor, *duplicates in groups:
+            merge_product_infos(survivor, duplicates)
+        shops = defaultdict(set)
+        for shop_id, product_id in ProductInfo.objects.filter(id__in=[ids[0] for ids in groups]) \
+                .values_list('shop_id', 'product_id'):
+            shops[shop_id].add(product_id)
+        for shop in Shop.objects.filter(id__in=shops):
+            bump_shop_version(shop.id)
+            refresh_shop_facets(shop)
+            invalidate_shop(shop.id, shops[shop.id])
+
+    groups = duplicate_groups(ProductParameter, ('product_info', 'parameter'))
+    report[ProductParameter.__name__] = sum(len(ids) - 1 for ids in groups)
+    if not dry_run and groups:
+        ProductParameter.objects.filter(id__in=[duplicate for ids in groups for duplicate in ids[1:]]).delete()
+    return report
@@ -0,0 +1,52 @@
+import hashlib
+
+from django.db.models import Count, F, Max, Sum
+
+from api.models import Shop, Basket, ProductInfo
+
+
+def bump_shop_version(shop_id):
+    Shop.objects.filter(id=shop_id).update(version=F('version') + 1)
+
+
+def bump_basket_version(user):
+    Basket.objects.filter(id=user.userprofile.basket.id).update(version=F('version') + 1)
+
+
+def basket_version(user):
+    return Basket.objects.filter(id=user.userprofile.basket.id).values_list('id', 'version').first()
+
+
+def basket_etag(request, *args, **kwargs):
+    '''
+    ETag of user's basket from its version and versions of shops of its orders, as basket lines show
+    the current product infos, one query
+    '''
+    return 'basket-%s-%s-%s' % Basket.objects.filter(id=request.user.userprofile.basket.id) \
+        .annotate(shops=Sum('orders__product__shop__version')).values_list('id', 'version', 'shops').first()
+
+
+def confirmed_orders_etag(request, *args, **kwargs):
+    '''
+    ETag of user's confirmed orders, they change together with the basket on confirmation
+    '''
+    return 'confirmed-%s-%s' % basket_version(request.user)
+
+
+def catalog_etag(request, *args, **kwargs):
+    '''
+    ETag of product list and search responses from versions of all shops, one query
+    '''
+    versions = Shop.objects.aggregate(count=Count('id'), last=Max('id'), version=Sum('version'))
+    raw = f'{request.get_full_path()}:{sorted(versions.items())}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def product_etag(request, pk=None, *args, **kwargs):
+    '''
+    ETag of product details from versions of shops offering the product, one query
+    '''
+    versions = list(ProductInfo.objects.filter(product_id=pk).order_by('shop_id')
+                    .values_list('shop_id', 'shop__version').distinct())
+    raw = f'{request.get_full_path()}:{versions}'
+    return hashlib.md5(raw.encode()).hexdigest()
@@ -0,0 +1,130 @@
+import csv
+import datetime
+import gzip
+import tempfile
+
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Coalesce, NullIf
+
+from api.models import Order, Shop
+from api.totals import ORDER_PRICE
+
+BASKET = 'basket'
+CONFIRMED = 'confirmed'
+STATUSES = (BASKET, CONFIRMED)
+# format -> content type
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/jsonl',
+}
+COLUMNS = ('id', 'dt', 'status', 'product', 'name', 'quantity', 'price', 'city', 'confirmed_at', 'updated_at')
+# size of strings yielded to the response or written to the file
+BUFFER_SIZE = 64 * 1024
+
+
+def seller_orders(user):
+    '''
+    Orders of partner's shops, confirmed orders by their shop snapshot, as they outlive their product infos
+    '''
+    shops = Shop.objects.filter(user=user).values('id')
+    return Order.objects.filter(Q(shop__in=shops) | Q(shop__isnull=True, product__shop__in=shops))
+
+
+def partner_orders(user, date_from=None, date_to=None, status=None):
+    '''
+    Rows of partner's orders in COLUMNS order, ordered by id
+    '''
+    queryset = seller_orders(user)
+    if date_from:
+        queryset = queryset.filter(dt__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(dt__lte=date_to)
+    if status == BASKET:
+        queryset = queryset.filter(confirmed_basket__isnull=True)
+    elif status == CONFIRMED:
+        queryset = queryset.filter(confirmed_basket__isnull=False)
+    return queryset.annotate(
+        state=Case(When(confirmed_basket__isnull=False, then=Value(CONFIRMED)), default=Value(BASKET)),
+        name=Coalesce(NullIf('product_name', Value('')), 'product__product__name'),
+        line_price=ORDER_PRICE,
+        city=F('confirmed_basket__city'),
+        confirmed_at=F('confirmed_basket__confirmed_at'),
+    ).values_list('id', 'dt', 'state', 'product', 'name', 'quantity', 'line_price', 'city', 'confirmed_at',
+                  'updated_at').order_by('id')
+
+
+class Echo:
+    '''
+    File-like object returning what is written, lets csv.writer format a single row
+    '''
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([csv_value(value) for value in row])
+
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def jsonl_lines(rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(COLUMNS, row))) + '\n'
+
+
+def buffered(lines, size=BUFFER_SIZE):
+    '''
+    Join lines into strings of about size characters
+    '''
+    buffer, length = [], 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def export_lines(queryset, format, chunk_size):
+    '''
+    Stream of the export in the format, rows are fetched chunk_size at a time by a server-side cursor
+    '''
+    lines = csv_lines if format == 'csv' else jsonl_lines
+    return buffered(lines(queryset.iterator(chunk_size=chunk_size)))
+
+
+def write_export(job, queryset, chunk_size):
+    '''
+    Write the export of the job gzip compressed into a temporary file, then save it as the job file.
+    Return number of exported rows
+    '''
+    rows = 0
+
+    def counted(queryset):
+        nonlocal rows
+        for row in queryset.iterator(chunk_size=chunk_size):
+            rows += 1
+            yield row
+
+    lines = csv_lines if job.format == 'csv' else jsonl_lines
+    with tempfile.TemporaryFile() as temporary:
+        with gzip.GzipFile(fileobj=temporary, mode='wb') as compressed:
+            for chunk in buffered(lines(counted(queryset))):
+                compressed.write(chunk.encode())
+        temporary.seek(0)
+        job.file.save(f'orders-{job.id}.{job.format}.gz', File(temporary), save=False)
+    return rows
@@ -0,0 +1,344 @@
+import hashlib
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from api.catalog import refresh_shop_facets
+from api.etags import bump_shop_version
+from api.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter
+from api.parsers import price_list_records
+from api.search import index_product_infos
+
+
+class CatalogImportError(Exception):
+    pass
+
+
+def chunks(items, size):
+    '''
+    Split list into consecutive slices of given size
+    '''
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def fingerprint(item):
+    '''
+    Digest of goods item values stored in ProductInfo and ProductParameter rows, of a price list item
+    or of an item rebuilt from the stored rows
+    '''
+    values = [item['name'], int(item['category']), item.get('model'), item['price'], item['price_rrc'],
+              item['quantity'], sorted((str(name), str(value)) for name, value in item.get('parameters', {}).items())]
+    return hashlib.md5(json.dumps(values, ensure_ascii=False).encode()).hexdigest()
+
+
+class CatalogImporter:
+    '''
+    Set-based import of a partner price list.
+    Goods are consumed from a record stream in chunks of batch_size, existing rows of a chunk
+    are resolved with IN lookups and written with bulk_create/bulk_update,
+    the whole import runs in one transaction.
+
+    In sync mode goods whose fingerprint matches the fingerprint of the stored ProductInfo and ProductParameter
+    rows are skipped, so rows changed outside the import (sold stock, admin edits) are written again,
+    and with deactivate_missing active product infos of the shop absent from the price list are deactivated.
+    The summary is kept in stats['diff'].
+    '''
+    ENTITIES = ('shop', 'categories', 'products', 'product_infos', 'parameters', 'product_parameters')
+    PRODUCT_INFO_FIELDS = ('product_id', 'quantity', 'model', 'price', 'price_rrc', 'is_active')
+
+    def __init__(self, user, batch_size=None, stats=None, sync=False, deactivate_missing=False):
+        self.user = user
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.sync = sync
+        self.deactivate_missing = deactivate_missing
+        self.seen = set()
+        self.shop = None
+        # products which got a new or reactivated offer, their cached details are stale
+        self.touched_products = set()
+        self.stats = stats or {entity: {'created': 0, 'updated': 0, 'unchanged': 0} for entity in self.ENTITIES}
+        if sync or deactivate_missing:
+            self.stats.setdefault('diff', {'created': 0, 'changed': 0, 'reactivated': 0, 'unchanged': 0,
+                                           'deactivated': 0})
+
+    def run(self, data, skip=0, on_chunk=None):
+        '''
+        Import price list and return per-entity stats.
+        Data is a dict with keys shop, categories, goods or a stream of records from api.parsers.
+        With on_chunk callback every chunk is committed in its own transaction together with the callback,
+        which gets the number of goods processed so far, an interrupted import is resumed by passing it as skip.
+        '''
+        records = price_list_records(data) if isinstance(data, dict) else data
+        try:
+            if on_chunk is None:
+                with transaction.atomic():
+                    self.import_records(records, skip)
+            else:
+                self.import_records(records, skip, on_chunk)
+        except (KeyError, TypeError, ValueError) as error:
+            raise CatalogImportError(f'Malformed price list: {error!r}')
+        return self.stats
+
+    def import_records(self, records, skip=0, on_chunk=None):
+        '''
+        Write records chunk by chunk. Records coming before the shop are kept until the shop is known,
+        so memory stays flat only when the shop precedes goods, as it does in partner price lists
+        '''
+        shop = None
+        categories, goods = [], []
+        processed = 0
+        for kind, value in records:
+            if kind == 'shop':
+                shop = self.import_shop(value)
+            elif kind == 'categories':
+                categories.append(value)
+            elif kind == 'goods':
+                processed += 1
+                self.seen.add(int(value['id']))
+                if processed > skip:
+                    goods.append(value)
+            if shop is not None and len(goods) >= self.batch_size:
+                self.write_chunk(shop, categories, goods, processed, on_chunk)
+                categories, goods = [], []
+
+        if shop is None:
+            raise CatalogImportError('Shop is not given')
+        self.write_chunk(shop, categories, goods, processed, on_chunk)
+        with transaction.atomic(savepoint=False):
+            if self.deactivate_missing:
+                self.deactivate(shop)
+            if not self.sync or self.changed():
+                refresh_shop_facets(shop)
+
+    def changed(self):
+        '''
+        Whether the sync wrote any offer, counted in stats kept over resumed runs
+        '''
+        return any(count for kind, count in self.stats['diff'].items() if kind != 'unchanged')
+
+    def write_chunk(self, shop, categories, goods, processed, on_chunk=None):
+        with transaction.atomic(savepoint=False):
+            if categories:
+                self.import_categories(shop, categories)
+            if goods:
+                self.import_goods(shop, goods)
+            if on_chunk is not None:
+                on_chunk(processed)
+
+    def count(self, entity, created=0, updated=0, unchanged=0):
+        self.stats[entity]['created'] += created
+        self.stats[entity]['updated'] += updated
+        self.stats[entity]['unchanged'] += unchanged
+
+    def lookup(self, queryset, field, values):
+        '''
+        Fetch rows of queryset where field is in values, splitting the IN list by batch_size
+        '''
+        values = list(values)
+        for part in chunks(values, self.batch_size):
+            yield from queryset.filter(**{f'{field}__in': part})
+
+    def import_shop(self, name):
+        shop, created = Shop.objects.get_or_create(name=name, user=self.user)
+        self.count('shop', created=int(created), unchanged=int(not created))
+        self.shop = shop
+        return shop
+
+    def import_categories(self, shop, categories):
+        incoming = {int(category['id']): category['name'] for category in categories}
+        existing = {category.id: category for category in self.lookup(Category.objects.all(), 'id', incoming)}
+
+        to_create, to_update = [], []
+        for category_id, name in incoming.items():
+            category = existing.get(category_id)
+            if category is None:
+                to_create.append(Category(id=category_id, name=name))
+            elif category.name != name:
+                category.name = name
+                to_update.append(category)
+
+        try:
+            Category.objects.bulk_create(to_create, batch_size=self.batch_size)
+            Category.objects.bulk_update(to_update, ['name'], batch_size=self.batch_size)
+        except IntegrityError:
+            # the chunk is rolled back with the transaction of write_chunk
+            raise CatalogImportError('Categories repeat a category name already used under another id')
+        self.count('categories', created=len(to_create), updated=len(to_update),
+                   unchanged=len(incoming) - len(to_create) - len(to_update))
+
+        through = Category.shops.through
+        through.objects.bulk_create([through(category_id=category_id, shop_id=shop.id) for category_id in incoming],
+                                    batch_size=self.batch_size, ignore_conflicts=True)
+
+    def import_goods(self, shop, goods):
+        if self.sync:
+            goods = self.changed_goods(shop, goods)
+            if not goods:
+                return
+        bump_shop_version(shop.id)
+        products = self.import_products(goods)
+        product_infos = self.import_product_infos(shop, goods, products)
+        parameters = self.import_parameters(goods)
+        self.import_product_parameters(goods, product_infos, parameters)
+        index_product_infos(product_infos, self.batch_size)
+
+    def stored(self, ids):
+        '''
+        Mapping product info id -> (shop id, is_active, fingerprint of its ProductInfo and ProductParameter rows)
+        '''
+        parameters = defaultdict(dict)
+        queryset = ProductParameter.objects.values_list('product_info_id', 'parameter__name', 'value')
+        for info_id, name, value in self.lookup(queryset, 'product_info_id', ids):
+            parameters[info_id][name] = value
+        queryset = ProductInfo.objects.values('id', 'shop_id', 'is_active', 'model', 'price', 'price_rrc', 'quantity',
+                                              name=F('product__name'), category=F('product__category_id'))
+        return {row['id']: (row['shop_id'], row['is_active'], fingerprint(dict(row, parameters=parameters[row['id']])))
+                for row in self.lookup(queryset, 'id', ids)}
+
+    def changed_goods(self, shop, goods):
+        '''
+        Filter out goods matching their stored rows and still active
+        '''
+        diff = self.stats['diff']
+        existing = self.stored([int(item['id']) for item in goods])
+        changed = []
+        for item in goods:
+            current = existing.get(int(item['id']))
+            if current is None:
+                diff['created'] += 1
+                changed.append(item)
+                continue
+            shop_id, is_active, stored_fingerprint = current
+            if shop_id != shop.id or stored_fingerprint != fingerprint(item):
+                diff['changed'] += 1
+            elif not is_active:
+                diff['reactivated'] += 1
+            else:
+                diff['unchanged'] += 1
+                continue
+            changed.append(item)
+        return changed
+
+    def deactivate(self, shop):
+        '''
+        Deactivate active product infos of the shop missing from the price list
+        '''
+        active = ProductInfo.objects.filter(shop=shop, is_active=True).values_list('id', flat=True)
+        missing = [info_id for info_id in active.iterator(chunk_size=self.batch_size) if info_id not in self.seen]
+        for part in chunks(missing, self.batch_size):
+            ProductInfo.objects.filter(id__in=part).update(is_active=False)
+        if missing:
+            bump_shop_version(shop.id)
+        self.stats['diff']['deactivated'] += len(missing)
+
+    def import_products(self, goods):
+        '''
+        Return mapping (name, category id) -> product id, creating missing products
+        '''
+        keys = {(item['name'], int(item['category'])) for item in goods}
+        names = {name for name, _ in keys}
+
+        def resolve():
+            return {(product.name, product.category_id): product.id
+                    for product in self.lookup(Product.objects.only('id', 'name', 'category_id'), 'name', names)}
+
+        products = resolve()
+        to_create = [Product(name=name, category_id=category_id)
+                     for name, category_id in keys if (name, category_id) not in products]
+        if to_create:
+            Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+            products = resolve()
+        self.count('products', created=len(to_create), unchanged=len(keys) - len(to_create))
+        return products
+
+    def import_product_infos(self, shop, goods, products):
+        '''
+        Create or update ProductInfo rows by id from price list, return mapping id -> ProductInfo
+        '''
+        incoming = {}
+        for item in goods:
+            incoming[int(item['id'])] = ProductInfo(id=int(item['id']),
+                                                    product_id=products[(item['name'], int(item['category']))],
+                                                    shop_id=shop.id,
+                                                    quantity=item['quantity'],
+                                                    model=item.get('model'),
+                                                    price=item['price'],
+                                                    price_rrc=item['price_rrc'],
+                                                    is_active=True)
+        offers = {}
+        for info_id, info in incoming.items():
+            other = offers.setdefault(info.product_id, info_id)
+            if other != info_id:
+                raise CatalogImportError(f'Goods {other} and {info_id} are the same product')
+        existing = {info.id: info for info in self.lookup(ProductInfo.objects.all(), 'id', incoming)}
+
+        to_create, to_update = [], []
+        for info_id, info in incoming.items():
+            current = existing.get(info_id)
+            if current is None:
+                to_create.append(info)
+                self.touched_products.add(info.product_id)
+                continue
+            if current.shop_id != shop.id:
+                raise CatalogImportError(f'Product info {info_id} belongs to another shop')
+            if any(getattr(current, field) != getattr(info, field) for field in self.PRODUCT_INFO_FIELDS):
+                to_update.append(info)
+                if not current.is_active or current.product_id != info.product_id:
+                    self.touched_products.update((current.product_id, info.product_id))
+
+        try:
+            ProductInfo.objects.bulk_create(to_create, batch_size=self.batch_size)
+            ProductInfo.objects.bulk_update(to_update, self.PRODUCT_INFO_FIELDS, batch_size=self.batch_size)
+        except IntegrityError:
+            # the chunk is rolled back with the transaction of write_chunk
+            raise CatalogImportError('Goods repeat a product the shop already offers under another id')
+        self.count('product_infos', created=len(to_create), updated=len(to_update),
+                   unchanged=len(incoming) - len(to_create) - len(to_update))
+        return incoming
+
+    def import_parameters(self, goods):
+        '''
+        Return mapping name -> parameter id, creating missing parameters
+        '''
+        names = {name for item in goods for name in item.get('parameters', {})}
+
+        def resolve():
+            return {parameter.name: parameter.id for parameter in self.lookup(Parameter.objects.all(), 'name', names)}
+
+        parameters = resolve()
+        to_create = [Parameter(name=name) for name in names if name not in parameters]
+        if to_create:
+            Parameter.objects.bulk_create(to_create, batch_size=self.batch_size)
+            parameters = resolve()
+        self.count('parameters', created=len(to_create), unchanged=len(names) - len(to_create))
+        return parameters
+
+    def import_product_parameters(self, goods, product_infos, parameters):
+        incoming = {}
+        for item in goods:
+            for name, value in item.get('parameters', {}).items():
+                incoming[(int(item['id']), parameters[name])] = str(value)
+
+        existing = {(row.product_info_id, row.parameter_id): row
+                    for row in self.lookup(ProductParameter.objects.all(), 'product_info_id', product_infos)}
+
+        to_create, to_update = [], []
+        for (info_id, parameter_id), value in incoming.items():
+            current = existing.get((info_id, parameter_id))
+            if current is None:
+                to_create.append(ProductParameter(product_info_id=info_id, parameter_id=parameter_id, value=value))
+            elif current.value != value:
+                current.value = value
+                to_update.append(current)
+        # parameters the goods item no longer has
+        to_delete = [row.id for key, row in existing.items() if key not in incoming]
+
+        for part in chunks(to_delete, self.batch_size):
+            ProductParameter.objects.filter(id__in=part).delete()
+        ProductParameter.objects.bulk_create(to_create, batch_size=self.batch_size)
+        ProductParameter.objects.bulk_update(to_update, ['value'], batch_size=self.batch_size)
+        self.count('product_parameters', created=len(to_create), updated=len(to_update),
+                   unchanged=len(incoming) - len(to_create) - len(to_update))
@@ -0,0 +1,179 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.utils import timezone
+
+from api.cache import invalidate_shop
+from api.etags import bump_shop_version
+from api.models import ProductInfo, Order, StockReservation
+from api.totals import add_to_basket
+
+ADDED = 'added'
+MERGED = 'merged'
+NOT_FOUND = 'not_found'
+OUT_OF_STOCK = 'out_of_stock'
+
+
+class OutOfStockError(Exception):
+    def __init__(self, product_ids):
+        super().__init__(f'Not enough products in stock: {product_ids}')
+        self.product_ids = product_ids
+
+
+def by_id(values):
+    '''
+    CASE expression of mapping row id -> value, with one WHEN per distinct value as rows mostly share a few
+    '''
+    ids = defaultdict(list)
+    for row_id, value in values.items():
+        ids[value].append(row_id)
+    return Case(*[When(id__in=row_ids, then=Value(value)) for value, row_ids in ids.items()], default=Value(0))
+
+
+def reserve(order):
+    '''
+    Hold order quantity of its product info until RESERVATION_TTL expires, inactive product infos are not held.
+    The guarded update checks and increments reserved in one statement, so concurrent holds never exceed quantity
+    '''
+    held = ProductInfo.objects.filter(id=order.product_id, is_active=True,
+                                      quantity__gte=F('reserved') + order.quantity) \
+        .update(reserved=F('reserved') + order.quantity)
+    if not held:
+        raise OutOfStockError([order.product_id])
+    return StockReservation.objects.create(order=order, product_info_id=order.product_id, quantity=order.quantity,
+                                           expires_at=timezone.now() + settings.RESERVATION_TTL)
+
+
+def add_lines(user, basket, lines):
+    '''
+    Add (product info id, quantity) lines to the basket, hold their stock and count them in basket totals,
+    must run in a transaction with the basket row locked. Lines of one product are merged together
+    and into the basket order of that product when there is one. Return mapping product info id -> ADDED, MERGED, NOT_FOUND or OUT_OF_STOCK.
+    Product infos are locked in id order, so availability checked here holds until all holds are written
+    by one update, the number of queries does not depend on the number of lines
+    '''
+    quantities = defaultdict(int)
+    for product_id, quantity in lines:
+        quantities[product_id] += quantity
+    statuses = dict.fromkeys(quantities, NOT_FOUND)
+
+    held = {}
+    infos = ProductInfo.objects.select_for_update().filter(id__in=quantities, is_active=True).order_by('id')
+    prices = {}
+    for info_id, quantity, reserved, price in infos.values_list('id', 'quantity', 'reserved', 'price'):
+        if quantity >= reserved + quantities[info_id]:
+            held[info_id] = quantities[info_id]
+            prices[info_id] = price
+        else:
+            statuses[info_id] = OUT_OF_STOCK
+    if not held:
+        return statuses
+    ProductInfo.objects.filter(id__in=held).update(reserved=F('reserved') + by_id(held))
+
+    existing = {}
+    for order in Order.objects.filter(basket=basket, product_id__in=held).select_related('reservation').order_by('id'):
+        existing.setdefault(order.product_id, order)
+
+    expires_at = timezone.now() + settings.RESERVATION_TTL
+    new_orders, merged_orders, new_reservations, merged_reservations = [], [], [], []
+    total = 0
+    for product_id, quantity in held.items():
+        order = existing.get(product_id)
+        if order is None:
+            new_orders.append(Order(user=user, product_id=product_id, quantity=quantity, basket=basket,
+                                    price=prices[product_id]))
+            total += quantity * prices[product_id]
+            statuses[product_id] = ADDED
+            continue
+        # merged quantity keeps the price the order was added with
+        total += quantity * (order.price if order.price is not None else prices[product_id])
+        order.quantity += quantity
+        order.updated_at = timezone.now()
+        merged_orders.append(order)
+        reservation = getattr(order, 'reservation', None)
+        if reservation is None:
+            new_reservations.append(StockReservation(order=order, product_info_id=product_id, quantity=quantity,
+                                                     expires_at=expires_at))
+        else:
+            reservation.quantity += quantity
+            reservation.expires_at = expires_at
+            merged_reservations.append(reservation)
+        statuses[product_id] = MERGED
+
+    Order.objects.bulk_create(new_orders)
+    Order.objects.bulk_update(merged_orders, ['quantity', 'updated_at'])
+    new_reservations += [StockReservation(order=order, product_info_id=order.product_id, quantity=order.quantity,
+                                          expires_at=expires_at) for order in new_orders]
+    StockReservation.objects.bulk_create(new_reservations)
+    StockReservation.objects.bulk_update(merged_reservations, ['quantity', 'expires_at'])
+    add_to_basket(basket.id, sum(held.values()), total)
+    return statuses
+
+
+def release(reservations):
+    '''
+    Return quantity of reservations, which should be locked by the caller, and delete them
+    '''
+    totals = defaultdict(int)
+    for reservation in reservations:
+        totals[reservation.product_info_id] += reservation.quantity
+    for product_info_id in sorted(totals):
+        ProductInfo.objects.filter(id=product_info_id).update(reserved=F('reserved') - totals[product_info_id])
+    StockReservation.objects.filter(id__in=[reservation.id for reservation in reservations]).delete()
+
+
+def release_expired(batch_size=1000):
+    '''
+    Release up to batch_size expired reservations, reservations locked by a confirmation are skipped
+    '''
+    with transaction.atomic():
+        expired = list(StockReservation.objects.select_for_update(skip_locked=True)
+                       .filter(expires_at__lte=timezone.now()).order_by('expires_at')[:batch_size])
+        release(expired)
+    return len(expired)
+
+
+def commit_basket(basket):
+    '''
+    Decrement stock by basket orders, must run in a transaction with the basket row locked.
+    Held quantity is converted from reserved, orders whose hold expired need free stock.
+    Product infos are locked in id order, so confirmations do not deadlock, and decremented by one guarded update,
+    the number of queries does not depend on the basket. Shops of sold out product infos get a new version
+    after commit, as their catalog responses filtered by in_stock are stale
+    '''
+    reservations = list(StockReservation.objects.select_for_update(of=('self',)).filter(order__basket=basket))
+    held = defaultdict(int)
+    for reservation in reservations:
+        held[reservation.product_info_id] += reservation.quantity
+
+    totals = dict(Order.objects.filter(basket=basket).order_by().values('product_id')
+                  .annotate(total=Sum('quantity')).values_list('product_id', 'total'))
+    unheld = {product_id: total - held[product_id] for product_id, total in totals.items()}
+    infos = ProductInfo.objects.select_for_update().filter(id__in=totals).order_by('id') \
+        .values_list('id', 'shop_id', 'product_id', 'quantity', 'reserved')
+    sold_out = defaultdict(set)
+    available = set()
+    for info_id, shop_id, product_id, quantity, reserved in infos:
+        if quantity >= reserved + unheld[info_id]:
+            available.add(info_id)
+            if quantity == totals[info_id]:
+                sold_out[shop_id].add(product_id)
+    missing = sorted(set(totals) - available)
+    if missing:
+        raise OutOfStockError(missing)
+
+    updated = ProductInfo.objects.filter(id__in=totals, quantity__gte=F('reserved') + by_id(unheld)) \
+        .update(quantity=F('quantity') - by_id(totals), reserved=F('reserved') - by_id(held))
+    if updated != len(totals):
+        raise OutOfStockError(sorted(totals))
+    StockReservation.objects.filter(id__in=[reservation.id for reservation in reservations]).delete()
+
+    def invalidate():
+        for shop_id, product_ids in sold_out.items():
+            bump_shop_version(shop_id)
+            invalidate_shop(shop_id, product_ids)
+
+    if sold_out:
+        transaction.on_commit(invalidate)
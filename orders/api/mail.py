@@ -0,0 +1,97 @@
+import smtplib
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from api.models import Order, OutgoingEmail
+
+
+def render(to, subject, template, context):
+    '''
+    Unsaved outbox email with text body rendered from <template>.txt and html alternative from <template>.html
+    '''
+    return OutgoingEmail(to=to, subject=subject, body=render_to_string(f'{template}.txt', context),
+                         html=render_to_string(f'{template}.html', context))
+
+
+def enqueue(emails):
+    '''
+    Save emails to the outbox in the current transaction, the outbox is flushed after it commits
+    '''
+    # tasks import this module
+    from api.tasks import flush_outbox
+
+    emails = [email for email in emails if email.to]
+    if emails:
+        OutgoingEmail.objects.bulk_create(emails)
+        transaction.on_commit(flush_outbox.delay)
+
+
+def confirmation_emails(confirmed_basket):
+    '''
+    Order confirmation for the customer and new order notification for every partner with products in the basket
+    '''
+    orders = list(Order.objects.filter(confirmed_basket=confirmed_basket)
+                  .select_related('product__product', 'product__shop__user').order_by('id'))
+    emails = [render(confirmed_basket.user.email, f'Order {confirmed_basket.id} confirmed', 'email/order_confirmed',
+                     {'confirmed_basket': confirmed_basket, 'orders': orders})]
+
+    partners = {}
+    for order in orders:
+        partners.setdefault(order.product.shop.user, []).append(order)
+    for partner, partner_orders in partners.items():
+        emails.append(render(partner.email, f'New order {confirmed_basket.id}', 'email/partner_order',
+                             {'confirmed_basket': confirmed_basket, 'orders': partner_orders}))
+    return emails
+
+
+def message(email, connection):
+    msg = EmailMultiAlternatives(email.subject, email.body, settings.EMAIL_HOST_USER, [email.to],
+                                 connection=connection)
+    if email.html:
+        msg.attach_alternative(email.html, 'text/html')
+    return msg
+
+
+def backoff(attempts):
+    return min(settings.MAIL_RETRY_DELAY * 2 ** (attempts - 1), settings.MAIL_RETRY_MAX_DELAY)
+
+
+def flush(batch_size):
+    '''
+    Send a batch of due outbox emails over one connection, return number of emails taken from the outbox.
+    An email failed to send is retried with exponential backoff, after MAIL_MAX_ATTEMPTS attempts it is failed.
+    Rows are locked while sending, so concurrent flushes take different emails
+    '''
+    with transaction.atomic():
+        emails = list(OutgoingEmail.objects.select_for_update(skip_locked=True)
+                      .filter(state=OutgoingEmail.QUEUED, next_attempt_at__lte=timezone.now())
+                      .order_by('next_attempt_at', 'id')[:batch_size])
+        if not emails:
+            return 0
+
+        connection = get_connection()
+        try:
+            for email in emails:
+                try:
+                    # opens the connection for the first email and after a failure closed it
+                    connection.open()
+                    connection.send_messages([message(email, connection)])
+                except (smtplib.SMTPException, OSError) as error:
+                    email.attempts += 1
+                    email.last_error = str(error)
+                    if email.attempts >= settings.MAIL_MAX_ATTEMPTS:
+                        email.state = OutgoingEmail.FAILED
+                    else:
+                        email.next_attempt_at = timezone.now() + backoff(email.attempts)
+                    connection.close()
+                else:
+                    email.state = OutgoingEmail.SENT
+                    email.sent_at = timezone.now()
+        finally:
+            connection.close()
+        OutgoingEmail.objects.bulk_update(emails, ['state', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+    return len(emails)
@@ -0,0 +1,18 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from api.analytics import backfill
+
+
+class Command(BaseCommand):
+    help = 'Rebuild hourly and daily sales rollups from confirmed orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', type=date.fromisoformat, help='First date to rebuild, YYYY-MM-DD')
+        parser.add_argument('--date-to', type=date.fromisoformat, help='Last date to rebuild, YYYY-MM-DD')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rollup rows per insert')
+
+    def handle(self, *args, **options):
+        days = backfill(options['date_from'], options['date_to'], options['batch_size'])
+        self.stdout.write(f'Rebuilt sales rollups of {days} days')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.snapshots import backfill
+
+
+class Command(BaseCommand):
+    help = 'Snapshot product infos into confirmed orders confirmed before snapshots were taken'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Orders per transaction')
+
+    def handle(self, *args, **options):
+        updated = backfill(options['batch_size'])
+        self.stdout.write(f'Snapshotted {updated} confirmed orders')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.dedup import deduplicate
+
+
+class Command(BaseCommand):
+    help = 'Merge duplicate product infos of a product in a shop and duplicate product parameters, ' \
+           'must be run before migrations adding their unique constraints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only count duplicates')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            report = deduplicate(dry_run=options['dry_run'])
+        for entity, duplicates in report.items():
+            self.stdout.write(f'{entity}: {duplicates} duplicates' + ('' if options['dry_run'] or not duplicates
+                                                                     else ', removed'))
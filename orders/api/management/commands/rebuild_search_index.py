@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api.models import ProductInfo
+from api.search import index_product_infos
+
+
+class Command(BaseCommand):
+    help = 'Rebuild product search index for all product infos, the import keeps it up to date afterwards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        ids = ProductInfo.objects.order_by('id').values_list('id', flat=True)
+        batch = []
+        indexed = 0
+        for info_id in ids.iterator(chunk_size=options['batch_size']):
+            batch.append(info_id)
+            if len(batch) == options['batch_size']:
+                index_product_infos(batch, options['batch_size'])
+                indexed += len(batch)
+                batch = []
+        index_product_infos(batch, options['batch_size'])
+        indexed += len(batch)
+        self.stdout.write(f'Indexed {indexed} product infos')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.totals import verify
+
+
+class Command(BaseCommand):
+    help = 'Compare running basket totals and shop revenue with totals computed from orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help='Overwrite drifted totals with computed ones')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            report = verify(repair=options['repair'])
+        for entity, drifted in report.items():
+            self.stdout.write(f'{entity}: {drifted} drifted' + (', repaired' if options['repair'] and drifted else ''))
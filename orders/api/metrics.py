@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+
+
+class QueryRecorder:
+    '''
+    Database execute wrapper counting queries, their time and executions of every SQL template,
+    the same template executed again and again within a request is an N+1 query
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.templates = Counter()
+        self.template_time = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.time += elapsed
+            self.templates[sql] += 1
+            self.template_time[sql] += elapsed
+
+    def duplicates(self, threshold):
+        '''
+        Mapping SQL template -> executions of templates executed at least threshold times
+        '''
+        return {sql: count for sql, count in self.templates.items() if count >= threshold}
+
+
+class Metrics:
+    '''
+    Per-view aggregates of requests of this worker: wall time histogram, queries, database and rendering time,
+    response size and duplicate queries, and traces of slow requests
+    '''
+    FIELDS = ('queries', 'db_seconds', 'render_seconds', 'response_bytes', 'duplicate_queries')
+
+    def __init__(self, buckets, traces):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.views = {}
+        self.traces = deque(maxlen=traces)
+
+    def record(self, view, method, status, seconds, **values):
+        with self.lock:
+            entry = self.views.get((view, method))
+            if entry is None:
+                entry = self.views[(view, method)] = dict(
+                    dict.fromkeys(self.FIELDS, 0), count=0, seconds=0.0, buckets=[0] * len(self.buckets),
+                    errors=0)
+            entry['count'] += 1
+            entry['seconds'] += seconds
+            entry['errors'] += status >= 500
+            for field in self.FIELDS:
+                entry[field] += values[field]
+            for position, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry['buckets'][position] += 1
+                    break
+
+    def trace(self, trace):
+        self.traces.append(trace)
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+            self.traces.clear()
+
+    def prometheus(self):
+        '''
+        Aggregates in Prometheus text exposition format
+        '''
+        with self.lock:
+            views = {key: dict(entry, buckets=list(entry['buckets'])) for key, entry in self.views.items()}
+
+        lines = [
+            '# HELP orders_request_duration_seconds Wall time of requests by view',
+            '# TYPE orders_request_duration_seconds histogram',
+        ]
+        for (view, method), entry in sorted(views.items()):
+            labels = f'view="{view}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry['buckets']):
+                cumulative += count
+                lines.append(f'orders_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'orders_request_duration_seconds_bucket{{{labels},le="+Inf"}} {entry["count"]}')
+            lines.append(f'orders_request_duration_seconds_sum{{{labels}}} {entry["seconds"]}')
+            lines.append(f'orders_request_duration_seconds_count{{{labels}}} {entry["count"]}')
+
+        for name, field, help in (
+                ('orders_request_errors_total', 'errors', 'Requests answered with 5xx status'),
+                ('orders_request_queries_total', 'queries', 'Database queries'),
+                ('orders_request_db_seconds_total', 'db_seconds', 'Time spent in database queries'),
+                ('orders_request_render_seconds_total', 'render_seconds', 'Time spent rendering responses'),
+                ('orders_response_bytes_total', 'response_bytes', 'Size of not streamed responses'),
+                ('orders_request_duplicate_queries_total', 'duplicate_queries',
+                 'Executions of SQL templates repeated within a request, N+1 queries')):
+            lines += [f'# HELP {name} {help} by view', f'# TYPE {name} counter']
+            for (view, method), entry in sorted(views.items()):
+                lines.append(f'{name}{{view="{view}",method="{method}"}} {entry[field]}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics(settings.PERFORMANCE_METRICS['BUCKETS'], settings.PERFORMANCE_METRICS['TRACES'])
@@ -0,0 +1,69 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from api.metrics import QueryRecorder, metrics
+
+
+class PerformanceMiddleware:
+    '''
+    Record wall time, database queries and time, rendering time and response size of every request by view.
+    Slow requests are traced with their SQL, sampled by TRACE_SAMPLE, see PERFORMANCE_METRICS setting
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = settings.PERFORMANCE_METRICS
+        if not options['ENABLED']:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        request.render_seconds = 0.0
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        seconds = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match is not None else '<unresolved>'
+        duplicates = recorder.duplicates(options['DUPLICATE_THRESHOLD'])
+        metrics.record(view, request.method, response.status_code, seconds,
+                       queries=recorder.count,
+                       db_seconds=recorder.time,
+                       render_seconds=request.render_seconds,
+                       response_bytes=0 if response.streaming else len(response.content),
+                       duplicate_queries=sum(count - 1 for count in duplicates.values()))
+
+        if seconds >= options['SLOW_REQUEST'] and random.random() < options['TRACE_SAMPLE']:
+            metrics.trace({
+                'view': view,
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'seconds': seconds,
+                'db_seconds': recorder.time,
+                'render_seconds': request.render_seconds,
+                'queries': [{'sql': sql, 'count': count, 'seconds': recorder.template_time[sql]}
+                            for sql, count in recorder.templates.most_common()],
+                'duplicates': duplicates,
+            })
+        return response
+
+    def process_template_response(self, request, response):
+        '''
+        REST framework responses are rendered after the view, time it with a post render callback
+        '''
+        start = time.perf_counter()
+
+        def rendered(response):
+            request.render_seconds += time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
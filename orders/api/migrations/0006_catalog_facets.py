@@ -0,0 +1,69 @@
+# Generated by Django 4.1.2 on 2026-10-18 08:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_product_info_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryFacet',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('offers', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ParameterFacet',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=100)),
+                ('offers', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='productinfo',
+            index=models.Index(fields=['product', 'price'], name='api_productinfo_product_price'),
+        ),
+        migrations.AddIndex(
+            model_name='productinfo',
+            index=models.Index(fields=['shop', 'is_active'], name='api_productinfo_shop_active'),
+        ),
+        migrations.AddIndex(
+            model_name='productparameter',
+            index=models.Index(fields=['parameter', 'value'], name='api_productparam_param_value'),
+        ),
+        migrations.AddField(
+            model_name='parameterfacet',
+            name='parameter',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.parameter'),
+        ),
+        migrations.AddField(
+            model_name='parameterfacet',
+            name='shop',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parameter_facets', to='api.shop'),
+        ),
+        migrations.AddField(
+            model_name='categoryfacet',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.category'),
+        ),
+        migrations.AddField(
+            model_name='categoryfacet',
+            name='shop',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_facets', to='api.shop'),
+        ),
+        migrations.AddConstraint(
+            model_name='parameterfacet',
+            constraint=models.UniqueConstraint(fields=('shop', 'parameter', 'value'), name='unique_parameter_facet'),
+        ),
+        migrations.AddConstraint(
+            model_name='categoryfacet',
+            constraint=models.UniqueConstraint(fields=('shop', 'category'), name='unique_category_facet'),
+        ),
+    ]
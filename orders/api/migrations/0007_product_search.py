@@ -0,0 +1,40 @@
+# Generated by Django 4.1.2 on 2026-10-18 08:34
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE INDEX api_productinfo_search_gin ON api_productinfo USING gin (search_vector)')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS api_productinfo_search_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_catalog_facets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productinfo',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(db_index=True, max_length=64)),
+                ('weight', models.PositiveSmallIntegerField()),
+                ('product_info', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='api.productinfo')),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.2 on 2026-10-18 08:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='basket',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
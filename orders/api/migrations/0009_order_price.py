@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-18 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='price',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.1.2 on 2026-10-18 08:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='basket',
+            name='items',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='basket',
+            name='total',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='confirmedbasket',
+            name='confirmed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='confirmedbasket',
+            name='items',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='confirmedbasket',
+            name='total',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ShopDailyRevenue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('items', models.PositiveIntegerField(default=0)),
+                ('revenue', models.PositiveBigIntegerField(default=0)),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='api.shop')),
+            ],
+            options={
+                'verbose_name': 'Shop daily revenue',
+                'verbose_name_plural': 'Shop daily revenues',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shopdailyrevenue',
+            constraint=models.UniqueConstraint(fields=('shop', 'date'), name='unique_shop_daily_revenue'),
+        ),
+    ]
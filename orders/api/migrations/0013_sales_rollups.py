@@ -0,0 +1,64 @@
+# Generated by Django 4.1.2 on 2026-10-18 08:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_order_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlySales',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=128)),
+                ('orders', models.IntegerField(default=0)),
+                ('items', models.IntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('hour', models.DateTimeField()),
+                ('product_info', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.productinfo')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.shop')),
+            ],
+            options={
+                'verbose_name': 'Hourly sales',
+                'verbose_name_plural': 'Hourly sales',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=128)),
+                ('orders', models.IntegerField(default=0)),
+                ('items', models.IntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('date', models.DateField()),
+                ('product_info', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.productinfo')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.shop')),
+            ],
+            options={
+                'verbose_name': 'Daily sales',
+                'verbose_name_plural': 'Daily sales',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='hourlysales',
+            index=models.Index(fields=['shop', 'hour'], name='api_hourlysales_shop_hour'),
+        ),
+        migrations.AddConstraint(
+            model_name='hourlysales',
+            constraint=models.UniqueConstraint(fields=('product_info', 'city', 'hour'), name='unique_hourly_sales'),
+        ),
+        migrations.AddIndex(
+            model_name='dailysales',
+            index=models.Index(fields=['shop', 'date'], name='api_dailysales_shop_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('product_info', 'city', 'date'), name='unique_daily_sales'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+# case-insensitive unique index of user emails, blank emails of users created without one are not indexed
+USER_EMAIL_UNIQUE = models.UniqueConstraint(Lower('email'), name='auth_user_email_ci_unique',
+                                            condition=~models.Q(email=''))
+
+
+def check_duplicates(apps, schema_editor):
+    '''
+    Stop before the index build when emails of users differ only in case, such users are to be merged
+    or their emails changed by hand, the index can not be built over them
+    '''
+    duplicates = apps.get_model('auth', 'User').objects.exclude(email='').values(email_lower=Lower('email')) \
+        .annotate(users=Count('id')).filter(users__gt=1).order_by('email_lower').values_list('email_lower', flat=True)
+    duplicates = list(duplicates)
+    if duplicates:
+        raise RuntimeError(f'Emails used by several users in different case: {", ".join(duplicates)}')
+
+
+def add_constraint(apps, schema_editor):
+    model = apps.get_model('auth', 'User')
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.add_constraint(model, USER_EMAIL_UNIQUE)
+        return
+    # the unique index of an expression constraint is built concurrently, writes to users are not blocked
+    statement = USER_EMAIL_UNIQUE.create_sql(model, schema_editor)
+    statement.template = statement.template.replace('CREATE UNIQUE INDEX', 'CREATE UNIQUE INDEX CONCURRENTLY', 1)
+    schema_editor.execute(statement)
+
+
+def remove_constraint(apps, schema_editor):
+    model = apps.get_model('auth', 'User')
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.remove_constraint(model, USER_EMAIL_UNIQUE)
+        return
+    schema_editor.execute(schema_editor.sql_delete_index_concurrently
+                          % {'name': schema_editor.quote_name(USER_EMAIL_UNIQUE.name)})
+
+
+class Migration(migrations.Migration):
+    # concurrent index builds can not run in a transaction.
+    # A failed build leaves an invalid index, drop it before migrating again
+    atomic = False
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('api', '0015_outgoing_email'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicates, migrations.RunPython.noop),
+        migrations.RunPython(add_constraint, remove_constraint),
+    ]
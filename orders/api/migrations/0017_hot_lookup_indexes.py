@@ -0,0 +1,84 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+# exact email lookups of registration confirmation and password reset
+USER_EMAIL = models.Index(fields=['email'], name='auth_user_email_idx')
+
+
+class AddIndexConcurrentlyOnPostgres(AddIndexConcurrently):
+    '''
+    CREATE INDEX CONCURRENTLY on PostgreSQL, plain AddIndex on other databases
+    '''
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class AddUniqueConstraintConcurrently(migrations.AddConstraint):
+    '''
+    On PostgreSQL the unique index is built concurrently and the constraint is added over it,
+    writes are only blocked for the ALTER TABLE. A failed build leaves an invalid index, drop it before migrating again
+    '''
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        table = schema_editor.quote_name(model._meta.db_table)
+        name = schema_editor.quote_name(self.constraint.name)
+        columns = ', '.join(schema_editor.quote_name(model._meta.get_field(field).column)
+                            for field in self.constraint.fields)
+        schema_editor.execute(f'CREATE UNIQUE INDEX CONCURRENTLY {name} ON {table} ({columns})')
+        schema_editor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}')
+
+
+def add_user_email_index(apps, schema_editor):
+    model = apps.get_model('auth', 'User')
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(model, USER_EMAIL, concurrently=True)
+    else:
+        schema_editor.add_index(model, USER_EMAIL)
+
+
+def remove_user_email_index(apps, schema_editor):
+    model = apps.get_model('auth', 'User')
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(model, USER_EMAIL, concurrently=True)
+    else:
+        schema_editor.remove_index(model, USER_EMAIL)
+
+
+class Migration(migrations.Migration):
+    # concurrent index builds can not run in a transaction.
+    # Run deduplicate_catalog command first, unique constraints can not be built over duplicates
+    atomic = False
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('api', '0016_user_email_unique'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyOnPostgres(
+            model_name='order',
+            index=models.Index(fields=['user', 'confirmed_basket'], name='api_order_user_confirmed'),
+        ),
+        AddUniqueConstraintConcurrently(
+            model_name='productinfo',
+            constraint=models.UniqueConstraint(fields=['shop', 'product'], name='unique_product_info'),
+        ),
+        AddUniqueConstraintConcurrently(
+            model_name='productparameter',
+            constraint=models.UniqueConstraint(fields=['product_info', 'parameter'], name='unique_product_parameter'),
+        ),
+        migrations.RunPython(add_user_email_index, remove_user_email_index),
+    ]
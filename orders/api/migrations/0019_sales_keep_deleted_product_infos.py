@@ -0,0 +1,24 @@
+# Generated by Django 4.1.2 on 2026-10-18 10:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_order_snapshot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailysales',
+            name='product_info',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.productinfo'),
+        ),
+        migrations.AlterField(
+            model_name='hourlysales',
+            name='product_info',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.productinfo'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.2 on 2026-10-18 10:33
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_sales_keep_deleted_product_infos'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='productinfo',
+            name='fingerprint',
+        ),
+    ]
@@ -1,9 +1,14 @@
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 # Create your models here.
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
 from django_rest_passwordreset.tokens import get_token_generator
+from rest_framework.authtoken.models import Token
+
+from api.cache import invalidate_user
 
 
 class UserProfile(models.Model):
@@ -15,15 +20,34 @@ class UserProfile(models.Model):
         return self.user.username
 
 
+def create_profiles(users):
+    '''
+    Create profiles and baskets of new users, two INSERTs for any number of users
+    '''
+    profiles = UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+    Basket.objects.bulk_create([Basket(user=profile) for profile in profiles])
+
+
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
-        UserProfile.objects.create(user=instance)
-        Basket.objects.create(user=instance.userprofile)
+        create_profiles([instance])
 
 
 post_save.connect(create_user_profile, sender=User)
 
 
+def invalidate_user_tokens(sender, instance, **kwargs):
+    '''
+    Drop cached authentication of the user when the user, the profile or the token changes
+    '''
+    invalidate_user(instance.id if sender is User else instance.user_id)
+
+
+post_save.connect(invalidate_user_tokens, sender=User)
+post_save.connect(invalidate_user_tokens, sender=UserProfile)
+post_delete.connect(invalidate_user_tokens, sender=Token)
+
+
 class Shop(models.Model):
     class Meta:
         verbose_name = 'Shop'
@@ -33,6 +57,8 @@ class Shop(models.Model):
     url = models.URLField(verbose_name='Shop url')
     filename = models.CharField(verbose_name='Filename', max_length=50)
     user = models.OneToOneField(User, on_delete=models.CASCADE)
+    # bumped on every catalog change of the shop, used for ETags of product views
+    version = models.PositiveIntegerField(default=0)
     #products
     #categories
 
@@ -59,12 +85,26 @@ class Product(models.Model):
 
 
 class ProductInfo(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'price'], name='api_productinfo_product_price'),
+            models.Index(fields=['shop', 'is_active'], name='api_productinfo_shop_active'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'product'], name='unique_product_info'),
+        ]
+
     product = models.ForeignKey('Product', on_delete=models.CASCADE)
     shop = models.ForeignKey('Shop', on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
+    # part of quantity held by baskets, see api.inventory
+    reserved = models.PositiveIntegerField(default=0)
     model = models.CharField(null=True, max_length=128)
     price = models.PositiveIntegerField()
     price_rrc = models.PositiveIntegerField()
+    is_active = models.BooleanField(default=True)
+    # PostgreSQL full text search document, GIN index is created by migration
+    search_vector = SearchVectorField(null=True, blank=True)
     # orders
 
 
@@ -78,23 +118,115 @@ class Parameter(models.Model):
 
 
 class ProductParameter(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=['parameter', 'value'], name='api_productparam_param_value'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['product_info', 'parameter'], name='unique_product_parameter'),
+        ]
+
     product_info = models.ForeignKey('ProductInfo', on_delete=models.CASCADE)
     parameter = models.ForeignKey('Parameter', on_delete=models.CASCADE)
     value = models.CharField(max_length=100)
 
 
+class SearchToken(models.Model):
+    '''
+    Inverted index of product search used when the database is not PostgreSQL
+    '''
+    token = models.CharField(max_length=64, db_index=True)
+    product_info = models.ForeignKey('ProductInfo', on_delete=models.CASCADE, related_name='search_tokens')
+    weight = models.PositiveSmallIntegerField()
+
+
+class CategoryFacet(models.Model):
+    '''
+    Number of shop's active offers per category, maintained by the import
+    '''
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'category'], name='unique_category_facet'),
+        ]
+
+    shop = models.ForeignKey('Shop', on_delete=models.CASCADE, related_name='category_facets')
+    category = models.ForeignKey('Category', on_delete=models.CASCADE)
+    offers = models.PositiveIntegerField()
+
+
+class ParameterFacet(models.Model):
+    '''
+    Number of shop's active offers per parameter value, maintained by the import
+    '''
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'parameter', 'value'], name='unique_parameter_facet'),
+        ]
+
+    shop = models.ForeignKey('Shop', on_delete=models.CASCADE, related_name='parameter_facets')
+    parameter = models.ForeignKey('Parameter', on_delete=models.CASCADE)
+    value = models.CharField(max_length=100)
+    offers = models.PositiveIntegerField()
+
+
+def keep_confirmed_orders(collector, field, sub_objs, using):
+    '''
+    on_delete of Order.product: confirmed orders outlive their product info with its snapshot,
+    basket orders are deleted with it
+    '''
+    confirmed = [order for order in sub_objs if order.confirmed_basket_id is not None]
+    in_basket = [order for order in sub_objs if order.confirmed_basket_id is None]
+    if confirmed:
+        models.SET_NULL(collector, field, confirmed, using)
+    if in_basket:
+        models.CASCADE(collector, field, in_basket, using)
+
+
 class Order(models.Model):
     class Meta:
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
+        indexes = [
+            # keyset pagination of partner order feed
+            models.Index(fields=['product', 'updated_at', 'id'], name='api_order_product_updated'),
+            models.Index(fields=['updated_at', 'id'], name='api_order_updated'),
+            # confirmed orders of a user
+            models.Index(fields=['user', 'confirmed_basket'], name='api_order_user_confirmed'),
+        ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     dt = models.DateField(auto_now_add=True)
     status = models.BooleanField(default=True)
-    product = models.ForeignKey('ProductInfo', related_name='orders', on_delete=models.CASCADE)
+    product = models.ForeignKey('ProductInfo', related_name='orders', on_delete=keep_confirmed_orders,
+                                null=True, blank=True)
     quantity = models.PositiveIntegerField()
     basket = models.ForeignKey('Basket', on_delete=models.CASCADE, related_name='orders', null=True, blank=True)
     confirmed_basket = models.ForeignKey('ConfirmedBasket', on_delete=models.CASCADE, related_name='orders', null=True, blank=True)
+    # price of the product info when the order was added, kept on confirmation, see api.snapshots
+    price = models.PositiveIntegerField(null=True, blank=True)
+    # snapshot of the product info taken on confirmation, see api.snapshots,
+    # confirmed orders are read without joins and kept when the product info is deleted
+    shop = models.ForeignKey('Shop', on_delete=models.SET_NULL, related_name='+', null=True, blank=True)
+    shop_name = models.CharField(max_length=50, blank=True, default='')
+    product_name = models.CharField(max_length=50, blank=True, default='')
+    model = models.CharField(null=True, blank=True, max_length=128)
+    price_rrc = models.PositiveIntegerField(null=True, blank=True)
+    # auto_now is not applied by update() and bulk_update(), they set it explicitly
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class StockReservation(models.Model):
+    '''
+    Time-limited hold of product info quantity for an order in a basket
+    '''
+    class Meta:
+        verbose_name = 'Stock reservation'
+        verbose_name_plural = 'Stock reservations'
+
+    order = models.OneToOneField('Order', on_delete=models.CASCADE, related_name='reservation')
+    product_info = models.ForeignKey('ProductInfo', on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
 
 
 class Basket(models.Model):
@@ -104,6 +236,11 @@ class Basket(models.Model):
 
     user = models.OneToOneField('UserProfile', on_delete=models.CASCADE)
     # orders
+    # bumped on every change of user's orders, used for ETags of basket and confirmed orders
+    version = models.PositiveIntegerField(default=0)
+    # running quantity and sum of basket orders at the prices they were added with, see api.totals
+    items = models.PositiveIntegerField(default=0)
+    total = models.PositiveBigIntegerField(default=0)
 
 
 class ConfirmedBasket(models.Model):
@@ -119,6 +256,73 @@ class ConfirmedBasket(models.Model):
     mail = models.CharField(max_length=30, choices=MAILS, default='новая почта')
     index = models.PositiveIntegerField()
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='confirmed_basket')
+    confirmed_at = models.DateTimeField(default=timezone.now)
+    # quantity and sum of confirmed orders at the prices they were added with, see api.totals
+    items = models.PositiveIntegerField(default=0)
+    total = models.PositiveBigIntegerField(default=0)
+
+
+class ShopDailyRevenue(models.Model):
+    '''
+    Confirmed orders of a shop per day of confirmation, maintained by api.totals
+    '''
+    class Meta:
+        verbose_name = 'Shop daily revenue'
+        verbose_name_plural = 'Shop daily revenues'
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'date'], name='unique_shop_daily_revenue'),
+        ]
+
+    shop = models.ForeignKey('Shop', on_delete=models.CASCADE, related_name='daily_revenue')
+    date = models.DateField()
+    orders = models.PositiveIntegerField(default=0)
+    items = models.PositiveIntegerField(default=0)
+    revenue = models.PositiveBigIntegerField(default=0)
+
+
+class SalesRollup(models.Model):
+    '''
+    Confirmed orders of a product info per city of delivery and period, maintained by api.analytics.
+    Rows of a deleted product info are kept without it, like its confirmed orders
+    '''
+    class Meta:
+        abstract = True
+
+    shop = models.ForeignKey('Shop', on_delete=models.CASCADE, related_name='+')
+    product_info = models.ForeignKey('ProductInfo', on_delete=models.SET_NULL, related_name='+', null=True,
+                                     blank=True)
+    city = models.CharField(max_length=128)
+    orders = models.IntegerField(default=0)
+    items = models.IntegerField(default=0)
+    revenue = models.BigIntegerField(default=0)
+
+
+class HourlySales(SalesRollup):
+    class Meta:
+        verbose_name = 'Hourly sales'
+        verbose_name_plural = 'Hourly sales'
+        constraints = [
+            models.UniqueConstraint(fields=['product_info', 'city', 'hour'], name='unique_hourly_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['shop', 'hour'], name='api_hourlysales_shop_hour'),
+        ]
+
+    hour = models.DateTimeField()
+
+
+class DailySales(SalesRollup):
+    class Meta:
+        verbose_name = 'Daily sales'
+        verbose_name_plural = 'Daily sales'
+        constraints = [
+            models.UniqueConstraint(fields=['product_info', 'city', 'date'], name='unique_daily_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['shop', 'date'], name='api_dailysales_shop_date'),
+        ]
+
+    date = models.DateField()
 
 
 class Contact(models.Model):
@@ -147,3 +351,111 @@ class ConfirmEmailToken(models.Model):
             self.key = self.generate_key()
         return super(ConfirmEmailToken, self).save(*args, **kwargs)
 
+
+
+class ImportJob(models.Model):
+    QUEUED = 'queued'
+    IMPORTING = 'importing'
+    DONE = 'done'
+    FAILED = 'failed'
+    IMPORT = 'import'
+    SYNC = 'sync'
+    MODES = [
+        (IMPORT, 'Import'),
+        (SYNC, 'Sync'),
+    ]
+    PHASES = [
+        (QUEUED, 'Queued'),
+        (IMPORTING, 'Importing'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    class Meta:
+        verbose_name = 'Import job'
+        verbose_name_plural = 'Import jobs'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='import_jobs')
+    file = models.FileField(upload_to='imports/')
+    format = models.CharField(max_length=10, null=True, blank=True)
+    mode = models.CharField(max_length=10, choices=MODES, default=IMPORT)
+    deactivate_missing = models.BooleanField(default=False)
+    phase = models.CharField(max_length=10, choices=PHASES, default=QUEUED)
+    rows_processed = models.PositiveIntegerField(default=0)
+    stats = models.JSONField(default=dict, blank=True)
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def throughput(self):
+        '''
+        Goods rows per second since the job was started
+        '''
+        if self.started_at is None:
+            return 0
+        seconds = ((self.finished_at or self.updated_at) - self.started_at).total_seconds()
+        return round(self.rows_processed / seconds, 1) if seconds > 0 else 0
+
+
+class ExportJob(models.Model):
+    QUEUED = 'queued'
+    EXPORTING = 'exporting'
+    DONE = 'done'
+    FAILED = 'failed'
+    PHASES = [
+        (QUEUED, 'Queued'),
+        (EXPORTING, 'Exporting'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    class Meta:
+        verbose_name = 'Export job'
+        verbose_name_plural = 'Export jobs'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    format = models.CharField(max_length=10)
+    filters = models.JSONField(default=dict, blank=True)
+    phase = models.CharField(max_length=10, choices=PHASES, default=QUEUED)
+    # gzip compressed export
+    file = models.FileField(upload_to='exports/', null=True, blank=True)
+    rows_exported = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+
+class OutgoingEmail(models.Model):
+    '''
+    Email waiting in the outbox, sent in batches over one connection by flush_outbox task
+    '''
+    QUEUED = 'queued'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATES = [
+        (QUEUED, 'Queued'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    class Meta:
+        verbose_name = 'Outgoing email'
+        verbose_name_plural = 'Outgoing emails'
+        indexes = [
+            models.Index(fields=['state', 'next_attempt_at'], name='api_outgoingemail_due'),
+        ]
+
+    to = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html = models.TextField(blank=True)
+    state = models.CharField(max_length=10, choices=STATES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
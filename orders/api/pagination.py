@@ -0,0 +1,90 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CatalogPagination(CursorPagination):
+    '''
+    Cursor pagination of products by id, no COUNT query is made
+    '''
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class UpdatedKeysetPagination(BasePagination):
+    '''
+    Keyset pagination by (updated_at, id), every page continues after the last row of the previous one.
+    A changed row moves to the end of the feed, so a client polling with the cursor of its last response
+    gets new and changed rows only. The feed can be started from a moment given by since parameter
+    '''
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    since_query_param = 'since'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        if position is not None:
+            updated_at, row_id = position
+            queryset = queryset.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=row_id))
+        else:
+            since = self.get_since(request)
+            if since is not None:
+                queryset = queryset.filter(updated_at__gte=since)
+
+        rows = list(queryset.order_by('updated_at', 'id')[:size + 1])
+        self.has_next = len(rows) > size
+        rows = rows[:size]
+        self.position = (rows[-1].updated_at, rows[-1].id) if rows else position
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_since(self, request):
+        value = request.query_params.get(self.since_query_param)
+        if value is None:
+            return None
+        since = parse_datetime(value)
+        if since is None:
+            raise ValidationError({self.since_query_param: 'Expected ISO 8601 date and time'})
+        return since
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            updated_at, row_id = base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+            position = parse_datetime(updated_at), int(row_id)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound('Invalid cursor')
+        if position[0] is None:
+            raise NotFound('Invalid cursor')
+        return position
+
+    def encode_cursor(self, position):
+        updated_at, row_id = position
+        return base64.urlsafe_b64encode(f'{updated_at.isoformat()}|{row_id}'.encode()).decode()
+
+    def get_paginated_response(self, data):
+        cursor = self.encode_cursor(self.position) if self.position is not None else None
+        next_url = None
+        if self.has_next:
+            next_url = replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+        return Response({'next': next_url, 'cursor': cursor, 'results': data})
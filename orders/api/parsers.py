@@ -0,0 +1,200 @@
+import codecs
+import csv
+import json
+import os
+
+import yaml
+from yaml.constructor import SafeConstructor
+from yaml.events import AliasEvent, ScalarEvent, SequenceStartEvent, SequenceEndEvent, MappingStartEvent, \
+    MappingEndEvent
+from yaml.nodes import ScalarNode, SequenceNode, MappingNode
+from yaml.resolver import Resolver
+
+# C-accelerated libyaml loader when PyYAML is built with it
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+resolver = Resolver()
+
+PRICE_LIST_FORMATS = ('yaml', 'json', 'jsonl', 'csv')
+CSV_INTEGER_FIELDS = ('id', 'category', 'price', 'price_rrc', 'quantity')
+CSV_PARAMETER_PREFIX = 'parameters.'
+
+
+class PriceListError(ValueError):
+    pass
+
+
+def price_list_records(data):
+    '''
+    Records of an already loaded price list: ('shop', name), ('categories', category), ('goods', item)
+    '''
+    yield 'shop', data['shop']
+    for category in data['categories']:
+        yield 'categories', category
+    for item in data['goods']:
+        yield 'goods', item
+
+
+def parse_price_list(file, format=None):
+    '''
+    Stream records out of uploaded price list.
+    Format is yaml (json documents included), jsonl or csv, by default guessed from file name.
+    '''
+    if format is None:
+        extension = os.path.splitext(getattr(file, 'name', '') or '')[1].lower()
+        format = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}.get(extension, 'yaml')
+
+    if format not in PRICE_LIST_FORMATS:
+        raise PriceListError(f'Unknown price list format {format}')
+    if format == 'jsonl':
+        return parse_jsonl(file)
+    if format == 'csv':
+        return parse_csv(file)
+    return parse_yaml(file)
+
+
+def load_price_list(file, format=None):
+    '''
+    Read the whole price list into dict with shop, categories and goods
+    '''
+    data = {'shop': None, 'categories': [], 'goods': []}
+    for kind, value in parse_price_list(file, format):
+        if kind == 'shop':
+            data['shop'] = value
+        else:
+            data[kind].append(value)
+    return data
+
+
+def parse_yaml(stream):
+    '''
+    Walk yaml event stream and construct top level values one at a time,
+    categories and goods sequences are yielded item by item
+    '''
+    events = yaml.parse(stream, Loader=YamlLoader)
+    anchors = {}
+    try:
+        for event in events:
+            if isinstance(event, MappingStartEvent):
+                break
+        else:
+            raise PriceListError('Price list must be a mapping')
+
+        for event in events:
+            if isinstance(event, MappingEndEvent):
+                break
+            key = construct(compose(event, events, anchors))
+            event = next(events)
+            if key in ('categories', 'goods') and isinstance(event, SequenceStartEvent):
+                for event in events:
+                    if isinstance(event, SequenceEndEvent):
+                        break
+                    yield key, construct(compose(event, events, anchors))
+            else:
+                value = construct(compose(event, events, anchors))
+                if key == 'shop':
+                    yield key, value
+    except yaml.YAMLError as error:
+        raise PriceListError(str(error)) from error
+
+
+def compose(event, events, anchors):
+    '''
+    Build yaml node for the value starting with event, consuming its events
+    '''
+    if isinstance(event, AliasEvent):
+        if event.anchor not in anchors:
+            raise PriceListError(f'Unknown alias {event.anchor}')
+        return anchors[event.anchor]
+
+    if isinstance(event, ScalarEvent):
+        tag = event.tag if event.tag not in (None, '!') else resolver.resolve(ScalarNode, event.value, event.implicit)
+        node = ScalarNode(tag, event.value, event.start_mark, event.end_mark, style=event.style)
+    elif isinstance(event, SequenceStartEvent):
+        tag = event.tag if event.tag not in (None, '!') else resolver.resolve(SequenceNode, None, event.implicit)
+        node = SequenceNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+        for child in events:
+            if isinstance(child, SequenceEndEvent):
+                break
+            node.value.append(compose(child, events, anchors))
+    elif isinstance(event, MappingStartEvent):
+        tag = event.tag if event.tag not in (None, '!') else resolver.resolve(MappingNode, None, event.implicit)
+        node = MappingNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+        for child in events:
+            if isinstance(child, MappingEndEvent):
+                break
+            key = compose(child, events, anchors)
+            node.value.append((key, compose(next(events), events, anchors)))
+    else:
+        raise PriceListError(f'Unexpected {event}')
+
+    if event.anchor is not None:
+        anchors[event.anchor] = node
+    return node
+
+
+def construct(node):
+    return SafeConstructor().construct_document(node)
+
+
+def iter_lines(stream):
+    '''
+    Text lines of binary or text stream
+    '''
+    lines = iter(stream)
+    first = next(lines, None)
+    if first is None:
+        return
+    if isinstance(first, bytes):
+        yield from codecs.iterdecode(_prepend(first, lines), 'utf-8-sig')
+    else:
+        yield from _prepend(first.lstrip('\ufeff'), lines)
+
+
+def _prepend(first, lines):
+    yield first
+    yield from lines
+
+
+def parse_jsonl(stream):
+    '''
+    JSON Lines price list, each line is an object with one key:
+    {"shop": name}, {"categories": {"id": .., "name": ..}} or {"goods": {...}}
+    '''
+    for number, line in enumerate(iter_lines(stream), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            raise PriceListError(f'Line {number}: {error}') from error
+        if not isinstance(record, dict) or len(record) != 1 or not {'shop', 'categories', 'goods'}.issuperset(record):
+            raise PriceListError(f'Line {number}: expected object with one of keys shop, categories, goods')
+        yield next(iter(record.items()))
+
+
+def parse_csv(stream):
+    '''
+    CSV price list, one goods item per row.
+    Columns: shop, category, category_name, id, name, model, price, price_rrc, quantity,
+    parameters are given by columns named "parameters.<name>".
+    '''
+    reader = csv.DictReader(iter_lines(stream))
+    shop = None
+    categories = set()
+    try:
+        for row in reader:
+            if shop is None:
+                shop = row['shop']
+                yield 'shop', shop
+            item = {field: int(row[field]) for field in CSV_INTEGER_FIELDS}
+            if item['category'] not in categories:
+                categories.add(item['category'])
+                if row.get('category_name'):
+                    yield 'categories', {'id': item['category'], 'name': row['category_name']}
+            item['name'] = row['name']
+            item['model'] = row.get('model') or None
+            item['parameters'] = {column[len(CSV_PARAMETER_PREFIX):]: value for column, value in row.items()
+                                  if column and column.startswith(CSV_PARAMETER_PREFIX) and value not in (None, '')}
+            yield 'goods', item
+    except (csv.Error, KeyError) as error:
+        raise PriceListError(f'Line {reader.line_num}: {error!r}') from error
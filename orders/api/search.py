@@ -0,0 +1,107 @@
+import re
+from collections import defaultdict
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Max, OuterRef, Q, Subquery
+
+from api.catalog import active_offers
+from api.models import Product, ProductInfo, ProductParameter, SearchToken
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Weights of product name, model and parameter values
+NAME_WEIGHT = 3
+MODEL_WEIGHT = 2
+PARAMETER_WEIGHT = 1
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).lower()) if text is not None else []
+
+
+def use_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def index_product_infos(ids, batch_size=1000):
+    '''
+    Update search index of given product infos: search_vector on PostgreSQL, SearchToken rows elsewhere
+    '''
+    ids = list(ids)
+    for start in range(0, len(ids), batch_size):
+        part = ids[start:start + batch_size]
+        if use_postgres():
+            _update_search_vectors(part)
+        else:
+            _update_search_tokens(part)
+
+
+def _update_search_vectors(ids):
+    name = Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('name')[:1])
+    values = Subquery(ProductParameter.objects.filter(product_info=OuterRef('pk')).values('product_info')
+                      .annotate(values=StringAgg('value', ' ')).values('values')[:1])
+    ProductInfo.objects.filter(id__in=ids).update(
+        search_vector=SearchVector(name, weight='A', config='simple') +
+        SearchVector('model', weight='B', config='simple') +
+        SearchVector(values, weight='C', config='simple'))
+
+
+def _update_search_tokens(ids):
+    weights = defaultdict(dict)
+    for info_id, name, model in ProductInfo.objects.filter(id__in=ids).values_list('id', 'product__name', 'model'):
+        for text, weight in ((model, MODEL_WEIGHT), (name, NAME_WEIGHT)):
+            for token in tokenize(text):
+                weights[info_id][token] = max(weight, weights[info_id].get(token, 0))
+    for info_id, value in ProductParameter.objects.filter(product_info_id__in=ids).values_list('product_info_id',
+                                                                                              'value'):
+        for token in tokenize(value):
+            weights[info_id].setdefault(token, PARAMETER_WEIGHT)
+
+    SearchToken.objects.filter(product_info_id__in=ids).delete()
+    SearchToken.objects.bulk_create([SearchToken(product_info_id=info_id, token=token[:64], weight=weight)
+                                     for info_id, tokens in weights.items() for token, weight in tokens.items()],
+                                    batch_size=1000)
+
+
+def search_products(query, limit):
+    '''
+    Return list of (product id, rank) best matching query, every query term must match
+    a term of product name, model or parameter values by prefix
+    '''
+    terms = tokenize(query)
+    if not terms:
+        return []
+    if use_postgres():
+        return _search_postgres(terms, limit)
+    return _search_tokens(terms, limit)
+
+
+def _search_postgres(terms, limit):
+    query = SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config='simple')
+    return list(active_offers().filter(search_vector=query)
+                .values('product').annotate(rank=Max(SearchRank('search_vector', query)))
+                .order_by('-rank', 'product').values_list('product', 'rank')[:limit])
+
+
+def _search_tokens(terms, limit):
+    '''
+    Inverted index lookup, exact token matches rank twice as high as prefix matches
+    '''
+    condition = Q()
+    for term in set(terms):
+        condition |= Q(token__startswith=term)
+    rows = SearchToken.objects.filter(condition, product_info__in=active_offers()) \
+        .values_list('product_info__product', 'token', 'weight')
+
+    scores = defaultdict(lambda: [0] * len(terms))
+    for product_id, token, weight in rows.iterator():
+        for position, term in enumerate(terms):
+            if token.startswith(term):
+                score = weight if token == term else weight / 2
+                scores[product_id][position] = max(scores[product_id][position], score)
+
+    ranked = [(product_id, sum(term_scores)) for product_id, term_scores in scores.items() if all(term_scores)]
+    ranked.sort(key=lambda item: (-item[1], item[0]))
+    return ranked[:limit]
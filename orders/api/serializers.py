@@ -1,22 +1,62 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.utils import timezone
 from rest_framework import serializers
 
-from api.models import Order, Product, Shop, ProductInfo, Basket, UserProfile, ConfirmedBasket, ConfirmEmailToken
+from api.analytics import GROUPS, HOURLY_RANGE_DAYS
+from api.exports import EXPORT_FORMATS, STATUSES
+
+from api.models import Order, Product, Shop, ProductInfo, Basket, UserProfile, ConfirmedBasket, ConfirmEmailToken, \
+    ImportJob, ShopDailyRevenue, ExportJob
 
 
 class ShopsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Shop
-        fields = ('id', 'name', 'url', 'products')
+        fields = ('id', 'name', 'url')
 
 
 class ProductListSerializer(serializers.ModelSerializer):
-    shops = ShopsSerializer(many=True, read_only=True)
+    shops = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = ('id', 'name', 'category', 'shops')
 
+    def get_shops(self, instance):
+        '''
+        Shops selling the product, taken from offers prefetched by the catalog queryset
+        '''
+        return ShopsSerializer([offer.shop for offer in instance.offers], many=True).data
+
+
+class CatalogFilterSerializer(serializers.Serializer):
+    category = serializers.IntegerField(required=False)
+    shop = serializers.IntegerField(required=False)
+    price_min = serializers.IntegerField(required=False, min_value=0)
+    price_max = serializers.IntegerField(required=False, min_value=0)
+    in_stock = serializers.BooleanField(required=False)
+    parameter = serializers.ListField(child=serializers.CharField(), required=False)
+
+    def validate_parameter(self, value):
+        '''
+        Parameters are given as name:value pairs
+        '''
+        pairs = []
+        for pair in value:
+            name, separator, parameter_value = pair.partition(':')
+            if not separator:
+                raise serializers.ValidationError(f'Expected name:value, got {pair}')
+            pairs.append((name, parameter_value))
+        return pairs
+
+
+class ProductSearchSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    limit = serializers.IntegerField(required=False, default=20, min_value=1, max_value=100)
+
 
 class ProductInfoSerializer(serializers.ModelSerializer):
     class Meta:
@@ -25,25 +65,94 @@ class ProductInfoSerializer(serializers.ModelSerializer):
 
 
 class OrderSerializer(serializers.ModelSerializer):
+    '''
+    Input of a new basket order
+    '''
     quantity = serializers.IntegerField()
 
     class Meta:
         model = Order
         fields = ('id', 'status', 'product', 'dt', 'quantity')
 
-    def to_representation(self, instance):
-        self.fields['product'] = ProductInfoSerializer(read_only=True)
-        return super(OrderSerializer, self).to_representation(instance)
 
+class OrderProductSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source='product.name')
+    shop = serializers.CharField(source='shop.name')
+
+    class Meta:
+        model = ProductInfo
+        fields = ('id', 'name', 'shop', 'model', 'price', 'price_rrc')
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    '''
+    Order line with its product info, which should be fetched with select_related('product__product', 'product__shop')
+    '''
+    product = OrderProductSerializer(read_only=True)
+    price = serializers.SerializerMethodField()
+    sum = serializers.SerializerMethodField()
 
-class OrderPartnerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
-        fields = ('id', 'status', 'product', 'dt')
+        fields = ('id', 'status', 'dt', 'product', 'quantity', 'price', 'sum')
+
+    @staticmethod
+    def line_price(instance):
+        '''
+        Price the order was added with, current price of the product info for orders added before prices were stored
+        '''
+        return instance.price if instance.price is not None else instance.product.price
+
+    def get_price(self, instance):
+        return self.line_price(instance)
+
+    def get_sum(self, instance):
+        return self.line_price(instance) * instance.quantity
+
+
+class OrderSnapshotSerializer(serializers.Serializer):
+    '''
+    Product info of a confirmed order as it was on confirmation, same fields as OrderProductSerializer
+    '''
+    id = serializers.IntegerField(source='product_id')
+    name = serializers.CharField(source='product_name')
+    shop = serializers.CharField(source='shop_name')
+    model = serializers.CharField()
+    price = serializers.IntegerField()
+    price_rrc = serializers.IntegerField()
+
+
+class ConfirmedOrderItemSerializer(serializers.ModelSerializer):
+    '''
+    Confirmed order line, read from the order row alone
+    '''
+    product = OrderSnapshotSerializer(source='*', read_only=True)
+    sum = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Order
+        fields = ('id', 'status', 'dt', 'product', 'quantity', 'price', 'sum')
+
+    def get_sum(self, instance):
+        # orders confirmed before snapshots have no price until backfill_order_snapshots command
+        return instance.price * instance.quantity if instance.price is not None else None
+
+
+class OrderLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
 
-    def to_representation(self, instance):
-        self.fields['product'] = ProductInfoSerializer(read_only=True)
-        return super(OrderPartnerSerializer, self).to_representation(instance)
+class OrderBatchSerializer(serializers.Serializer):
+    lines = OrderLineSerializer(many=True, allow_empty=False, max_length=settings.ORDER_BATCH_LIMIT)
+
+
+class OrderPartnerSerializer(serializers.ModelSerializer):
+    product = ProductInfoSerializer(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ('id', 'status', 'product', 'dt', 'quantity', 'price', 'confirmed_basket', 'updated_at')
 
 
 class PartnerStateSerializer(serializers.ModelSerializer):
@@ -53,11 +162,14 @@ class PartnerStateSerializer(serializers.ModelSerializer):
 
 
 class BasketSerializer(serializers.ModelSerializer):
-    orders = OrderSerializer(many=True, read_only=True)
+    '''
+    Basket with orders prefetched by BasketView
+    '''
+    orders = OrderItemSerializer(many=True, read_only=True)
 
     class Meta:
         model = Basket
-        fields = ('orders',)
+        fields = ('orders', 'items', 'total')
 
 
 class ConfirmedBasketSerializer(serializers.ModelSerializer):
@@ -66,6 +178,16 @@ class ConfirmedBasketSerializer(serializers.ModelSerializer):
         fields = ('address', 'phone', 'city', 'mail', 'index')
 
 
+class ConfirmedBasketDetailSerializer(ConfirmedBasketSerializer):
+    '''
+    Confirmed basket with orders prefetched by ConfirmedOrdersView
+    '''
+    orders = ConfirmedOrderItemSerializer(many=True, read_only=True)
+
+    class Meta(ConfirmedBasketSerializer.Meta):
+        fields = ('id',) + ConfirmedBasketSerializer.Meta.fields + ('confirmed_at', 'orders', 'items', 'total')
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -91,6 +213,43 @@ class PartnerSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'status', 'dt', 'quantity', 'user']
 
 
+class ShopDailyRevenueSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ShopDailyRevenue
+        fields = ('date', 'orders', 'items', 'revenue')
+
+
+class RevenueFilterSerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+
+class AnalyticsFilterSerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    group_by = serializers.ChoiceField(choices=GROUPS, default='day')
+    product = serializers.IntegerField(required=False)
+    stats = serializers.BooleanField(default=False)
+    window = serializers.IntegerField(default=7, min_value=1, max_value=90)
+
+    def validate(self, attrs):
+        attrs['date_to'] = attrs.get('date_to') or timezone.localdate()
+        attrs['date_from'] = attrs.get('date_from') or attrs['date_to'] - timedelta(days=29)
+        if attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError('date_from should not be later than date_to')
+        if attrs['group_by'] == 'hour' and (attrs['date_to'] - attrs['date_from']).days >= HOURLY_RANGE_DAYS:
+            raise serializers.ValidationError(f'Hourly sales are available for ranges up to {HOURLY_RANGE_DAYS} days')
+        return attrs
+
+
+class ExportFilterSerializer(serializers.Serializer):
+    # 'format' query parameter is taken by content negotiation of REST framework
+    file_format = serializers.ChoiceField(choices=list(EXPORT_FORMATS), default='csv')
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    status = serializers.ChoiceField(choices=STATUSES, required=False)
+
+
 class ConfirmEmailTokenSerializer(serializers.ModelSerializer):
     user = UserSerializer()
 
@@ -98,3 +257,18 @@ class ConfirmEmailTokenSerializer(serializers.ModelSerializer):
         model = ConfirmEmailToken
         fields = ['user']
 
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    throughput = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ImportJob
+        fields = ('id', 'phase', 'rows_processed', 'throughput', 'stats', 'errors', 'created_at', 'started_at',
+                  'finished_at')
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ExportJob
+        fields = ('id', 'format', 'filters', 'phase', 'rows_exported', 'errors', 'created_at', 'finished_at')
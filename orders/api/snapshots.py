@@ -0,0 +1,44 @@
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from api.models import Order, ProductInfo
+
+
+def order_snapshot():
+    '''
+    update() values copying RRC, model, product and shop of the product info into order rows. Orders keep
+    the price they were added to the basket with, so they are charged the basket total, the current price
+    is taken only by orders added before prices were stored
+    '''
+    info = ProductInfo.objects.filter(id=OuterRef('product_id'))
+
+    def value(field):
+        return Subquery(info.values(field)[:1])
+
+    return {
+        'price': Coalesce('price', value('price')),
+        'price_rrc': value('price_rrc'),
+        'model': value('model'),
+        'product_name': value('product__name'),
+        'shop': value('shop_id'),
+        'shop_name': value('shop__name'),
+    }
+
+
+def backfill(batch_size=1000):
+    '''
+    Snapshot product infos of confirmed orders confirmed before snapshots were taken, batch by batch of order ids
+    in short transactions so order rows are not locked for long. Prices of the orders are kept,
+    updated_at is not bumped as partners see nothing new. Return number of orders updated
+    '''
+    pending = Order.objects.filter(confirmed_basket__isnull=False, product__isnull=False, shop__isnull=True)
+    snapshot = order_snapshot()
+    updated, last = 0, 0
+    while True:
+        ids = list(pending.filter(id__gt=last).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return updated
+        with transaction.atomic():
+            updated += Order.objects.filter(id__in=ids).update(**snapshot)
+        last = ids[-1]
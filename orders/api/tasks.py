@@ -1,15 +1,129 @@
-from django.core.mail import EmailMultiAlternatives
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
 
+from api.cache import invalidate_shop
+from api.exports import partner_orders, write_export
+from api.importer import CatalogImporter, CatalogImportError
+from api.inventory import release_expired
+from api.mail import enqueue, flush, render
+from api.models import ImportJob, ExportJob, ConfirmEmailToken
+from api.parsers import parse_price_list, PriceListError
 from orders import settings
 from orders.celery import app
 
 
 @app.task
 def send_email(key, email):
-    msg = EmailMultiAlternatives(
-        f"Password Reset Token for {email}",
-        key,
-        settings.EMAIL_HOST_USER,
-        [email]
-    )
-    msg.send()
\ No newline at end of file
+    '''
+    Put email confirmation token into the outbox, kept for tasks queued before the outbox
+    '''
+    user = User.objects.filter(email=email).first()
+    enqueue([render(email, 'Confirm your email', 'email/confirm_email', {'user': user, 'token': key})])
+
+
+@app.task
+def send_confirmation(user_id):
+    '''
+    Create email confirmation token of the registered user and put it into the outbox
+    '''
+    user = User.objects.get(id=user_id)
+    token, _ = ConfirmEmailToken.objects.get_or_create(user=user)
+    enqueue([render(user.email, 'Confirm your email', 'email/confirm_email', {'user': user, 'token': token.key})])
+
+
+@app.task
+def flush_outbox(batch_size=None):
+    '''
+    Send due outbox emails batch by batch, also run periodically to retry failed ones, see CELERY_BEAT_SCHEDULE
+    '''
+    batch_size = batch_size or settings.MAIL_BATCH_SIZE
+    sent = 0
+    while True:
+        count = flush(batch_size)
+        sent += count
+        if count < batch_size:
+            return sent
+
+
+@app.task(acks_late=True, reject_on_worker_lost=True)
+def do_import(job_id):
+    '''
+    Import price list of ImportJob. Progress is committed after every chunk,
+    so a job redelivered after worker restart continues from the last committed row
+    '''
+    job = ImportJob.objects.select_related('user').get(id=job_id)
+    if job.phase in (ImportJob.DONE, ImportJob.FAILED):
+        return
+
+    job.phase = ImportJob.IMPORTING
+    job.started_at = job.started_at or timezone.now()
+    job.save(update_fields=['phase', 'started_at', 'updated_at'])
+
+    importer = CatalogImporter(job.user, stats=job.stats, sync=job.mode == ImportJob.SYNC,
+                               deactivate_missing=job.deactivate_missing)
+
+    def checkpoint(processed):
+        job.rows_processed = processed
+        job.stats = importer.stats
+        job.save(update_fields=['rows_processed', 'stats', 'updated_at'])
+        transaction.on_commit(invalidate)
+
+    def invalidate():
+        if importer.shop is not None:
+            invalidate_shop(importer.shop.id, importer.touched_products)
+            importer.touched_products.clear()
+
+    try:
+        with job.file.open('rb') as file:
+            importer.run(parse_price_list(file, job.format), skip=job.rows_processed, on_chunk=checkpoint)
+    except (PriceListError, CatalogImportError) as error:
+        job.phase = ImportJob.FAILED
+        job.errors.append(str(error))
+    except Exception as error:
+        # the job is not left importing, the error is still raised to be logged by the worker
+        job.phase = ImportJob.FAILED
+        job.errors.append(f'Unexpected error: {error!r}')
+        raise
+    else:
+        job.phase = ImportJob.DONE
+    finally:
+        invalidate()
+        job.stats = importer.stats
+        job.finished_at = timezone.now()
+        job.save(update_fields=['phase', 'stats', 'errors', 'finished_at', 'updated_at'])
+
+
+@app.task
+def release_expired_reservations(batch_size=1000):
+    '''
+    Periodic task returning quantity held by expired basket reservations, see CELERY_BEAT_SCHEDULE
+    '''
+    released = 0
+    while True:
+        count = release_expired(batch_size)
+        released += count
+        if count < batch_size:
+            return released
+
+
+@app.task(acks_late=True, reject_on_worker_lost=True)
+def do_export(job_id):
+    '''
+    Write partner orders matching filters of ExportJob into its gzip compressed file
+    '''
+    job = ExportJob.objects.select_related('user').get(id=job_id)
+    if job.phase in (ExportJob.DONE, ExportJob.FAILED):
+        return
+
+    job.phase = ExportJob.EXPORTING
+    job.save(update_fields=['phase', 'updated_at'])
+    try:
+        job.rows_exported = write_export(job, partner_orders(job.user, **job.filters), settings.EXPORT_CHUNK_SIZE)
+    except OSError as error:
+        job.phase = ExportJob.FAILED
+        job.errors.append(str(error))
+    else:
+        job.phase = ExportJob.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=['phase', 'file', 'rows_exported', 'errors', 'finished_at', 'updated_at'])
@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    '''
+    Sliding window counter in the shared THROTTLE_CACHE: a request is allowed while the count of the current
+    fixed window plus the count of the previous one, weighted by its part still inside the sliding window,
+    is within the rate. A client costs two integers changed by atomic increments, whatever the rate.
+    Rate is taken from DEFAULT_THROTTLE_RATES by throttle_scope of the view, by 'user' or 'anon' otherwise
+    '''
+    KEY_PREFIX = 'throttle:'
+    timer = time.time
+
+    def __init__(self):
+        self.cache = caches[settings.THROTTLE_CACHE]
+
+    @staticmethod
+    def parse_rate(rate):
+        '''
+        Number of requests and window duration in seconds of rate like 50/min
+        '''
+        num, period = rate.split('/')
+        return int(num), DURATIONS[period[0]]
+
+    def allow_request(self, request, view):
+        authenticated = bool(request.user and request.user.is_authenticated)
+        scope = getattr(view, 'throttle_scope', None) or ('user' if authenticated else 'anon')
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(rate)
+
+        ident = request.user.pk if authenticated else self.get_ident(request)
+        window, self.elapsed = divmod(self.timer(), self.duration)
+        key = f'{self.KEY_PREFIX}{scope}:{ident}:'
+        self.current = self.increment(f'{key}{int(window)}')
+        self.previous = self.cache.get(f'{key}{int(window) - 1}', 0)
+        return self.previous * (1 - self.elapsed / self.duration) + self.current <= self.num_requests
+
+    def increment(self, key):
+        '''
+        Count the request in the window, denied requests are counted too
+        '''
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # the first request of the window: the key lives until the next window is over
+            if self.cache.add(key, 1, timeout=2 * self.duration):
+                return 1
+            return self.cache.incr(key)
+
+    def wait(self):
+        '''
+        Seconds until the previous window slides out enough, or until the next window when the current is full
+        '''
+        remaining = self.duration - self.elapsed
+        if self.current > self.num_requests or not self.previous:
+            return remaining
+        return max(self.duration * (1 - (self.num_requests - self.current) / self.previous) - self.elapsed, 0)
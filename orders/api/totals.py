@@ -0,0 +1,130 @@
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Count, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from api.models import Basket, ConfirmedBasket, Order, ShopDailyRevenue
+
+# price of an order line: snapshot when there is one, current price of its product info otherwise
+ORDER_PRICE = Coalesce('price', 'product__price')
+# shop of a confirmed order: snapshot, shop of its product info for orders confirmed before snapshots
+ORDER_SHOP = Coalesce('shop', 'product__shop')
+
+
+def add_to_basket(basket_id, items, total):
+    '''
+    Count added orders in basket totals, bumping its version, in the transaction adding them
+    '''
+    Basket.objects.filter(id=basket_id).update(items=F('items') + items, total=F('total') + total,
+                                               version=F('version') + 1)
+
+
+def remove_order(order):
+    '''
+    Take the order out of totals of its basket, confirmed basket and shop revenue, before it is deleted.
+    Confirmed orders of deleted product infos are taken out by their snapshots, what they lack is not counted:
+    an order without price snapshot is not in computed totals, one without shop snapshot is left in revenue
+    of its unknown shop for verify to repair
+    '''
+    if order.price is not None:
+        price = order.price
+    else:
+        price = order.product.price if order.product_id is not None else 0
+    amount = order.quantity * price
+    if order.basket_id is not None:
+        Basket.objects.filter(id=order.basket_id).update(items=F('items') - order.quantity,
+                                                         total=F('total') - amount)
+    if order.confirmed_basket_id is not None:
+        ConfirmedBasket.objects.filter(id=order.confirmed_basket_id).update(items=F('items') - order.quantity,
+                                                                            total=F('total') - amount)
+        if order.shop_id is not None:
+            shop_id = order.shop_id
+        elif order.product_id is not None:
+            shop_id = order.product.shop_id
+        else:
+            return
+        confirmed_at = timezone.localdate(order.confirmed_basket.confirmed_at)
+        ShopDailyRevenue.objects.filter(shop_id=shop_id, date=confirmed_at) \
+            .update(orders=F('orders') - 1, items=F('items') - order.quantity, revenue=F('revenue') - amount)
+
+def confirm(basket, confirmed_basket):
+    '''
+    Move totals of the basket to the confirmed basket and add its orders to shop revenue of the day,
+    orders should be already moved with their product infos snapshotted.
+    The number of queries does not depend on the number of shops of the basket
+    '''
+    orders = Order.objects.filter(confirmed_basket=confirmed_basket)
+    totals = orders.aggregate(items=Coalesce(Sum('quantity'), 0), total=Coalesce(Sum(F('price') * F('quantity')), 0))
+    ConfirmedBasket.objects.filter(id=confirmed_basket.id).update(**totals)
+    Basket.objects.filter(id=basket.id).update(items=0, total=0, version=F('version') + 1)
+
+    date = timezone.localdate(confirmed_basket.confirmed_at)
+    rows = list(orders.values('shop').annotate(orders=Count('id'), items=Sum('quantity'),
+                                               revenue=Sum(F('price') * F('quantity'))).order_by('shop'))
+    if not rows:
+        return
+    # missing revenue rows of the day are inserted empty, then all of them are incremented by one CASE update
+    ShopDailyRevenue.objects.bulk_create([ShopDailyRevenue(shop_id=row['shop'], date=date) for row in rows],
+                                         ignore_conflicts=True)
+
+    def delta(field):
+        return Case(*[When(shop_id=row['shop'], then=Value(row[field])) for row in rows], default=Value(0))
+
+    ShopDailyRevenue.objects.filter(shop_id__in=[row['shop'] for row in rows], date=date) \
+        .update(orders=F('orders') + delta('orders'), items=F('items') + delta('items'),
+                revenue=F('revenue') + delta('revenue'))
+
+
+def expected(field):
+    '''
+    Quantity and sum subqueries of orders referencing the row by field
+    '''
+    orders = Order.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    return {
+        'expected_items': Coalesce(Subquery(orders.annotate(value=Sum('quantity')).values('value')), Value(0)),
+        'expected_total': Coalesce(Subquery(orders.annotate(value=Sum(ORDER_PRICE * F('quantity')))
+                                            .values('value')), Value(0)),
+    }
+
+
+def drifted(model, field):
+    return model.objects.annotate(**expected(field)) \
+        .exclude(items=F('expected_items'), total=F('expected_total'))
+
+
+def expected_revenue():
+    '''
+    Mapping (shop id, date) -> (orders, items, revenue) computed from confirmed orders
+    '''
+    rows = Order.objects.filter(confirmed_basket__isnull=False) \
+        .annotate(date=TruncDate('confirmed_basket__confirmed_at'), order_shop=ORDER_SHOP) \
+        .values('order_shop', 'date') \
+        .annotate(orders=Count('id'), items=Sum('quantity'), revenue=Sum(ORDER_PRICE * F('quantity')))
+    return {(row['order_shop'], row['date']): (row['orders'], row['items'], row['revenue']) for row in rows}
+
+
+def verify(repair=False):
+    '''
+    Compare running totals with totals computed from orders, return mapping of entity -> number of drifted rows.
+    With repair drifted rows are overwritten with computed totals
+    '''
+    report = {}
+    for model, field in ((Basket, 'basket'), (ConfirmedBasket, 'confirmed_basket')):
+        rows = drifted(model, field)
+        ids = list(rows.values_list('id', flat=True))
+        report[model.__name__] = len(ids)
+        if repair and ids:
+            computed = expected(field)
+            model.objects.filter(id__in=ids).update(items=computed['expected_items'],
+                                                    total=computed['expected_total'])
+
+    computed = expected_revenue()
+    stored = {(row.shop_id, row.date): (row.orders, row.items, row.revenue) for row in ShopDailyRevenue.objects.all()}
+    drift = [key for key in computed.keys() | stored.keys()
+             if stored.get(key, (0, 0, 0)) != computed.get(key, (0, 0, 0))]
+    report[ShopDailyRevenue.__name__] = len(drift)
+    if repair:
+        for shop_id, date in drift:
+            orders, items, revenue = computed.get((shop_id, date), (0, 0, 0))
+            ShopDailyRevenue.objects.update_or_create(shop_id=shop_id, date=date,
+                                                      defaults={'orders': orders, 'items': items, 'revenue': revenue})
+    return report
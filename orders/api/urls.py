@@ -1,10 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework import routers
-from rest_framework.authtoken.views import obtain_auth_token
 
 from api.views import ImportView, ProductListView, OrderView, BasketView, PartnerView, RegistrationView, \
-    ConfirmEmailView, PartnerStateView, ConfirmOrderView, ConfirmedOrdersView
+    ConfirmEmailView, PartnerStateView, ConfirmOrderView, ConfirmedOrdersView, ImportJobView, CacheStatsView, \
+    OrderBatchView, PartnerRevenueView, PartnerAnalyticsView, PartnerExportView, ExportJobView, ExportJobFileView, \
+    LogoutView, LoginView, MetricsView, MetricsTracesView
 
 router = routers.SimpleRouter()
 router.register(r'products', ProductListView, basename='products')
@@ -12,14 +13,25 @@ router.register(r'partner/order', PartnerView, basename='partner_order')
 
 urlpatterns = [
     path('api/v1/update/', ImportView.as_view(), name='import'),
+    path('api/v1/update/<int:pk>/', ImportJobView.as_view(), name='import_job'),
     path('api/v1/', include(router.urls)),
-    path('api/v1/login/', obtain_auth_token, name='login'),
+    path('api/v1/login/', LoginView.as_view(), name='login'),
+    path('api/v1/logout/', LogoutView.as_view(), name='logout'),
     path('api/v1/basket/', BasketView.as_view(), name='basket'),
     path('api/v1/basket/confirm/', ConfirmOrderView.as_view(), name='basket_confirm'),
     path('api/v1/confirmed/', ConfirmedOrdersView.as_view(), name='confirmed_orders'),
     path('api/v1/orders/', OrderView.as_view(), name='orders'),
+    path('api/v1/orders/batch/', OrderBatchView.as_view(), name='orders_batch'),
     path('api/v1/partner/state/', PartnerStateView.as_view(), name='partner_order'),
+    path('api/v1/partner/revenue/', PartnerRevenueView.as_view(), name='partner_revenue'),
+    path('api/v1/partner/analytics/', PartnerAnalyticsView.as_view(), name='partner_analytics'),
+    path('api/v1/partner/export/', PartnerExportView.as_view(), name='partner_export'),
+    path('api/v1/partner/export/<int:pk>/', ExportJobView.as_view(), name='export_job'),
+    path('api/v1/partner/export/<int:pk>/file/', ExportJobFileView.as_view(), name='export_job_file'),
     path('api/v1/registration/', RegistrationView.as_view(), name='registration'),
     path('api/v1/registration/confirm/', ConfirmEmailView.as_view(), name='registration_confirm'),
+    path('api/v1/cache/stats/', CacheStatsView.as_view(), name='cache_stats'),
+    path('api/v1/metrics/', MetricsView.as_view(), name='metrics'),
+    path('api/v1/metrics/traces/', MetricsTracesView.as_view(), name='metrics_traces'),
 ]
 
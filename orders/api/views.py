@@ -1,34 +1,72 @@
 import asyncio
+from functools import partial
 from webbrowser import get
 
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from django.core.mail import send_mail, EmailMultiAlternatives
 from django.core.validators import URLValidator
-from django.http import JsonResponse
-from api.tasks import send_email
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Prefetch
+from django.db.models.functions import Lower
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, FileResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from api.cache import response_cache, invalidate_shop
+from api.inventory import reserve, release, commit_basket, add_lines, OutOfStockError, ADDED, MERGED
+from api import analytics, totals
+from api.etags import basket_etag, confirmed_orders_etag, catalog_etag, product_etag, bump_basket_version, \
+    bump_shop_version
+from api.catalog import active_offers, filter_offers, catalog_facets
+from api.exports import seller_orders, partner_orders, export_lines, EXPORT_FORMATS
+from api.pagination import CatalogPagination, UpdatedKeysetPagination
+from api.search import search_products
+from api.snapshots import order_snapshot
+from api.parsers import load_price_list, PRICE_LIST_FORMATS
+from api.mail import enqueue, confirmation_emails
+from api.metrics import metrics
+from api.tasks import do_import, do_export, send_confirmation
 
 # Create your views here.
 from django.template.loader import render_to_string
 from django.urls import reverse_lazy
 from django.views.generic import CreateView
+from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
-from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+from rest_framework.status import HTTP_200_OK, HTTP_202_ACCEPTED, HTTP_400_BAD_REQUEST
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ViewSet
-from yaml import load, Loader
 
 from api.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Order, Basket, UserProfile, \
-    ConfirmedBasket, ConfirmEmailToken
+    ConfirmedBasket, ConfirmEmailToken, ImportJob, StockReservation, \
+    ShopDailyRevenue, ExportJob
 from api.serializers import ProductListSerializer, OrderSerializer, ProductInfoSerializer, BasketSerializer, \
     PartnerSerializer, UserSerializer, OrderPartnerSerializer, PartnerStateSerializer, ConfirmedBasketSerializer, \
-    ConfirmEmailTokenSerializer
+    ConfirmEmailTokenSerializer, ImportJobSerializer, CatalogFilterSerializer, \
+    ProductSearchSerializer, OrderBatchSerializer, ConfirmedBasketDetailSerializer, RevenueFilterSerializer, \
+    ShopDailyRevenueSerializer, AnalyticsFilterSerializer, ExportFilterSerializer, ExportJobSerializer
 from orders import settings
 
 
+def email_registered(email):
+    '''
+    Case-insensitive email lookup by the unique index on lower(email)
+    '''
+    return User.objects.alias(email_lower=Lower('email')).filter(email_lower=email.lower()).exists()
+
+
+class LoginView(ObtainAuthToken):
+    throttle_scope = 'login'
+
+
 class RegistrationView(APIView):
+    throttle_scope = 'registration'
+
     def post(self, request, *args, **kwargs):
         '''
         Registration view, required fields: first_name, last_name, password, email, username
@@ -43,18 +81,23 @@ class RegistrationView(APIView):
             else:
                 serializer = UserSerializer(data=request.data)
                 if serializer.is_valid():
-                    is_user_registered = User.objects.filter(email=serializer.validated_data.get('email')).first()
-                    if not is_user_registered:
-                        user, _ = User.objects.get_or_create(email=serializer.validated_data.get('email'),
-                                                             username=serializer.validated_data.get('username'),
-                                                             first_name=serializer.validated_data.get('first_name'),
-                                                             last_name=serializer.validated_data.get('last_name'),)
-                        user.is_active = False
-                        user.is_staff = False
-                        user.set_password(request.data.get('password'))
-                        user.save()
-                        token, _ = ConfirmEmailToken.objects.get_or_create(user_id=user.id)
-                        send_email.delay(token.key, token.user.email)
+                    if not email_registered(serializer.validated_data.get('email')):
+                        user = User(email=serializer.validated_data.get('email'),
+                                    username=serializer.validated_data.get('username'),
+                                    first_name=serializer.validated_data.get('first_name'),
+                                    last_name=serializer.validated_data.get('last_name'),
+                                    is_active=False,
+                                    is_staff=False)
+                        user.set_password(password)
+                        try:
+                            with transaction.atomic():
+                                # profile and basket are created by post_save signal
+                                user.save()
+                                transaction.on_commit(partial(send_confirmation.delay, user.id))
+                        except IntegrityError:
+                            # the same email or username registered concurrently
+                            return JsonResponse({'Status': False, 'Errors': 'Email have already registered'},
+                                                status=HTTP_400_BAD_REQUEST)
 
                         return JsonResponse({'Status': True, 'Message': 'Confirm your email'})
                     return JsonResponse({'Status': False, 'Errors': 'Email have already registered'}, status=HTTP_400_BAD_REQUEST)
@@ -62,7 +105,20 @@ class RegistrationView(APIView):
         return JsonResponse({'Status': False, 'Error': 'All required arguments not provided'}, status=HTTP_400_BAD_REQUEST)
 
 
+class LogoutView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        '''
+        Delete token of the request, it stops working in every process at once
+        '''
+        request.auth.delete()
+        return JsonResponse({'Status': True})
+
+
 class ConfirmEmailView(APIView):
+    throttle_scope = 'registration'
+
     def post(self, request, *args, **kwargs):
         '''
         Post request to confirm email
@@ -82,25 +138,97 @@ class ConfirmEmailView(APIView):
 
 
 class ProductListView(ViewSet):
-    def list(self, request, *args, **kwargs):
+    throttle_scope = 'catalog'
+    pagination_class = CatalogPagination
+
+    def get_queryset(self, filters=None):
         '''
-        List of products with state=True
+        Products with active offers of enabled shops matching filters,
+        matching offers and their shops are prefetched in one query
         '''
-        products = Product.objects.filter(shops__user__userprofile__state=True)
-        serializer = ProductListSerializer(products, many=True)
-
-        return Response(serializer.data)
+        offers = filter_offers(active_offers(), filters or {})
+        return Product.objects.filter(Exists(offers.filter(product=OuterRef('pk')))) \
+            .prefetch_related(Prefetch('productinfo_set', queryset=offers.select_related('shop'), to_attr='offers'))
 
+    @method_decorator(condition(etag_func=catalog_etag))
+    def list(self, request, *args, **kwargs):
+        '''
+        Cursor paginated list of products with state=True and facet counts
+        Filters: category, shop, price_min, price_max, in_stock, parameter=name:value (repeatable)
+        '''
+        key = response_cache.make_key(request)
+        data = response_cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        filter_serializer = CatalogFilterSerializer(data=request.query_params)
+        if not filter_serializer.is_valid():
+            return JsonResponse({'Status': False, 'Errors': filter_serializer.errors}, status=HTTP_400_BAD_REQUEST)
+        filters = filter_serializer.validated_data
+        versions = response_cache.versions([f'shop:{filters["shop"]}' if filters.get('shop') is not None
+                                            else 'catalog'])
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(self.get_queryset(filters), request, view=self)
+        serializer = ProductListSerializer(page, many=True)
+
+        response = paginator.get_paginated_response(serializer.data)
+        response.data['facets'] = catalog_facets(filter_offers(active_offers(), filters), filters)
+        response_cache.set(key, response.data, versions)
+        return response
+
+    @action(detail=False)
+    @method_decorator(condition(etag_func=catalog_etag))
+    def search(self, request, *args, **kwargs):
+        '''
+        Ranked full text search with prefix matching over product name, model and parameter values
+        Required parameter: q, optional: limit
+        '''
+        key = response_cache.make_key(request)
+        data = response_cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        search_serializer = ProductSearchSerializer(data=request.query_params)
+        if not search_serializer.is_valid():
+            return JsonResponse({'Status': False, 'Errors': search_serializer.errors}, status=HTTP_400_BAD_REQUEST)
+        versions = response_cache.versions(['catalog'])
+
+        ranked = search_products(search_serializer.validated_data['q'], search_serializer.validated_data['limit'])
+        products = self.get_queryset().in_bulk([product_id for product_id, _ in ranked])
+        results = []
+        for product_id, rank in ranked:
+            if product_id in products:
+                results.append(dict(ProductListSerializer(products[product_id]).data, rank=rank))
+        response_cache.set(key, {'results': results}, versions)
+        return Response({'results': results})
+
+    @method_decorator(condition(etag_func=product_etag))
     def retrieve(self, request, pk=None):
         '''
         Info about specific product by pk
         '''
-        queryset = Product.objects.get(id=pk)
-        serializer = ProductListSerializer(queryset)
+        key = response_cache.make_key(request)
+        data = response_cache.get(key)
+        if data is not None:
+            return Response(data)
 
+        versions = response_cache.versions([f'product:{pk}'])
+        product = get_object_or_404(self.get_queryset(), id=pk)
+        serializer = ProductListSerializer(product)
+
+        versions.update(response_cache.versions([f'shop:{shop["id"]}' for shop in serializer.data['shops']]))
+        response_cache.set(key, serializer.data, versions)
         return Response(serializer.data)
 
 
+def order_items():
+    '''
+    Orders with everything OrderItemSerializer reads
+    '''
+    return Order.objects.select_related('product__product', 'product__shop').order_by('id')
+
+
 class OrderView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -113,10 +241,20 @@ class OrderView(APIView):
         serializer = OrderSerializer(data=request.data)
 
         if serializer.is_valid():
-            order = Order.objects.create(user=request.user,
-                                         product=serializer.validated_data.get('product'),
-                                         quantity=serializer.validated_data.get('quantity'),
-                                         basket=request.user.userprofile.basket,)
+            try:
+                with transaction.atomic():
+                    # locked like in OrderBatchView, so the order is not added while the basket is being confirmed
+                    basket = Basket.objects.select_for_update().get(id=request.user.userprofile.basket.id)
+                    product = serializer.validated_data.get('product')
+                    order = Order.objects.create(user=request.user,
+                                                 product=product,
+                                                 quantity=serializer.validated_data.get('quantity'),
+                                                 basket=basket,
+                                                 price=product.price)
+                    reserve(order)
+                    totals.add_to_basket(order.basket_id, order.quantity, order.quantity * order.price)
+            except OutOfStockError as error:
+                return JsonResponse({'Status': False, 'Errors': str(error)}, status=HTTP_400_BAD_REQUEST)
             return JsonResponse({'Status': True}, status=HTTP_200_OK)
         return JsonResponse({'Status': False, 'Errors': serializer.errors}, status=HTTP_400_BAD_REQUEST)
 
@@ -126,19 +264,52 @@ class OrderView(APIView):
         '''
         order = Order.objects.get(id=request.data.get('id'))
         if order.user == request.user:
-            order.delete()
+            with transaction.atomic():
+                release(StockReservation.objects.select_for_update().filter(order=order))
+                totals.remove_order(order)
+                if order.confirmed_basket_id is not None:
+                    analytics.remove_order(order)
+                order.delete()
+            bump_basket_version(request.user)
             return JsonResponse({'Status': True}, status=HTTP_200_OK)
         return JsonResponse({'Status': False, 'Errors': 'Can delete only yourself order'}, status=HTTP_400_BAD_REQUEST)
 
 
+class OrderBatchView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        '''
+        Post request to add many orders to user's basket at once.
+        Required field: lines - list of objects with product and quantity
+        Lines of one product are merged into one basket order, response has status of every line:
+        added, merged, not_found or out_of_stock
+        '''
+        serializer = OrderBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return JsonResponse({'Status': False, 'Errors': serializer.errors}, status=HTTP_400_BAD_REQUEST)
+
+        lines = [(line['product'], line['quantity']) for line in serializer.validated_data['lines']]
+        with transaction.atomic():
+            basket = Basket.objects.select_for_update().get(id=request.user.userprofile.basket.id)
+            statuses = add_lines(request.user, basket, lines)
+
+        results = [{'product': product_id, 'quantity': quantity, 'status': statuses[product_id]}
+                   for product_id, quantity in lines]
+        return JsonResponse({'Status': all(result['status'] in (ADDED, MERGED) for result in results),
+                             'Lines': results})
+
+
 class BasketView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @method_decorator(condition(etag_func=basket_etag))
     def get(self, request, *args, **kwargs):
         '''
         Get orders in user's basket
+        Responds 304 when If-None-Match header has the current ETag of the basket
         '''
-        basket = Basket.objects.get(user=request.user.userprofile)
+        basket = Basket.objects.prefetch_related(Prefetch('orders', order_items())).get(id=request.user.userprofile.basket.id)
         serializer = BasketSerializer(basket)
         return JsonResponse(serializer.data)
 
@@ -153,55 +324,84 @@ class ConfirmOrderView(APIView):
         After confirmation, will be created ConfirmBasket with all user's orders
         '''
         if {'address', 'city', 'mail', 'phone', 'index'}.issubset(request.data):
-            if request.user.userprofile.basket.orders.count() == 0:
-                return JsonResponse({'Status': False, 'Error': 'There are no orders'}, status=HTTP_400_BAD_REQUEST)
-
             serializer = ConfirmedBasketSerializer(data=request.data)
 
             if serializer.is_valid():
-                confirmed_basket = ConfirmedBasket.objects.create(address=serializer.validated_data.get('address'),
-                                                                  city=serializer.validated_data.get('city'),
-                                                                  index=serializer.validated_data.get('index'),
-                                                                  mail=serializer.validated_data.get('mail'),
-                                                                  phone=serializer.validated_data.get('phone'),
-                                                                  user=request.user)
-                orders = Order.objects.filter(basket=request.user.userprofile.basket)
-                for order in orders:
-                    order.confirmed_basket = confirmed_basket
-                    order.basket = None
-                    order.save()
+                try:
+                    confirmed_basket = self.confirm(request.user, serializer.validated_data)
+                except OutOfStockError as error:
+                    return JsonResponse({'Status': False, 'Errors': str(error)}, status=HTTP_400_BAD_REQUEST)
+                if confirmed_basket is None:
+                    return JsonResponse({'Status': False, 'Error': 'There are no orders'}, status=HTTP_400_BAD_REQUEST)
 
                 return JsonResponse({'Status': True, 'Message': 'Thank you for your order'})
             return JsonResponse({'Status': False, 'Errors': serializer.errors}, status=HTTP_400_BAD_REQUEST)
         return JsonResponse({'Status': False, 'Error': 'All required arguments not provided'}, status=HTTP_400_BAD_REQUEST)
 
+    def confirm(self, user, data):
+        '''
+        Move basket orders to a new ConfirmedBasket and decrement stock in one transaction,
+        return None when the basket is empty
+        '''
+        with transaction.atomic():
+            basket = Basket.objects.select_for_update().get(id=user.userprofile.basket.id)
+            if not basket.orders.exists():
+                return None
+
+            commit_basket(basket)
+            confirmed_basket = ConfirmedBasket.objects.create(address=data.get('address'),
+                                                              city=data.get('city'),
+                                                              index=data.get('index'),
+                                                              mail=data.get('mail'),
+                                                              phone=data.get('phone'),
+                                                              user=user)
+            Order.objects.filter(basket=basket).update(basket=None, confirmed_basket=confirmed_basket,
+                                                       updated_at=timezone.now(), **order_snapshot())
+            totals.confirm(basket, confirmed_basket)
+            analytics.record_confirmation(confirmed_basket)
+            enqueue(confirmation_emails(confirmed_basket))
+        return confirmed_basket
+
 
 class ConfirmedOrdersView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @method_decorator(condition(etag_func=confirmed_orders_etag))
     def get(self, request, *args, **kwargs):
-        queryset = ConfirmedBasket.objects.filter(user=request.user)
-        serializer = ConfirmedBasketSerializer(queryset, many=True)
+        '''
+        Get user's confirmed baskets with their orders, order lines are read from their snapshots
+        '''
+        queryset = ConfirmedBasket.objects.filter(user=request.user) \
+            .prefetch_related(Prefetch('orders', Order.objects.order_by('id')))
+        serializer = ConfirmedBasketDetailSerializer(queryset, many=True)
         return Response(serializer.data)
 
 
 class PartnerView(ViewSet):
     permission_classes = [IsAdminUser]
+    pagination_class = UpdatedKeysetPagination
+
+    def get_queryset(self):
+        return seller_orders(self.request.user).select_related('product')
 
     def list(self, request, *args, **kwargs):
         '''
-        List of partner orders
+        Feed of partner orders ordered by update time
+        Optional query parameters: since - ISO 8601 date and time, cursor - cursor of the previous response,
+        page_size
+        Polling with the cursor of the last response returns orders created or changed since then
         '''
-        queryset = Order.objects.filter(product__shop__user=self.request.user)
-        serializer = OrderPartnerSerializer(queryset, many=True)
-        return Response(serializer.data)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(self.get_queryset(), request, view=self)
+        serializer = OrderPartnerSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     def retrieve(self, request, pk=None):
         '''
         Get specific partner order by id
         '''
-        queryset = Order.objects.get(id=pk)
-        serializer = OrderPartnerSerializer(queryset)
+        order = get_object_or_404(self.get_queryset(), id=pk)
+        serializer = OrderPartnerSerializer(order)
         return Response(serializer.data)
 
 
@@ -227,79 +427,151 @@ class PartnerStateView(APIView):
                 userprofile = UserProfile.objects.get(user=request.user)
                 userprofile.state = serializer.validated_data.get('state')
                 userprofile.save()
+                shop = Shop.objects.filter(user=request.user).first()
+                if shop:
+                    bump_shop_version(shop.id)
+                    invalidate_shop(shop.id)
                 return JsonResponse({'Status': True})
             return JsonResponse({'Status': False, 'Errors': serializer.errors}, status=HTTP_400_BAD_REQUEST)
         return JsonResponse({'Status': False, 'Errors': 'All required arguments not provided'}, status=HTTP_400_BAD_REQUEST)
 
 
-class ImportView(APIView):
+class PartnerRevenueView(APIView):
     permission_classes = [IsAdminUser]
 
-    def post(self, request, *args, **kwargs):
+    def get(self, request, *args, **kwargs):
         '''
-        Import yaml file with info about shop, categories and products
+        Confirmed orders, items and revenue of partner's shop per day
+        Optional query parameters: date_from, date_to in YYYY-MM-DD format
         '''
-        file = request.data.get('file')
+        serializer = RevenueFilterSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return JsonResponse({'Status': False, 'Errors': serializer.errors}, status=HTTP_400_BAD_REQUEST)
+        queryset = ShopDailyRevenue.objects.filter(shop__user=request.user).order_by('date')
+        if serializer.validated_data.get('date_from'):
+            queryset = queryset.filter(date__gte=serializer.validated_data['date_from'])
+        if serializer.validated_data.get('date_to'):
+            queryset = queryset.filter(date__lte=serializer.validated_data['date_to'])
+        return Response(ShopDailyRevenueSerializer(queryset, many=True).data)
 
-        if file:
-            data = load(file, Loader=Loader)
 
-            shop, _ = Shop.objects.get_or_create(name=data['shop'], user=self.request.user)
+class PartnerAnalyticsView(APIView):
+    permission_classes = [IsAdminUser]
 
-            for category in data['categories']:
-                category_obj, _ = Category.objects.get_or_create(name=category['name'], id=category['id'])
+    def get(self, request, *args, **kwargs):
+        '''
+        Sales of partner's shop from hourly and daily rollups
+        Optional query parameters: date_from, date_to in YYYY-MM-DD format (last 30 days by default),
+        group_by - day, hour, product or city, product - product info id, stats - add percentiles and
+        moving average of revenue per day or hour, window - moving average window
+        '''
+        serializer = AnalyticsFilterSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return JsonResponse({'Status': False, 'Errors': serializer.errors}, status=HTTP_400_BAD_REQUEST)
+        shop = Shop.objects.filter(user=request.user).first()
+        if not shop:
+            return JsonResponse({'Status': False, 'Errors': 'Partner has no shop'}, status=HTTP_400_BAD_REQUEST)
 
-            for product in data['goods']:
-                product_obj, _ = Product.objects.get_or_create(name=product['name'],
-                                                            category=Category.objects.get(id=product['category']))
-                product_info_obj, _ = ProductInfo.objects.get_or_create(product=product_obj,
-                                                                     shop=shop,
-                                                                     quantity=product['quantity'],
-                                                                     id=product['id'],
-                                                                     model=product['model'],
-                                                                     price=product['price'],
-                                                                     price_rrc=product['price_rrc'])
+        data = serializer.validated_data
+        results = analytics.sales(shop, data['date_from'], data['date_to'], data['group_by'], data.get('product'))
+        response = {'results': results}
+        if data['stats'] and data['group_by'] in ('day', 'hour'):
+            series = analytics.revenue_series(results, data['group_by'], data['date_from'], data['date_to'])
+            response['stats'] = analytics.series_stats(series, data['window'])
+        return Response(response)
 
-                for parameter, value in product['parameters'].items():
-                    parameter_obj, _ = Parameter.objects.get_or_create(name=parameter)
-                    product_parameter_obj, _ = ProductParameter.objects.get_or_create(product_info=product_info_obj,
-                                                                                   parameter=parameter_obj,
-                                                                                   value=value)
 
-            return JsonResponse({'Status': True})
-        return JsonResponse({'Status': False, 'Error': 'No file'}, status=HTTP_400_BAD_REQUEST)
+class PartnerExportView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        '''
+        Stream partner orders as a file
+        Optional query parameters: file_format - csv or jsonl, date_from, date_to in YYYY-MM-DD format,
+        status - basket or confirmed
+        '''
+        serializer = ExportFilterSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return JsonResponse({'Status': False, 'Errors': serializer.errors}, status=HTTP_400_BAD_REQUEST)
+        filters = dict(serializer.validated_data)
+        format = filters.pop('file_format')
+        lines = export_lines(partner_orders(request.user, **filters), format, settings.EXPORT_CHUNK_SIZE)
+        response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[format])
+        response['Content-Disposition'] = f'attachment; filename="orders.{format}"'
+        return response
 
+    def post(self, request, *args, **kwargs):
+        '''
+        Export partner orders in background into a gzip compressed file, for large exports
+        Optional fields are the same as query parameters of get request
+        Response contains id of the export job
+        '''
+        serializer = ExportFilterSerializer(data=request.data)
+        if not serializer.is_valid():
+            return JsonResponse({'Status': False, 'Errors': serializer.errors}, status=HTTP_400_BAD_REQUEST)
+        filters = dict(serializer.data)
+        job = ExportJob.objects.create(user=request.user, format=filters.pop('file_format'), filters=filters)
+        do_export.delay(job.id)
+        return JsonResponse({'Status': True, 'Job': job.id}, status=HTTP_202_ACCEPTED)
 
-    def put(self, request, *args, **kwargs):
+
+class ExportJobView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, pk, *args, **kwargs):
         '''
-        Change products info via yaml file
+        Get phase and progress of user's export job
         '''
-        file = request.data.get('file')
+        job = get_object_or_404(ExportJob, id=pk, user=request.user)
+        serializer = ExportJobSerializer(job)
+        return Response(serializer.data)
 
-        if file:
-            data = load(file, Loader=Loader)
-            shop, _ = Shop.objects.get_or_create(name=data['shop'], user=self.request.user)
 
-            for category in data['categories']:
-                category_obj, _ = Category.objects.get_or_create(name=category['name'], id=category['id'])
+class ExportJobFileView(APIView):
+    permission_classes = [IsAdminUser]
 
-            for product in data['goods']:
-                product_obj, _ = Product.objects.get_or_create(name=product['name'],
-                                                               category=product['category'])
-                product_info_obj, _ = ProductInfo.objects.get_or_create(product=product_obj,
-                                                                        shop=shop,
-                                                                        id=product['id'],)
-                product_info_obj.update(price=product['price'],
-                                        price_rcc=product['price_rrc'],
-                                        quantity=product['quantity'])
+    def get(self, request, pk, *args, **kwargs):
+        '''
+        Download gzip compressed file of user's finished export job
+        '''
+        job = get_object_or_404(ExportJob, id=pk, user=request.user, phase=ExportJob.DONE)
+        return FileResponse(job.file.open('rb'), as_attachment=True, filename=f'orders.{job.format}.gz',
+                            content_type='application/gzip')
 
-                for parameter, value in product['parameters'].items():
-                    parameter_obj, _ = Parameter.objects.get_or_create(name=parameter)
-                    product_parameter_obj, _ = ProductParameter.objects.get_or_create(product_info=product_info_obj,
-                                                                                      parameter=parameter_obj,
-                                                                                      value=value)
 
-            return JsonResponse({'Status': True})
+class ImportView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        '''
+        Import price list file with info about shop, categories and products
+        Formats: yaml/json, jsonl and csv, guessed by file name or given in 'format' field
+        The file is imported in background, response contains id of the import job
+        '''
+        return self.start_job(request, ImportJob.IMPORT)
+
+    def put(self, request, *args, **kwargs):
+        '''
+        Sync products info with price list file, only goods changed since the previous import are written
+        With 'deactivate' field set to true goods missing from the file are deactivated
+        Diff summary is reported in stats of the import job
+        '''
+        deactivate = str(request.data.get('deactivate', '')).lower() in ('1', 'true', 'on')
+        return self.start_job(request, ImportJob.SYNC, deactivate)
+
+    def start_job(self, request, mode, deactivate_missing=False):
+        file = request.data.get('file')
+
+        if file:
+            format = request.data.get('format')
+            if format and format not in PRICE_LIST_FORMATS:
+                return JsonResponse({'Status': False, 'Errors': f'Unknown format {format}'},
+                                    status=HTTP_400_BAD_REQUEST)
+
+            job = ImportJob.objects.create(user=self.request.user, file=file, format=format, mode=mode,
+                                           deactivate_missing=deactivate_missing)
+            do_import.delay(job.id)
+            return JsonResponse({'Status': True, 'Job': job.id}, status=HTTP_202_ACCEPTED)
         return JsonResponse({'Status': False, 'Error': 'No file'}, status=HTTP_400_BAD_REQUEST)
 
     def delete(self, request, *args, **kwargs):
@@ -309,7 +581,7 @@ class ImportView(APIView):
         file = request.data.get('file')
 
         if file:
-            data = load(file, Loader=Loader)
+            data = load_price_list(file, request.data.get('format'))
             shop, _ = Shop.objects.get(name=data['shop'], user=self.request.user)
 
             for product in data['goods']:
@@ -327,3 +599,45 @@ class ImportView(APIView):
 
             return JsonResponse({'Status': True})
         return JsonResponse({'Status': False, 'Error': 'No file'}, status=HTTP_400_BAD_REQUEST)
+
+
+class ImportJobView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, pk, *args, **kwargs):
+        '''
+        Get phase, progress and errors of user's import job
+        '''
+        job = get_object_or_404(ImportJob, id=pk, user=request.user)
+        serializer = ImportJobSerializer(job)
+        return Response(serializer.data)
+
+
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        '''
+        Hit, miss and eviction counters of this worker's response cache
+        '''
+        return JsonResponse(response_cache.stats())
+
+
+class MetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        '''
+        Per-view request metrics of this worker in Prometheus text format
+        '''
+        return HttpResponse(metrics.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class MetricsTracesView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        '''
+        Traces of sampled slow requests of this worker with their SQL, most recent first
+        '''
+        return Response(list(reversed(metrics.traces)))
@@ -51,6 +51,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -119,18 +120,23 @@ SITE_ID = 1
 # Rest settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'api.throttling.SlidingWindowThrottle',
     ],
+    # 'anon' and 'user' apply to views without throttle_scope
     'DEFAULT_THROTTLE_RATES': {
         'anon': '30/min',
-        'user': '50/min'
+        'user': '50/min',
+        'catalog': '300/min',
+        'login': '10/min',
+        'registration': '5/min',
     }
 }
+# Cache alias shared by all workers keeping throttle counters
+THROTTLE_CACHE = 'default'
 
 # SMTP
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -152,6 +158,71 @@ CELERY_RESULT_BACKEND = 'redis://' + REDIS_HOST + ':' + REDIS_PORT + '/0'
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+CELERY_BEAT_SCHEDULE = {
+    'release-expired-reservations': {
+        'task': 'api.tasks.release_expired_reservations',
+        'schedule': timedelta(minutes=1),
+    },
+    'flush-outbox': {
+        'task': 'api.tasks.flush_outbox',
+        'schedule': timedelta(minutes=1),
+    },
+}
+
+# Cache shared by all workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://' + REDIS_HOST + ':' + REDIS_PORT + '/1',
+    }
+}
+
+# Catalog responses cache: in-process LRU of LOCAL_SIZE entries in front of the CACHES alias
+RESPONSE_CACHE = {
+    'ALIAS': 'default',
+    'LOCAL_SIZE': 1000,
+    'TIMEOUT': 60 * 60 * 24,
+}
+
+# Authentication tokens cache: in-process LRU of LOCAL_SIZE tokens in front of the CACHES alias
+TOKEN_CACHE = {
+    'ALIAS': 'default',
+    'LOCAL_SIZE': 10000,
+    'TIMEOUT': 60 * 60,
+}
+
+# Per-view request metrics of api.middleware.PerformanceMiddleware: requests slower than SLOW_REQUEST seconds
+# are traced with their SQL with TRACE_SAMPLE probability, last TRACES traces are kept, SQL executed
+# DUPLICATE_THRESHOLD times within a request is counted as N+1
+PERFORMANCE_METRICS = {
+    'ENABLED': True,
+    'SLOW_REQUEST': 0.5,
+    'TRACE_SAMPLE': 0.1,
+    'TRACES': 100,
+    'DUPLICATE_THRESHOLD': 3,
+    'BUCKETS': (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+}
+
+# Import settings
+IMPORT_BATCH_SIZE = 1000
+
+# Catalog settings
+FACETS_LIMIT = 100
+
+# Basket orders hold product quantity for this time
+RESERVATION_TTL = timedelta(minutes=15)
+# Maximum number of lines in one batch order request
+ORDER_BATCH_LIMIT = 500
+
+# Rows fetched at a time by server-side cursor of order exports
+EXPORT_CHUNK_SIZE = 2000
+
+# Outbox emails sent over one connection
+MAIL_BATCH_SIZE = 100
+# Failed email is retried after MAIL_RETRY_DELAY doubled with every attempt, up to MAIL_RETRY_MAX_DELAY
+MAIL_MAX_ATTEMPTS = 5
+MAIL_RETRY_DELAY = timedelta(minutes=1)
+MAIL_RETRY_MAX_DELAY = timedelta(hours=1)
 
 
 # Internationalization
@@ -172,3 +243,7 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+
+# Uploaded files (price lists of import jobs)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -1,9 +1,10 @@
 import pytest
+from django.db import IntegrityError, transaction
 from django.urls import reverse
 from rest_framework.authtoken.admin import User
 from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
 from rest_framework.authtoken.models import Token
-from ...api.models import Product, Category, Shop, ProductInfo, UserProfile, Order, ConfirmedBasket
+from api.models import Product, Category, Shop, ProductInfo, UserProfile, Order, ConfirmedBasket
 
 
 @pytest.mark.django_db
@@ -22,6 +23,32 @@ def test_registration(api_client):
     assert User.objects.all().count() == 1
 
 
+@pytest.mark.django_db
+def test_registration_queries(api_client, django_assert_num_queries, django_capture_on_commit_callbacks):
+    data = {
+        'first_name': 'Kolya',
+        'last_name': 'Kolyanich',
+        'email': 'Kolya@Gmail.com',
+        'username': 'justuser',
+        'password': 'asdasdasd123456789',
+    }
+    # username and email checks, savepoint, user, profile and basket inserts, savepoint release
+    with django_assert_num_queries(7), django_capture_on_commit_callbacks() as callbacks:
+        resp = api_client.post(reverse('registration'), data)
+    assert resp.status_code == HTTP_200_OK
+    user = User.objects.get()
+    assert user.userprofile.basket
+    assert len(callbacks) == 1
+
+    data['username'] = 'anotheruser'
+    data['email'] = 'kolya@gmail.COM'
+    resp = api_client.post(reverse('registration'), data)
+    assert resp.status_code == HTTP_400_BAD_REQUEST
+    assert User.objects.count() == 1
+    with pytest.raises(IntegrityError), transaction.atomic():
+        User.objects.create(username='anotheruser', email='KOLYA@gmail.com')
+
+
 @pytest.mark.django_db
 def test_registration_no_arguments(api_client):
     url = reverse('registration')
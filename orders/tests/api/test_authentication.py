@@ -0,0 +1,72 @@
+import pytest
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.status import HTTP_200_OK, HTTP_401_UNAUTHORIZED
+from rest_framework.test import APIClient
+
+from api.authentication import CachedTokenAuthentication
+from api.models import ConfirmEmailToken
+
+
+@pytest.fixture
+def client(api_client, auth_admin_user):
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+    return api_client
+
+
+@pytest.mark.django_db
+def test_warm_token_without_queries(auth_admin_user, django_assert_num_queries):
+    authentication = CachedTokenAuthentication()
+    authentication.authenticate_credentials(auth_admin_user['token'])
+    with django_assert_num_queries(0):
+        user, token = authentication.authenticate_credentials(auth_admin_user['token'])
+        assert user.userprofile.basket.id == auth_admin_user['user'].userprofile.basket.id
+        assert user.userprofile.state
+        assert (token.key, user.username) == (auth_admin_user['token'], 'user1')
+    assert user.check_password('password')  # password is loaded on access
+
+    with pytest.raises(AuthenticationFailed):
+        authentication.authenticate_credentials('unknown')
+
+
+@pytest.mark.django_db
+def test_logout(client):
+    assert client.get(reverse('basket')).status_code == HTTP_200_OK
+    assert client.post(reverse('logout')).status_code == HTTP_200_OK
+    assert not Token.objects.exists()
+    assert client.get(reverse('basket')).status_code == HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+def test_deactivation(client, auth_admin_user):
+    assert client.get(reverse('basket')).status_code == HTTP_200_OK
+    user = auth_admin_user['user']
+    user.is_active = False
+    user.save()
+    assert client.get(reverse('basket')).status_code == HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+def test_email_confirmation_activates_cached_token(client, auth_admin_user):
+    user = auth_admin_user['user']
+    user.email = 'user1@example.com'
+    user.is_active = False
+    user.save()
+    assert client.get(reverse('basket')).status_code == HTTP_401_UNAUTHORIZED
+
+    token = ConfirmEmailToken.objects.create(user=user)
+    resp = APIClient().post(reverse('registration_confirm'), {'email': user.email, 'token': token.key})
+    assert resp.status_code == HTTP_200_OK
+    assert client.get(reverse('basket')).status_code == HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_profile_change_invalidates_token(auth_admin_user):
+    authentication = CachedTokenAuthentication()
+    authentication.authenticate_credentials(auth_admin_user['token'])
+    profile = auth_admin_user['user'].userprofile
+    profile.state = False
+    profile.save()
+    user, _ = authentication.authenticate_credentials(auth_admin_user['token'])
+    assert user.userprofile.state is False
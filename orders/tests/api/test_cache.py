@@ -0,0 +1,84 @@
+import pytest
+import yaml
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_202_ACCEPTED
+
+from api.cache import LRUCache, response_cache
+
+
+@pytest.fixture
+def partner(api_client, auth_admin_user, product_info_factory):
+    shop = baker.make('Shop', user=auth_admin_user['user'])
+    product = baker.make('Product')
+    product_info_factory(id=1, product=product, shop=shop, is_active=True)
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+    return shop, product
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.evictions == 1
+
+
+@pytest.mark.django_db
+def test_product_list_served_from_cache(api_client, partner, django_assert_num_queries):
+    url = reverse('products-list')
+    resp = api_client.get(url)
+    assert resp.status_code == HTTP_200_OK
+    with django_assert_num_queries(1):  # ETag, the token is cached
+        cached = api_client.get(url)
+    assert cached.data == resp.data
+
+    stats = response_cache.stats()
+    assert stats['local_hits'] == 1
+    assert stats['misses'] == 1
+
+    response_cache.local.clear()
+    api_client.get(url)
+    assert response_cache.stats()['shared_hits'] == 1
+
+
+@pytest.mark.django_db
+def test_partner_state_invalidates_catalog(api_client, partner):
+    _, product = partner
+    list_url = reverse('products-list')
+    detail_url = reverse('products-detail', args=[product.id])
+    assert len(api_client.get(list_url).data['results']) == 1
+    assert api_client.get(detail_url).status_code == HTTP_200_OK
+
+    api_client.post('/api/v1/partner/state/', {'state': False})
+
+    assert api_client.get(list_url).data['results'] == []
+    assert api_client.get(detail_url).status_code == 404
+
+
+@pytest.mark.django_db
+def test_import_invalidates_catalog(api_client, partner, price_list_factory, celery_eager,
+                                    django_capture_on_commit_callbacks):
+    shop, product = partner
+    url = reverse('products-list')
+    assert len(api_client.get(url).data['results']) == 1
+
+    price_list = price_list_factory(shop=shop.name, goods_count=2, first_id=10)
+    upload = SimpleUploadedFile('shop.yaml', yaml.dump(price_list, sort_keys=False).encode())
+    with django_capture_on_commit_callbacks(execute=True):
+        resp = api_client.post(reverse('import'), {'file': upload}, format='multipart')
+    assert resp.status_code == HTTP_202_ACCEPTED
+
+    assert len(api_client.get(url).data['results']) == 3
+
+
+@pytest.mark.django_db
+def test_cache_stats(api_client, auth_admin_user):
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+    resp = api_client.get(reverse('cache_stats'))
+    assert resp.status_code == HTTP_200_OK
+    assert set(resp.json()) >= {'local_hits', 'shared_hits', 'misses', 'evictions'}
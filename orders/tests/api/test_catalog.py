@@ -0,0 +1,104 @@
+import pytest
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
+
+from api.importer import CatalogImporter
+from api.models import UserProfile
+
+
+@pytest.fixture
+def catalog(product_info_factory):
+    def factory(products=5, shops=3):
+        shop_list = baker.make('Shop', _quantity=shops)
+        product_list = baker.make('Product', _quantity=products)
+        for product in product_list:
+            for shop in shop_list:
+                product_info_factory(product=product, shop=shop, is_active=True)
+        return product_list, shop_list
+    return factory
+
+
+@pytest.mark.parametrize('page_size', [2, 10])
+@pytest.mark.django_db
+def test_product_list_query_count(api_client, catalog, django_assert_num_queries, page_size):
+    catalog(products=10, shops=3)
+    url = reverse('products-list')
+    with django_assert_num_queries(5):
+        resp = api_client.get(url, {'page_size': page_size})
+    assert resp.status_code == HTTP_200_OK
+    assert len(resp.data['results']) == page_size
+    assert len(resp.data['results'][0]['shops']) == 3
+
+
+@pytest.mark.django_db
+def test_product_list_pages_without_duplicates(api_client, catalog):
+    products, _ = catalog(products=5, shops=3)
+    url = reverse('products-list')
+    ids = []
+    while url:
+        resp = api_client.get(url, {'page_size': 2} if not ids else None)
+        ids += [product['id'] for product in resp.data['results']]
+        url = resp.data['next']
+    assert ids == sorted(product.id for product in products)
+
+
+@pytest.mark.django_db
+def test_product_list_hides_disabled_shops(api_client, catalog):
+    products, shops = catalog(products=2, shops=1)
+    UserProfile.objects.filter(user=shops[0].user).update(state=False)
+    resp = api_client.get(reverse('products-list'))
+    assert resp.data['results'] == []
+    resp = api_client.get(reverse('products-detail', args=[products[0].id]))
+    assert resp.status_code == HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_product_retrieve(api_client, catalog, django_assert_num_queries):
+    products, _ = catalog(products=1, shops=2)
+    with django_assert_num_queries(3):
+        resp = api_client.get(reverse('products-detail', args=[products[0].id]))
+    assert resp.status_code == HTTP_200_OK
+    assert len(resp.data['shops']) == 2
+
+
+@pytest.fixture
+def imported_catalog(auth_admin_user, price_list_factory):
+    price_list = price_list_factory(goods_count=4)
+    price_list['categories'].append({'id': 2, 'name': 'category 2'})
+    price_list['goods'][3]['category'] = 2
+    price_list['goods'][3]['quantity'] = 0
+    price_list['goods'][2]['parameters']['color'] = 'white'
+    CatalogImporter(auth_admin_user['user']).run(price_list)
+    return price_list
+
+
+@pytest.mark.django_db
+def test_product_list_facets_from_import(api_client, imported_catalog, django_assert_num_queries):
+    with django_assert_num_queries(5):
+        resp = api_client.get(reverse('products-list'))
+    facets = resp.data['facets']
+    assert facets['categories'] == [{'id': 1, 'count': 3}, {'id': 2, 'count': 1}]
+    assert {'name': 'color', 'value': 'black', 'count': 3} in facets['parameters']
+    assert {'name': 'color', 'value': 'white', 'count': 1} in facets['parameters']
+
+
+@pytest.mark.parametrize('params,names', [
+    ({'category': 2}, ['product 3']),
+    ({'price_min': 101, 'price_max': 102}, ['product 1', 'product 2']),
+    ({'in_stock': 'true'}, ['product 0', 'product 1', 'product 2']),
+    ({'parameter': ['color:white']}, ['product 2']),
+    ({'parameter': ['color:black', 'size:1']}, ['product 1']),
+])
+@pytest.mark.django_db
+def test_product_list_filters(api_client, imported_catalog, params, names):
+    resp = api_client.get(reverse('products-list'), params)
+    assert resp.status_code == HTTP_200_OK
+    assert sorted(product['name'] for product in resp.data['results']) == names
+    assert sum(category['count'] for category in resp.data['facets']['categories']) == len(names)
+
+
+@pytest.mark.django_db
+def test_product_list_invalid_filter(api_client):
+    resp = api_client.get(reverse('products-list'), {'price_min': 'cheap', 'parameter': 'color'})
+    assert resp.status_code == HTTP_400_BAD_REQUEST
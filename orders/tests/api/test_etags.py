@@ -0,0 +1,92 @@
+import pytest
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_304_NOT_MODIFIED
+
+from api.etags import bump_shop_version
+from api.models import Basket, Shop
+
+
+@pytest.fixture
+def client(api_client, auth_admin_user):
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+    return api_client
+
+
+def basket_version(user):
+    return Basket.objects.get(user__user=user).version
+
+
+@pytest.mark.django_db
+def test_basket_not_modified(client, auth_admin_user, orders_factory, django_assert_num_queries):
+    orders_factory(user=auth_admin_user['user'], basket=auth_admin_user['user'].userprofile.basket)
+    resp = client.get(reverse('basket'))
+    assert resp.status_code == HTTP_200_OK
+    etag = resp['ETag']
+
+    with django_assert_num_queries(1):  # ETag, the token is cached
+        resp = client.get(reverse('basket'), HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == HTTP_304_NOT_MODIFIED
+    assert resp.content == b''
+
+
+@pytest.mark.django_db
+def test_basket_version_bumps(client, auth_admin_user, product_info_factory):
+    user = auth_admin_user['user']
+    etag = client.get(reverse('basket'))['ETag']
+
+    client.post(reverse('orders'), {'product': product_info_factory().id, 'quantity': 1})
+    assert basket_version(user) == 1
+    resp = client.get(reverse('basket'), HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == HTTP_200_OK
+    assert len(resp.json()['orders']) == 1
+
+    client.delete(reverse('orders'), {'id': user.order_set.get().id})
+    assert basket_version(user) == 2
+    assert client.get(reverse('basket'), HTTP_IF_NONE_MATCH=resp['ETag']).status_code == HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_basket_etag_changes_with_shop_of_orders(client, auth_admin_user, orders_factory):
+    order = orders_factory(user=auth_admin_user['user'], basket=auth_admin_user['user'].userprofile.basket)
+    etag = client.get(reverse('basket'))['ETag']
+
+    bump_shop_version(order.product.shop_id)
+    resp = client.get(reverse('basket'), HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == HTTP_200_OK
+    assert client.get(reverse('basket'), HTTP_IF_NONE_MATCH=resp['ETag']).status_code == HTTP_304_NOT_MODIFIED
+
+
+@pytest.mark.django_db
+def test_confirm_changes_confirmed_orders_etag(client, auth_admin_user, orders_factory):
+    orders_factory(user=auth_admin_user['user'], basket=auth_admin_user['user'].userprofile.basket)
+    resp = client.get(reverse('confirmed_orders'))
+    assert resp.data == []
+    etag = resp['ETag']
+    assert client.get(reverse('confirmed_orders'), HTTP_IF_NONE_MATCH=etag).status_code == HTTP_304_NOT_MODIFIED
+
+    client.post(reverse('basket_confirm'), {'address': 'address', 'city': 'city', 'mail': 'новая почта',
+                                            'phone': '+38064554', 'index': 55235})
+    assert basket_version(auth_admin_user['user']) == 1
+    resp = client.get(reverse('confirmed_orders'), HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == HTTP_200_OK
+    assert len(resp.data) == 1
+
+
+@pytest.mark.django_db
+def test_products_not_modified_until_shop_changes(client, auth_admin_user, product_info_factory):
+    shop = baker.make('Shop', user=auth_admin_user['user'])
+    info = product_info_factory(shop=shop, is_active=True)
+    list_url = reverse('products-list')
+    detail_url = reverse('products-detail', args=[info.product_id])
+
+    list_etag = client.get(list_url)['ETag']
+    detail_etag = client.get(detail_url)['ETag']
+    assert client.get(list_url, HTTP_IF_NONE_MATCH=list_etag).status_code == HTTP_304_NOT_MODIFIED
+    assert client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag).status_code == HTTP_304_NOT_MODIFIED
+    assert client.get(list_url, {'page_size': 1}, HTTP_IF_NONE_MATCH=list_etag).status_code == HTTP_200_OK
+
+    client.post('/api/v1/partner/state/', {'state': False})
+    assert Shop.objects.get(id=shop.id).version == 1
+    assert client.get(list_url, HTTP_IF_NONE_MATCH=list_etag).status_code == HTTP_200_OK
+    assert client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag).status_code != HTTP_304_NOT_MODIFIED
@@ -0,0 +1,72 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_202_ACCEPTED, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
+
+from api.exports import COLUMNS
+from api.models import ExportJob
+
+
+@pytest.fixture
+def client(api_client, auth_admin_user):
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+    return api_client
+
+
+@pytest.fixture
+def shop_orders(auth_admin_user, orders_factory):
+    shop = baker.make('Shop', user=auth_admin_user['user'])
+    product_info = baker.make('ProductInfo', shop=shop, quantity=100, price=25)
+    orders_factory(_quantity=2)  # orders of other shops
+    confirmed_basket = baker.make('ConfirmedBasket', city='Kyiv')
+    return orders_factory(product=product_info, _quantity=3) + \
+        orders_factory(product=product_info, confirmed_basket=confirmed_basket, price=20, _quantity=2)
+
+
+def export(client, **params):
+    resp = client.get(reverse('partner_export'), params)
+    assert resp.status_code == HTTP_200_OK
+    return b''.join(resp.streaming_content).decode()
+
+
+@pytest.mark.django_db
+def test_export_csv(client, shop_orders):
+    rows = list(csv.DictReader(io.StringIO(export(client))))
+    assert [int(row['id']) for row in rows] == [order.id for order in shop_orders]
+    assert list(rows[0]) == list(COLUMNS)
+    assert (rows[0]['status'], rows[0]['price'], rows[0]['city']) == ('basket', '25', '')
+    assert (rows[-1]['status'], rows[-1]['price'], rows[-1]['city']) == ('confirmed', '20', 'Kyiv')
+
+
+@pytest.mark.django_db
+def test_export_jsonl_filters(client, shop_orders):
+    rows = [json.loads(line) for line in export(client, file_format='jsonl', status='confirmed').splitlines()]
+    assert [row['id'] for row in rows] == [order.id for order in shop_orders[3:]]
+    assert rows[0]['dt'] == str(shop_orders[3].dt)
+    assert export(client, file_format='jsonl', date_to='2000-01-01') == ''
+    assert client.get(reverse('partner_export'), {'file_format': 'xml'}).status_code == HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_export_job(client, shop_orders, celery_eager):
+    resp = client.post(reverse('partner_export'), {'file_format': 'jsonl', 'status': 'basket'})
+    assert resp.status_code == HTTP_202_ACCEPTED
+    job = ExportJob.objects.get(id=resp.json()['Job'])
+    assert (job.phase, job.rows_exported, job.filters) == (ExportJob.DONE, 3, {'status': 'basket'})
+
+    resp = client.get(reverse('export_job_file', args=[job.id]))
+    assert resp.status_code == HTTP_200_OK
+    content = gzip.decompress(b''.join(resp.streaming_content)).decode()
+    assert content == export(client, file_format='jsonl', status='basket')
+
+
+@pytest.mark.django_db
+def test_export_job_file_of_unfinished_job(client, auth_admin_user):
+    job = ExportJob.objects.create(user=auth_admin_user['user'], format='csv')
+    assert client.get(reverse('export_job', args=[job.id])).data['phase'] == ExportJob.QUEUED
+    assert client.get(reverse('export_job_file', args=[job.id])).status_code == HTTP_404_NOT_FOUND
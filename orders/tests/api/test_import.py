@@ -0,0 +1,218 @@
+import json
+
+import pytest
+import yaml
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_202_ACCEPTED, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
+
+from api.importer import CatalogImporter, CatalogImportError
+from api.models import Product, ProductInfo, ProductParameter, Category, ImportJob
+from api.tasks import do_import
+
+
+def upload(price_list, name='shop.yaml'):
+    return SimpleUploadedFile(name, yaml.dump(price_list, allow_unicode=True).encode())
+
+
+@pytest.mark.django_db
+def test_import(api_client, auth_admin_user, price_list_factory, celery_eager):
+    url = reverse('import')
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+    resp = api_client.post(url, {'file': upload(price_list_factory(goods_count=3))}, format='multipart')
+    assert resp.status_code == HTTP_202_ACCEPTED
+
+    resp = api_client.get(reverse('import_job', args=[resp.json()['Job']]))
+    assert resp.status_code == HTTP_200_OK
+    assert resp.data['phase'] == ImportJob.DONE
+    assert resp.data['rows_processed'] == 3
+    stats = resp.data['stats']
+    assert stats['product_infos']['created'] == 3
+    assert stats['product_parameters']['created'] == 6
+    assert ProductInfo.objects.count() == 3
+    assert Category.objects.get(id=1).shops.count() == 1
+
+
+@pytest.mark.django_db
+def test_import_no_file(api_client, auth_admin_user):
+    url = reverse('import')
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+    resp = api_client.post(url, {}, format='multipart')
+    assert resp.status_code == HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_importer_reimport_counts(auth_admin_user, price_list_factory):
+    price_list = price_list_factory(goods_count=4)
+    CatalogImporter(auth_admin_user['user'], batch_size=2).run(price_list)
+
+    price_list['goods'][0]['price'] = 1
+    price_list['goods'][1]['parameters']['color'] = 'white'
+    stats = CatalogImporter(auth_admin_user['user'], batch_size=2).run(price_list)
+
+    assert stats['products'] == {'created': 0, 'updated': 0, 'unchanged': 4}
+    # the changed parameter leaves its product info as it is
+    assert stats['product_infos'] == {'created': 0, 'updated': 1, 'unchanged': 3}
+    assert stats['product_parameters'] == {'created': 0, 'updated': 1, 'unchanged': 7}
+    assert Product.objects.count() == 4
+    assert ProductParameter.objects.count() == 8
+    assert ProductInfo.objects.get(id=1).price == 1
+
+
+@pytest.mark.django_db
+def test_importer_duplicate_offers(auth_admin_user, price_list_factory):
+    price_list = price_list_factory(goods_count=2)
+    price_list['goods'][1]['name'] = price_list['goods'][0]['name']
+    with pytest.raises(CatalogImportError, match='same product'):
+        CatalogImporter(auth_admin_user['user']).run(price_list)
+
+    # the product offered again under a new id in a later chunk or import
+    CatalogImporter(auth_admin_user['user']).run(price_list_factory(goods_count=1))
+    with pytest.raises(CatalogImportError, match='another id'):
+        CatalogImporter(auth_admin_user['user']).run(price_list_factory(goods_count=1, first_id=10))
+    assert ProductInfo.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_importer_category_name_under_another_id(auth_admin_user, price_list_factory):
+    Category.objects.create(id=10, name='category 1')
+    with pytest.raises(CatalogImportError, match='another id'):
+        CatalogImporter(auth_admin_user['user']).run(price_list_factory())
+    assert ProductInfo.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_importer_malformed(auth_admin_user):
+    with pytest.raises(CatalogImportError):
+        CatalogImporter(auth_admin_user['user']).run({'shop': 'shop'})
+
+
+@pytest.mark.django_db
+def test_import_jsonl_in_chunks(api_client, auth_admin_user, price_list_factory, settings, celery_eager):
+    settings.IMPORT_BATCH_SIZE = 2
+    price_list = price_list_factory(goods_count=5)
+    lines = [json.dumps({'shop': price_list['shop']})]
+    lines += [json.dumps({'categories': category}) for category in price_list['categories']]
+    lines += [json.dumps({'goods': item}) for item in price_list['goods']]
+    url = reverse('import')
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+    file = SimpleUploadedFile('shop.jsonl', '\n'.join(lines).encode())
+    resp = api_client.post(url, {'file': file}, format='multipart')
+    assert resp.status_code == HTTP_202_ACCEPTED
+    job = ImportJob.objects.get(id=resp.json()['Job'])
+    assert job.stats['product_infos']['created'] == 5
+    assert ProductInfo.objects.count() == 5
+
+
+@pytest.mark.django_db
+def test_import_job_failed(api_client, auth_admin_user, celery_eager):
+    url = reverse('import')
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+    file = SimpleUploadedFile('shop.yaml', b'goods: [{id: 1}]')
+    resp = api_client.post(url, {'file': file}, format='multipart')
+    job = ImportJob.objects.get(id=resp.json()['Job'])
+    assert job.phase == ImportJob.FAILED
+    assert job.errors
+
+
+@pytest.mark.django_db(transaction=True)
+def test_import_job_unexpected_error(auth_admin_user, price_list_factory, celery_eager, monkeypatch):
+    job = ImportJob.objects.create(user=auth_admin_user['user'], file=upload(price_list_factory()))
+    monkeypatch.setattr(CatalogImporter, 'import_goods', lambda *args: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        do_import(job.id)
+
+    job.refresh_from_db()
+    assert job.phase == ImportJob.FAILED
+    assert job.errors == ['Unexpected error: ZeroDivisionError(\'division by zero\')']
+    assert job.finished_at is not None
+
+
+@pytest.mark.django_db
+def test_import_job_resume(auth_admin_user, price_list_factory, celery_eager):
+    price_list = price_list_factory(goods_count=5)
+    job = ImportJob.objects.create(user=auth_admin_user['user'], file=upload(price_list), rows_processed=3)
+    do_import(job.id)
+
+    job.refresh_from_db()
+    assert job.phase == ImportJob.DONE
+    assert job.rows_processed == 5
+    assert list(ProductInfo.objects.values_list('id', flat=True).order_by('id')) == [4, 5]
+
+
+@pytest.mark.django_db
+def test_import_job_of_other_user(api_client, auth_admin_user, created_user_without_password, celery_eager):
+    job = ImportJob.objects.create(user=created_user_without_password, file=SimpleUploadedFile('shop.yaml', b''))
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+    resp = api_client.get(reverse('import_job', args=[job.id]))
+    assert resp.status_code == HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_sync_writes_only_changed(auth_admin_user, price_list_factory):
+    price_list = price_list_factory(goods_count=4)
+    CatalogImporter(auth_admin_user['user']).run(price_list)
+
+    price_list['goods'][0]['price'] = 1
+    price_list['goods'][1]['parameters']['color'] = 'white'
+    stats = CatalogImporter(auth_admin_user['user'], sync=True).run(price_list)
+
+    assert stats['diff'] == {'created': 0, 'changed': 2, 'reactivated': 0, 'unchanged': 2, 'deactivated': 0}
+    assert stats['product_infos'] == {'created': 0, 'updated': 1, 'unchanged': 1}
+    assert ProductInfo.objects.get(id=1).price == 1
+    assert ProductParameter.objects.get(product_info_id=2, parameter__name='color').value == 'white'
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('sync', [False, True])
+def test_reimport_removes_dropped_parameters(auth_admin_user, price_list_factory, sync):
+    price_list = price_list_factory(goods_count=2)
+    CatalogImporter(auth_admin_user['user']).run(price_list)
+
+    del price_list['goods'][0]['parameters']['color']
+    CatalogImporter(auth_admin_user['user'], sync=sync).run(price_list)
+    assert list(ProductParameter.objects.filter(product_info_id=1).values_list('parameter__name', flat=True)) == \
+           ['size']
+    assert ProductParameter.objects.filter(product_info_id=2).count() == 2
+
+
+@pytest.mark.django_db
+def test_sync_compares_stored_rows(auth_admin_user, price_list_factory, monkeypatch):
+    price_list = price_list_factory(goods_count=3)
+    CatalogImporter(auth_admin_user['user']).run(price_list)
+    # stock sold and a parameter edited outside the import
+    ProductInfo.objects.filter(id=1).update(quantity=7)
+    ProductParameter.objects.filter(product_info_id=2, parameter__name='color').update(value='white')
+
+    refreshed = []
+    monkeypatch.setattr('api.importer.refresh_shop_facets', refreshed.append)
+    stats = CatalogImporter(auth_admin_user['user'], sync=True).run(price_list)
+    assert stats['diff'] == {'created': 0, 'changed': 2, 'reactivated': 0, 'unchanged': 1, 'deactivated': 0}
+    assert ProductInfo.objects.get(id=1).quantity == 10
+    assert ProductParameter.objects.get(product_info_id=2, parameter__name='color').value == 'black'
+    assert len(refreshed) == 1
+
+    stats = CatalogImporter(auth_admin_user['user'], sync=True).run(price_list)
+    assert stats['diff']['unchanged'] == 3
+    assert len(refreshed) == 1
+
+
+@pytest.mark.django_db
+def test_sync_deactivates_missing(api_client, auth_admin_user, price_list_factory, celery_eager):
+    price_list = price_list_factory(goods_count=3)
+    CatalogImporter(auth_admin_user['user']).run(price_list)
+    del price_list['goods'][2]
+
+    url = reverse('import')
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+    resp = api_client.put(url, {'file': upload(price_list), 'deactivate': 'true'}, format='multipart')
+    assert resp.status_code == HTTP_202_ACCEPTED
+    resp = api_client.get(reverse('import_job', args=[resp.json()['Job']]))
+    assert resp.data['stats']['diff']['deactivated'] == 1
+    assert resp.data['stats']['diff']['unchanged'] == 2
+    assert not ProductInfo.objects.get(id=3).is_active
+
+    price_list = price_list_factory(goods_count=3)
+    stats = CatalogImporter(auth_admin_user['user'], sync=True).run(price_list)
+    assert stats['diff']['reactivated'] == 1
+    assert ProductInfo.objects.get(id=3).is_active
@@ -0,0 +1,173 @@
+import re
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction, IntegrityError
+from model_bakery import baker
+
+from api.catalog import active_offers
+from api.exports import seller_orders
+from api.models import DailySales, HourlySales, Order, ProductInfo, ProductParameter, StockReservation
+from api.pagination import UpdatedKeysetPagination
+from api.views import ProductListView, order_items
+
+SHOPS, PRODUCTS, BUYERS = 20, 100, 10
+# indexes of unique constraints are named by SQLite itself
+SQLITE_INDEXES = {
+    'unique_product_info': 'sqlite_autoindex_api_productinfo_1',
+    'unique_product_parameter': 'sqlite_autoindex_api_productparameter_1',
+}
+
+
+def assert_index_scans(queryset, *tables):
+    text = queryset.explain()
+    for table in tables:
+        assert f'Seq Scan on {table}' not in text and f'SCAN {table}' not in text, text
+
+
+def assert_uses_index(queryset, name):
+    if connection.vendor == 'sqlite':
+        name = SQLITE_INDEXES.get(name, name)
+    text = queryset.explain()
+    assert re.search(rf'\b{name}\b', text), text
+
+
+def foreign_key_index(model, field):
+    '''
+    Name of the index Django creates for a foreign key
+    '''
+    column = model._meta.get_field(field).column
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return next(name for name, constraint in constraints.items()
+                if constraint['index'] and constraint['columns'] == [column])
+
+
+@pytest.fixture
+def catalog(db):
+    '''
+    Every product offered by every shop with two parameters, and an order of each offer by other users.
+    Tables are analyzed, so the planner weighs index scans against sequential scans by their statistics
+    '''
+    shops = baker.make('Shop', _quantity=SHOPS)
+    products = baker.make('Product', category=baker.make('Category'), _quantity=PRODUCTS)
+    infos = ProductInfo.objects.bulk_create([
+        ProductInfo(shop=shop, product=product, quantity=10, price=100 + index, price_rrc=200)
+        for shop in shops for index, product in enumerate(products)])
+    parameters = baker.make('Parameter', _quantity=2)
+    ProductParameter.objects.bulk_create([
+        ProductParameter(product_info=info, parameter=parameter, value=str(info.id % 10))
+        for info in infos for parameter in parameters])
+    buyers = baker.make(User, _quantity=BUYERS)
+    Order.objects.bulk_create([Order(user=buyers[index % BUYERS], product=info, quantity=1)
+                               for index, info in enumerate(infos)])
+    with connection.cursor() as cursor:
+        for model in (User, ProductInfo, ProductParameter, Order):
+            cursor.execute(f'ANALYZE {model._meta.db_table}')
+    return infos, parameters
+
+
+@pytest.fixture
+def orders(catalog, auth_admin_user, orders_factory):
+    user = auth_admin_user['user']
+    shop = baker.make('Shop', user=user)
+    orders_factory(user=user, basket=user.userprofile.basket, product__shop=shop, _quantity=3)
+    return user
+
+
+@pytest.mark.django_db
+def test_catalog_queries_use_indexes(catalog):
+    infos, parameters = catalog
+    info = infos[len(infos) // 2]
+    products = ProductListView().get_queryset({'parameter': [(parameters[0].name, '1')]})
+    assert_index_scans(products, 'api_productinfo', 'api_productparameter')
+    assert_index_scans(active_offers().filter(product=info.product_id), 'api_productinfo')
+    assert_uses_index(ProductInfo.objects.filter(shop=info.shop_id, product=info.product_id), 'unique_product_info')
+    assert_uses_index(ProductParameter.objects.filter(product_info=info, parameter=parameters[0]),
+                      'unique_product_parameter')
+
+
+@pytest.mark.django_db
+def test_basket_queries_use_indexes(orders):
+    assert_uses_index(order_items().filter(basket=orders.userprofile.basket), foreign_key_index(Order, 'basket'))
+    confirmed = Order.objects.filter(user=orders, confirmed_basket__isnull=False)
+    assert_uses_index(confirmed, 'api_order_user_confirmed')
+
+
+@pytest.mark.django_db
+def test_partner_queries_use_indexes(orders):
+    # a page of the keyset paginated feed is read in index order, without sorting all orders of the partner
+    feed = seller_orders(orders).order_by('updated_at', 'id')[:UpdatedKeysetPagination.page_size]
+    assert_uses_index(feed, 'api_order_updated')
+
+
+@pytest.mark.django_db
+def test_user_email_index(catalog):
+    assert_uses_index(User.objects.filter(email='user@example.com'), 'auth_user_email_idx')
+
+
+@pytest.mark.django_db
+def test_unique_product_info_and_parameter():
+    info = baker.make('ProductInfo')
+    with pytest.raises(IntegrityError), transaction.atomic():
+        baker.make('ProductInfo', shop=info.shop, product=info.product)
+    parameter = baker.make('ProductParameter', product_info=info)
+    with pytest.raises(IntegrityError), transaction.atomic():
+        baker.make('ProductParameter', product_info=info, parameter=parameter.parameter)
+
+
+@pytest.fixture
+def without_unique_constraints(transactional_db):
+    '''
+    Duplicates made before the unique constraints existed
+    '''
+    constraints = [(model, constraint) for model in (ProductInfo, ProductParameter)
+                   for constraint in model._meta.constraints]
+    with connection.schema_editor() as editor, pytest.MonkeyPatch.context() as patch:
+        for model, constraint in constraints:
+            # SQLite rebuilds the table with constraints of the model
+            patch.setattr(model._meta, 'constraints', [])
+            editor.remove_constraint(model, constraint)
+    yield
+    with connection.schema_editor() as editor:
+        for model, constraint in constraints:
+            editor.add_constraint(model, constraint)
+
+
+def test_deduplicate_catalog(without_unique_constraints, auth_admin_user, orders_factory):
+    user = auth_admin_user['user']
+    survivor = baker.make('ProductInfo', quantity=10, reserved=1)
+    duplicate = baker.make('ProductInfo', shop=survivor.shop, product=survivor.product, quantity=5, reserved=2)
+    color, size = baker.make('Parameter', _quantity=2)
+    baker.make('ProductParameter', product_info=survivor, parameter=color, value='black')
+    baker.make('ProductParameter', product_info=duplicate, parameter=color, value='white')
+    baker.make('ProductParameter', product_info=duplicate, parameter=size, value='XL')
+    repeated = baker.make('ProductParameter', product_info=baker.make('ProductInfo'), parameter=color, _quantity=2)
+    order = orders_factory(user=user, basket=user.userprofile.basket, product=duplicate, quantity=2)
+    baker.make('StockReservation', order=order, product_info=duplicate, quantity=2)
+    for info in (survivor, duplicate):
+        baker.make('HourlySales', shop=info.shop, product_info=info, city='city', hour='2026-10-18T10:00Z',
+                   orders=1, items=2, revenue=300)
+        baker.make('DailySales', shop=info.shop, product_info=info, city='city', date='2026-10-18',
+                   orders=1, items=2, revenue=300)
+
+    out = StringIO()
+    call_command('deduplicate_catalog', '--dry-run', stdout=out)
+    assert out.getvalue() == 'ProductInfo: 1 duplicates\nProductParameter: 1 duplicates\n'
+    assert ProductInfo.objects.count() == 3
+
+    out = StringIO()
+    call_command('deduplicate_catalog', stdout=out)
+    assert out.getvalue() == 'ProductInfo: 1 duplicates, removed\nProductParameter: 1 duplicates, removed\n'
+    assert not ProductInfo.objects.filter(id=duplicate.id).exists()
+    survivor.refresh_from_db()
+    assert (survivor.quantity, survivor.reserved) == (10, 3)
+    assert Order.objects.get(id=order.id).product_id == survivor.id
+    assert StockReservation.objects.get(order=order).product_info_id == survivor.id
+    assert dict(survivor.productparameter_set.values_list('parameter', 'value')) == {color.id: 'black', size.id: 'XL'}
+    assert ProductParameter.objects.filter(id__in=[row.id for row in repeated]).count() == 1
+    for model in (HourlySales, DailySales):
+        assert list(model.objects.values_list('product_info', 'orders', 'items', 'revenue')) == \
+               [(survivor.id, 2, 4, 600)]
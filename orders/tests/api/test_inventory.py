@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+
+from api.models import Order, ProductInfo, StockReservation
+from api.tasks import release_expired_reservations
+
+CONFIRM_DATA = {'address': 'address', 'city': 'city', 'mail': 'новая почта', 'phone': '+38064554', 'index': 55235}
+
+
+@pytest.fixture
+def client(api_client, auth_admin_user):
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+    return api_client
+
+
+@pytest.fixture
+def product_info(product_info_factory):
+    return product_info_factory(quantity=5, reserved=0)
+
+
+def stock(product_info):
+    product_info.refresh_from_db()
+    return product_info.quantity, product_info.reserved
+
+
+@pytest.mark.django_db
+def test_order_holds_stock(client, product_info):
+    resp = client.post(reverse('orders'), {'product': product_info.id, 'quantity': 3})
+    assert resp.status_code == HTTP_200_OK
+    assert stock(product_info) == (5, 3)
+    assert StockReservation.objects.get().quantity == 3
+
+    resp = client.post(reverse('orders'), {'product': product_info.id, 'quantity': 3})
+    assert resp.status_code == HTTP_400_BAD_REQUEST
+    assert stock(product_info) == (5, 3)
+    assert Order.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_order_of_inactive_product_not_held(client, product_info):
+    ProductInfo.objects.filter(id=product_info.id).update(is_active=False)
+    resp = client.post(reverse('orders'), {'product': product_info.id, 'quantity': 1})
+    assert resp.status_code == HTTP_400_BAD_REQUEST
+    assert stock(product_info) == (5, 0)
+    assert not Order.objects.exists()
+
+
+@pytest.mark.django_db
+def test_confirm_converts_holds(client, product_info):
+    client.post(reverse('orders'), {'product': product_info.id, 'quantity': 2})
+    resp = client.post(reverse('basket_confirm'), CONFIRM_DATA)
+    assert resp.status_code == HTTP_200_OK
+    assert stock(product_info) == (3, 0)
+    assert not StockReservation.objects.exists()
+
+
+@pytest.mark.django_db
+def test_sold_out_drops_cached_catalog(client, auth_admin_user, product_info_factory, celery_eager,
+                                       django_capture_on_commit_callbacks):
+    info = product_info_factory(shop__user=auth_admin_user['user'], quantity=2, reserved=0)
+    resp = client.get(reverse('products-list'), {'in_stock': 'true'})
+    assert len(resp.data['results']) == 1
+
+    client.post(reverse('orders'), {'product': info.id, 'quantity': 2})
+    with django_capture_on_commit_callbacks(execute=True):
+        client.post(reverse('basket_confirm'), CONFIRM_DATA)
+    resp = client.get(reverse('products-list'), {'in_stock': 'true'}, HTTP_IF_NONE_MATCH=resp['ETag'])
+    assert resp.status_code == HTTP_200_OK
+    assert resp.data['results'] == []
+
+
+@pytest.mark.django_db
+def test_delete_order_releases_hold(client, product_info):
+    client.post(reverse('orders'), {'product': product_info.id, 'quantity': 2})
+    client.delete(reverse('orders'), {'id': Order.objects.get().id})
+    assert stock(product_info) == (5, 0)
+
+
+@pytest.mark.django_db
+def test_expired_holds_released(client, product_info, orders_factory):
+    client.post(reverse('orders'), {'product': product_info.id, 'quantity': 4})
+    StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    assert release_expired_reservations() == 1
+    assert stock(product_info) == (5, 0)
+
+    # the stock went to someone else while the hold was expired
+    other = orders_factory(product=product_info, quantity=2)
+    ProductInfo.objects.filter(id=product_info.id).update(reserved=2)
+    StockReservation.objects.create(order=other, product_info=product_info, quantity=2,
+                                    expires_at=timezone.now() + timedelta(minutes=1))
+
+    resp = client.post(reverse('basket_confirm'), CONFIRM_DATA)
+    assert resp.status_code == HTTP_400_BAD_REQUEST
+    assert stock(product_info) == (5, 2)
+    assert Order.objects.filter(confirmed_basket__isnull=False).count() == 0
@@ -0,0 +1,115 @@
+import smtplib
+
+import pytest
+from django.core import mail as outbox
+from django.core.mail.backends.locmem import EmailBackend
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK
+
+from api import mail
+from api.models import OutgoingEmail
+
+CONFIRM_DATA = {'address': 'address', 'city': 'city', 'mail': 'новая почта', 'phone': '+38064554', 'index': 55235}
+
+
+class FlakyBackend(EmailBackend):
+    '''
+    Locmem backend counting opened connections and refusing emails to failing recipients
+    '''
+    opened = 0
+    failing = set()
+    connected = False
+
+    def open(self):
+        if not self.connected:
+            self.connected = True
+            FlakyBackend.opened += 1
+
+    def close(self):
+        self.connected = False
+
+    def send_messages(self, messages):
+        if any(set(message.to) & self.failing for message in messages):
+            raise smtplib.SMTPRecipientsRefused({})
+        return super().send_messages(messages)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    FlakyBackend.opened = 0
+    FlakyBackend.failing = set()
+    monkeypatch.setattr(mail, 'get_connection', FlakyBackend)
+    return FlakyBackend
+
+
+def queue(count):
+    mail.enqueue([mail.render(f'user{number}@example.com', 'subject', 'email/confirm_email',
+                              {'user': None, 'token': number}) for number in range(count)])
+
+
+@pytest.mark.django_db
+def test_registration_email_goes_through_outbox(api_client, backend, django_capture_on_commit_callbacks,
+                                                celery_eager):
+    data = {'first_name': 'Kolya', 'last_name': 'Kolyanich', 'email': 'kolya@example.com', 'username': 'kolya',
+            'password': 'asdasdasd123456789'}
+    with django_capture_on_commit_callbacks() as callbacks:
+        assert api_client.post(reverse('registration'), data).status_code == HTTP_200_OK
+    callbacks[0]()  # send_confirmation task
+    email = OutgoingEmail.objects.get()
+    assert (email.to, email.state) == ('kolya@example.com', OutgoingEmail.QUEUED)
+    assert outbox.outbox == []
+
+    assert mail.flush(10) == 1
+    assert outbox.outbox[0].to == ['kolya@example.com']
+    assert 'Kolya' in outbox.outbox[0].alternatives[0][0]
+    assert OutgoingEmail.objects.get().state == OutgoingEmail.SENT
+
+
+@pytest.mark.django_db
+def test_flush_reuses_connection(backend):
+    queue(5)
+    assert mail.flush(3) == 3
+    assert mail.flush(3) == 2
+    assert mail.flush(3) == 0
+    assert backend.opened == 2
+    assert len(outbox.outbox) == 5
+
+
+@pytest.mark.django_db
+def test_flush_retries_with_backoff(backend, settings):
+    settings.MAIL_MAX_ATTEMPTS = 2
+    backend.failing = {'user1@example.com'}
+    queue(3)
+    assert mail.flush(10) == 3
+    assert sorted(message.to[0] for message in outbox.outbox) == ['user0@example.com', 'user2@example.com']
+
+    failed = OutgoingEmail.objects.get(to='user1@example.com')
+    assert (failed.state, failed.attempts) == (OutgoingEmail.QUEUED, 1)
+    assert failed.next_attempt_at == pytest.approx(timezone.now() + settings.MAIL_RETRY_DELAY,
+                                                   abs=timezone.timedelta(seconds=5))
+    assert mail.flush(10) == 0  # not due yet
+
+    OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+    assert mail.flush(10) == 1
+    failed.refresh_from_db()
+    assert (failed.state, failed.attempts) == (OutgoingEmail.FAILED, 2)
+
+
+@pytest.mark.django_db
+def test_confirmation_emails(api_client, auth_admin_user, orders_factory, backend):
+    user = auth_admin_user['user']
+    user.email = 'customer@example.com'
+    user.save()
+    partner = baker.make('User', email='partner@example.com')
+    product_info = baker.make('ProductInfo', shop__user=partner, quantity=10, price=20)
+    orders_factory(user=user, basket=user.userprofile.basket, product=product_info, quantity=2)
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+    assert api_client.post(reverse('basket_confirm'), CONFIRM_DATA).status_code == HTTP_200_OK
+
+    mail.flush(10)
+    assert backend.opened == 1
+    messages = {message.to[0]: message for message in outbox.outbox}
+    assert set(messages) == {'customer@example.com', 'partner@example.com'}
+    assert product_info.product.name in messages['partner@example.com'].body
@@ -0,0 +1,101 @@
+import pytest
+from django.db import connection
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_403_FORBIDDEN
+
+from api import views
+from api.metrics import QueryRecorder, metrics
+from api.models import Order
+
+
+@pytest.fixture
+def client(api_client, auth_admin_user):
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+    return api_client
+
+
+@pytest.fixture
+def traced(settings):
+    settings.PERFORMANCE_METRICS = {**settings.PERFORMANCE_METRICS, 'SLOW_REQUEST': 0, 'TRACE_SAMPLE': 1}
+
+
+@pytest.fixture
+def basket(auth_admin_user, orders_factory):
+    user = auth_admin_user['user']
+    return orders_factory(user=user, basket=user.userprofile.basket, _quantity=5)
+
+
+@pytest.fixture
+def catalog(product_info_factory):
+    for product in baker.make('Product', _quantity=5):
+        for shop in baker.make('Shop', _quantity=3):
+            product_info_factory(product=product, shop=shop, is_active=True)
+
+
+def view_metrics(view, method='GET'):
+    return metrics.views[(view, method)]
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint(client, catalog):
+    for _ in range(2):
+        assert client.get(reverse('products-list')).status_code == HTTP_200_OK
+    entry = view_metrics('products-list')
+    assert entry['count'] == 2
+    assert entry['queries'] > 0 and entry['response_bytes'] > 0 and entry['render_seconds'] > 0
+
+    resp = client.get(reverse('metrics'))
+    assert resp.status_code == HTTP_200_OK
+    text = resp.content.decode()
+    assert '# TYPE orders_request_duration_seconds histogram' in text
+    assert 'orders_request_duration_seconds_count{view="products-list",method="GET"} 2' in text
+    assert 'orders_request_duration_seconds_bucket{view="products-list",method="GET",le="+Inf"} 2' in text
+    assert f'orders_request_queries_total{{view="products-list",method="GET"}} {entry["queries"]}' in text
+
+
+@pytest.mark.django_db
+def test_metrics_admin_only(api_client, created_user_without_password):
+    api_client.force_authenticate(created_user_without_password)
+    assert api_client.get(reverse('metrics')).status_code == HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+def test_slow_request_trace(client, basket, traced):
+    client.get(reverse('basket'))
+    trace = client.get(reverse('metrics_traces')).data[-1]
+    assert (trace['view'], trace['status']) == ('basket', HTTP_200_OK)
+    assert sum(query['count'] for query in trace['queries']) == view_metrics('basket')['queries']
+    assert trace['duplicates'] == {}
+
+
+@pytest.mark.parametrize('view', ['products-list', 'basket', 'confirmed_orders', 'partner_order-list'])
+@pytest.mark.django_db
+def test_views_without_n_plus_one(client, auth_admin_user, basket, catalog, orders_factory, view):
+    '''
+    Views listing many rows should not query per row
+    '''
+    shop = baker.make('Shop', user=auth_admin_user['user'])
+    orders_factory(product=baker.make('ProductInfo', shop=shop, quantity=100), _quantity=5)
+    confirmed_basket = baker.make('ConfirmedBasket', user=auth_admin_user['user'])
+    orders_factory(user=auth_admin_user['user'], confirmed_basket=confirmed_basket, price=100, _quantity=5)
+
+    assert client.get(reverse(view)).status_code == HTTP_200_OK
+    assert view_metrics(view)['duplicate_queries'] == 0
+
+
+@pytest.mark.django_db
+def test_n_plus_one_flagged(client, basket, traced, monkeypatch):
+    monkeypatch.setattr(views, 'order_items', lambda: Order.objects.order_by('id'))
+    client.get(reverse('basket'))
+    assert view_metrics('basket')['duplicate_queries'] > 0
+    assert metrics.traces[-1]['duplicates']
+
+
+@pytest.mark.django_db
+def test_query_recorder_duplicates(basket, django_assert_num_queries):
+    recorder = QueryRecorder()
+    with django_assert_num_queries(1 + 2 * len(basket)), connection.execute_wrapper(recorder):
+        for order in Order.objects.all():
+            order.product.shop
+    assert list(recorder.duplicates(3).values()) == [len(basket), len(basket)]
@@ -0,0 +1,232 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+
+from api.models import Order, Basket, ConfirmedBasket, ProductInfo, ShopDailyRevenue
+from api.totals import verify
+
+CONFIRM_DATA = {'address': 'address', 'city': 'city', 'mail': 'новая почта', 'phone': '+38064554', 'index': 55235}
+
+
+@pytest.fixture
+def client(api_client, auth_admin_user):
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+    return api_client
+
+
+@pytest.fixture
+def basket_orders(auth_admin_user, orders_factory):
+    def factory(count, **kwargs):
+        user = auth_admin_user['user']
+        return orders_factory(user=user, basket=user.userprofile.basket, _quantity=count, **kwargs)
+    return factory
+
+
+@pytest.mark.django_db
+def test_confirm_moves_orders_and_snapshots_prices(client, basket_orders):
+    orders = basket_orders(3)
+    resp = client.post(reverse('basket_confirm'), CONFIRM_DATA)
+    assert resp.status_code == HTTP_200_OK
+
+    confirmed_basket = ConfirmedBasket.objects.get()
+    for order in orders:
+        order.refresh_from_db()
+        assert order.basket is None
+        assert order.confirmed_basket == confirmed_basket
+        assert order.price == order.product.price
+
+
+@pytest.mark.django_db
+def test_confirm_charges_prices_orders_were_added_with(client, auth_admin_user, product_info_factory):
+    info = product_info_factory(quantity=10, price=100)
+    client.post(reverse('orders'), {'product': info.id, 'quantity': 2})
+    basket_total = Basket.objects.get(id=auth_admin_user['user'].userprofile.basket.id).total
+
+    ProductInfo.objects.filter(id=info.id).update(price=150)
+    client.post(reverse('basket_confirm'), CONFIRM_DATA)
+    assert ConfirmedBasket.objects.get().total == basket_total == 200
+    assert Order.objects.get().price == 100
+    assert verify() == {'Basket': 0, 'ConfirmedBasket': 0, 'ShopDailyRevenue': 0}
+
+
+@pytest.mark.django_db
+def test_confirm_query_count_independent_of_basket_size(client, basket_orders):
+    counts = []
+    # every order is of its own product info and shop, the first request caches the token
+    for size in (1, 1, 25):
+        basket_orders(size)
+        with CaptureQueriesContext(connection) as queries:
+            client.post(reverse('basket_confirm'), CONFIRM_DATA)
+        counts.append(len(queries))
+    assert counts[1] == counts[2]
+    assert Order.objects.filter(basket__isnull=False).count() == 0
+    assert verify() == {'Basket': 0, 'ConfirmedBasket': 0, 'ShopDailyRevenue': 0}
+
+
+@pytest.mark.django_db
+def test_order_batch(client, auth_admin_user, product_info_factory):
+    first, second, scarce = [product_info_factory(quantity=10, reserved=0, is_active=True) for _ in range(3)]
+    client.post(reverse('orders'), {'product': first.id, 'quantity': 1})
+
+    resp = client.post(reverse('orders_batch'), {'lines': [
+        {'product': first.id, 'quantity': 2},
+        {'product': second.id, 'quantity': 1},
+        {'product': second.id, 'quantity': 3},
+        {'product': scarce.id, 'quantity': 11},
+        {'product': scarce.id + 100, 'quantity': 1},
+    ]}, format='json')
+    assert resp.status_code == HTTP_200_OK
+    assert [line['status'] for line in resp.json()['Lines']] == ['merged', 'added', 'added', 'out_of_stock',
+                                                                  'not_found']
+
+    orders = {order.product_id: order for order in Order.objects.select_related('reservation', 'product')}
+    assert len(orders) == 2
+    assert (orders[first.id].quantity, orders[first.id].reservation.quantity, orders[first.id].product.reserved) \
+        == (3, 3, 3)
+    assert (orders[second.id].quantity, orders[second.id].reservation.quantity, orders[second.id].product.reserved) \
+        == (4, 4, 4)
+
+
+@pytest.mark.django_db
+def test_order_batch_query_count_independent_of_lines(client, product_info_factory):
+    counts = []
+    # the first request caches the token
+    for size in (1, 1, 30):
+        infos = [product_info_factory(quantity=10, reserved=0, is_active=True) for _ in range(size)]
+        lines = [{'product': info.id, 'quantity': 1} for info in infos]
+        with CaptureQueriesContext(connection) as queries:
+            resp = client.post(reverse('orders_batch'), {'lines': lines}, format='json')
+        assert resp.json()['Status']
+        counts.append(len(queries))
+    assert counts[1] == counts[2]
+
+
+@pytest.mark.django_db
+def test_order_batch_invalid(client):
+    resp = client.post(reverse('orders_batch'), {'lines': []}, format='json')
+    assert resp.status_code == HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.parametrize('count', [1, 10])
+@pytest.mark.django_db
+def test_basket_query_count(client, product_info_factory, django_assert_num_queries, count):
+    infos = [product_info_factory(quantity=10, reserved=0, is_active=True) for _ in range(count)]
+    client.post(reverse('orders_batch'), {'lines': [{'product': info.id, 'quantity': 2} for info in infos]},
+                format='json')
+    with django_assert_num_queries(3):  # ETag, basket, orders
+        resp = client.get(reverse('basket'))
+    data = resp.json()
+    assert len(data['orders']) == count
+    assert data['orders'][0]['product']['name'] == infos[0].product.name
+    assert data['items'] == 2 * count
+    assert data['total'] == sum(info.price * 2 for info in infos)
+
+
+@pytest.mark.parametrize('count', [1, 10])
+@pytest.mark.django_db
+def test_confirmed_orders_query_count(client, basket_orders, django_assert_num_queries, count):
+    for _ in range(2):
+        basket_orders(count)
+        client.post(reverse('basket_confirm'), CONFIRM_DATA)
+    with django_assert_num_queries(3):  # ETag, confirmed baskets, orders
+        resp = client.get(reverse('confirmed_orders'))
+    assert len(resp.data) == 2
+    assert len(resp.data[0]['orders']) == count
+    assert resp.data[0]['total'] == sum(order['sum'] for order in resp.data[0]['orders'])
+
+
+@pytest.mark.django_db
+def test_confirmed_orders_keep_product_snapshot(client, basket_orders, product_info_factory):
+    info = product_info_factory(quantity=10, price=100, price_rrc=120, model='model')
+    basket_orders(2, product=info)
+    client.post(reverse('basket_confirm'), CONFIRM_DATA)
+    order = Order.objects.filter(confirmed_basket__isnull=False).first()
+    assert (order.shop_id, order.shop_name, order.product_name, order.model, order.price, order.price_rrc) == \
+           (info.shop_id, info.shop.name, info.product.name, 'model', 100, 120)
+
+    info.price = 200
+    info.save()
+    info.product.name = 'renamed'
+    info.product.save()
+    product = client.get(reverse('confirmed_orders')).data[0]['orders'][0]['product']
+    assert (product['name'], product['shop'], product['price']) == (order.product_name, order.shop_name, 100)
+
+    basket_orders(1, product=info)
+    info.delete()
+    assert list(Order.objects.values_list('product', 'basket')) == [(None, None)] * 2
+    product = client.get(reverse('confirmed_orders')).data[0]['orders'][0]['product']
+    assert (product['id'], product['name'], product['price']) == (None, order.product_name, 100)
+    assert verify() == {'Basket': 0, 'ConfirmedBasket': 0, 'ShopDailyRevenue': 0}
+
+
+@pytest.mark.django_db
+def test_backfill_order_snapshots(auth_admin_user, orders_factory, product_info_factory):
+    user = auth_admin_user['user']
+    confirmed_basket = baker.make('ConfirmedBasket', user=user)
+    info = product_info_factory(quantity=10, price=100, model='model')
+    orders = orders_factory(user=user, confirmed_basket=confirmed_basket, product=info, price=90, _quantity=3)
+    basket_order = orders_factory(user=user, basket=user.userprofile.basket, product=info)
+
+    out = StringIO()
+    call_command('backfill_order_snapshots', '--batch-size', '2', stdout=out)
+    assert out.getvalue() == 'Snapshotted 3 confirmed orders\n'
+    assert set(Order.objects.filter(id__in=[order.id for order in orders])
+               .values_list('shop', 'shop_name', 'product_name', 'model', 'price')) == \
+           {(info.shop_id, info.shop.name, info.product.name, 'model', 90)}
+    basket_order.refresh_from_db()
+    assert basket_order.shop is None
+
+
+@pytest.mark.django_db
+def test_totals_follow_orders(client, auth_admin_user, product_info_factory):
+    info = product_info_factory(quantity=10, reserved=0, is_active=True, price=100)
+    client.post(reverse('orders'), {'product': info.id, 'quantity': 2})
+    client.post(reverse('orders_batch'), {'lines': [{'product': info.id, 'quantity': 1}]}, format='json')
+    basket = Basket.objects.get(user__user=auth_admin_user['user'])
+    assert (basket.items, basket.total) == (3, 300)
+
+    client.post(reverse('basket_confirm'), CONFIRM_DATA)
+    basket.refresh_from_db()
+    assert (basket.items, basket.total) == (0, 0)
+    confirmed_basket = ConfirmedBasket.objects.get()
+    assert (confirmed_basket.items, confirmed_basket.total) == (3, 300)
+    revenue = ShopDailyRevenue.objects.get(shop=info.shop)
+    assert (revenue.orders, revenue.items, revenue.revenue) == (1, 3, 300)
+
+    client.delete(reverse('orders'), {'id': Order.objects.get().id})
+    revenue.refresh_from_db()
+    assert (revenue.orders, revenue.items, revenue.revenue) == (0, 0, 0)
+    assert verify() == {'Basket': 0, 'ConfirmedBasket': 0, 'ShopDailyRevenue': 0}
+
+
+@pytest.mark.django_db
+def test_verify_totals_repairs_drift(client, basket_orders):
+    basket_orders(2)
+    client.post(reverse('basket_confirm'), CONFIRM_DATA)
+    ConfirmedBasket.objects.update(total=1)
+    ShopDailyRevenue.objects.update(revenue=1)
+    basket_orders(1)
+
+    out = StringIO()
+    call_command('verify_totals', '--repair', stdout=out)
+    assert 'Basket: 1 drifted, repaired' in out.getvalue()
+    assert verify() == {'Basket': 0, 'ConfirmedBasket': 0, 'ShopDailyRevenue': 0}
+
+
+@pytest.mark.django_db
+def test_partner_revenue(client, auth_admin_user, basket_orders, product_info_factory):
+    shop = baker.make('Shop', user=auth_admin_user['user'])
+    basket_orders(2, product=product_info_factory(shop=shop, quantity=10, price=50))
+    client.post(reverse('basket_confirm'), CONFIRM_DATA)
+
+    resp = client.get(reverse('partner_revenue'))
+    assert resp.status_code == HTTP_200_OK
+    assert resp.data == [{'date': str(timezone.localdate()), 'orders': 2, 'items': 2, 'revenue': 100}]
+    assert client.get(reverse('partner_revenue'), {'date_from': 'bad'}).status_code == HTTP_400_BAD_REQUEST
@@ -0,0 +1,67 @@
+import io
+import json
+
+import pytest
+import yaml
+
+from api.parsers import parse_price_list, load_price_list, PriceListError
+
+
+def records(price_list):
+    return [('shop', price_list['shop'])] + \
+        [('categories', category) for category in price_list['categories']] + \
+        [('goods', item) for item in price_list['goods']]
+
+
+def test_parse_yaml_streams_goods(price_list_factory):
+    price_list = price_list_factory(goods_count=3)
+    stream = io.BytesIO(yaml.dump(price_list, allow_unicode=True, sort_keys=False).encode())
+    assert list(parse_price_list(stream)) == records(price_list)
+
+
+def test_parse_yaml_anchors_and_json(price_list_factory):
+    text = '''
+shop: shop
+categories:
+  - {id: 1, name: category}
+goods:
+  - &item {id: 1, category: 1, name: first, price: 10, price_rrc: 12, quantity: 3, parameters: {color: red}}
+  - {<<: *item, id: 2, name: second}
+'''
+    goods = load_price_list(io.StringIO(text))['goods']
+    assert goods[1] == dict(goods[0], id=2, name='second')
+
+    price_list = price_list_factory(goods_count=2)
+    stream = io.BytesIO(json.dumps(price_list).encode())
+    stream.name = 'shop.json'
+    assert load_price_list(stream) == price_list
+
+
+def test_parse_jsonl(price_list_factory):
+    price_list = price_list_factory(goods_count=2)
+    lines = [json.dumps({kind: value}) for kind, value in records(price_list)]
+    stream = io.BytesIO('\n'.join(lines).encode())
+    stream.name = 'shop.jsonl'
+    assert load_price_list(stream) == price_list
+
+
+def test_parse_csv(price_list_factory):
+    price_list = price_list_factory(goods_count=2)
+    rows = ['shop,category,category_name,id,name,model,price,price_rrc,quantity,parameters.color,parameters.size']
+    rows += [f"shop,1,category 1,{item['id']},{item['name']},{item['model']},{item['price']},{item['price_rrc']},"
+             f"{item['quantity']},black,{item['parameters']['size']}" for item in price_list['goods']]
+    data = load_price_list(io.BytesIO('\n'.join(rows).encode()), format='csv')
+
+    assert data['shop'] == 'shop'
+    assert data['categories'] == price_list['categories']
+    assert data['goods'][1]['price'] == price_list['goods'][1]['price']
+    assert data['goods'][1]['parameters'] == {'color': 'black', 'size': '1'}
+
+
+def test_parse_errors():
+    with pytest.raises(PriceListError):
+        list(parse_price_list(io.StringIO('shop: [unclosed')))
+    with pytest.raises(PriceListError):
+        list(parse_price_list(io.StringIO('{"price": 1}'), format='jsonl'))
+    with pytest.raises(PriceListError):
+        parse_price_list(io.StringIO(''), format='xml')
@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
+
+from api.exports import partner_orders
+from api.models import Order
+
+CONFIRM_DATA = {'address': 'address', 'city': 'city', 'mail': 'новая почта', 'phone': '+38064554', 'index': 55235}
+
+
+@pytest.fixture
+def client(api_client, auth_admin_user):
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+    return api_client
+
+
+@pytest.fixture
+def shop_orders(auth_admin_user, orders_factory):
+    shop = baker.make('Shop', user=auth_admin_user['user'])
+    product_info = baker.make('ProductInfo', shop=shop, quantity=100)
+    orders_factory(_quantity=2)  # orders of other shops
+    return orders_factory(product=product_info, _quantity=5)
+
+
+def feed(client, **params):
+    resp = client.get(reverse('partner_order-list'), params)
+    assert resp.status_code == HTTP_200_OK
+    return resp.data
+
+
+@pytest.mark.django_db
+def test_partner_feed_pages(client, shop_orders, django_assert_max_num_queries):
+    feed(client)  # caches the token
+    ids = []
+    params = {'page_size': 2}
+    while True:
+        with django_assert_max_num_queries(1):  # page
+            data = feed(client, **params)
+        ids += [order['id'] for order in data['results']]
+        if not data['next']:
+            break
+        params['cursor'] = data['cursor']
+    assert ids == [order.id for order in shop_orders]
+
+
+@pytest.mark.django_db
+def test_partner_feed_polls_changes(client, shop_orders):
+    cursor = feed(client)['cursor']
+    assert feed(client, cursor=cursor)['results'] == []
+
+    Order.objects.filter(id=shop_orders[1].id).update(quantity=3, updated_at=timezone.now() + timedelta(seconds=1))
+    data = feed(client, cursor=cursor)
+    assert [order['id'] for order in data['results']] == [shop_orders[1].id]
+    assert data['results'][0]['quantity'] == 3
+
+
+@pytest.mark.django_db
+def test_partner_feed_since(client, shop_orders):
+    Order.objects.filter(id=shop_orders[0].id).update(updated_at=timezone.now() + timedelta(hours=1))
+    since = (timezone.now() + timedelta(minutes=1)).isoformat()
+    assert [order['id'] for order in feed(client, since=since)['results']] == [shop_orders[0].id]
+    assert client.get(reverse('partner_order-list'), {'since': 'yesterday'}).status_code == HTTP_400_BAD_REQUEST
+    assert client.get(reverse('partner_order-list'), {'cursor': 'bad'}).status_code == HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_partner_retrieve_own_orders_only(client, shop_orders, orders_factory):
+    resp = client.get(reverse('partner_order-detail', args=[shop_orders[0].id]))
+    assert resp.status_code == HTTP_200_OK
+    assert resp.data['product']['price'] == shop_orders[0].product.price
+
+    other = orders_factory()
+    resp = client.get(reverse('partner_order-detail', args=[other.id]))
+    assert resp.status_code == HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_partner_keeps_confirmed_orders_of_deleted_product_info(client, auth_admin_user, orders_factory):
+    user = auth_admin_user['user']
+    product_info = baker.make('ProductInfo', shop=baker.make('Shop', user=user), quantity=100, reserved=0)
+    orders_factory(user=user, basket=user.userprofile.basket, product=product_info)
+    client.post(reverse('basket_confirm'), CONFIRM_DATA)
+    order = Order.objects.get()
+    product_info.delete()
+
+    assert [row['id'] for row in feed(client)['results']] == [order.id]
+    assert client.get(reverse('partner_order-detail', args=[order.id])).data['product'] is None
+    assert list(partner_orders(user))[0][:5] == (order.id, order.dt, 'confirmed', None, order.product_name)
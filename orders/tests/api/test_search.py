@@ -0,0 +1,54 @@
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+
+from api.importer import CatalogImporter
+from api.models import SearchToken
+
+
+@pytest.fixture
+def searchable_catalog(auth_admin_user, price_list_factory):
+    price_list = price_list_factory(goods_count=3)
+    price_list['goods'][0].update(name='Apple iPhone XS', model='apple/iphone/xs')
+    price_list['goods'][1].update(name='Apple iPad Pro', model='apple/ipad/pro')
+    price_list['goods'][2].update(name='Samsung Galaxy', model='samsung/galaxy')
+    price_list['goods'][2]['parameters']['color'] = 'iphone-like'
+    CatalogImporter(auth_admin_user['user']).run(price_list)
+    return price_list
+
+
+def search(api_client, query):
+    resp = api_client.get(reverse('products-search'), {'q': query})
+    assert resp.status_code == HTTP_200_OK
+    return [product['name'] for product in resp.data['results']]
+
+
+@pytest.mark.django_db
+def test_search_ranked_prefix(api_client, searchable_catalog):
+    assert sorted(search(api_client, 'apple')) == ['Apple iPad Pro', 'Apple iPhone XS']
+    assert search(api_client, 'iph') == ['Apple iPhone XS', 'Samsung Galaxy']
+    assert search(api_client, 'APPLE ipa') == ['Apple iPad Pro']
+    assert search(api_client, 'nokia') == []
+
+
+@pytest.mark.django_db
+def test_search_index_updated_by_import(api_client, auth_admin_user, searchable_catalog):
+    searchable_catalog['goods'][2]['name'] = 'Nokia'
+    CatalogImporter(auth_admin_user['user'], sync=True).run(searchable_catalog)
+    assert search(api_client, 'nokia') == ['Nokia']
+    assert search(api_client, 'samsung') == ['Nokia']
+
+
+@pytest.mark.django_db
+def test_rebuild_search_index(api_client, searchable_catalog):
+    SearchToken.objects.all().delete()
+    assert search(api_client, 'apple') == []
+    call_command('rebuild_search_index')
+    assert search(api_client, 'galaxy') == ['Samsung Galaxy']
+
+
+@pytest.mark.django_db
+def test_search_without_query(api_client):
+    resp = api_client.get(reverse('products-search'))
+    assert resp.status_code == HTTP_400_BAD_REQUEST
@@ -0,0 +1,72 @@
+import pytest
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_429_TOO_MANY_REQUESTS
+from rest_framework.test import APIRequestFactory
+
+from api.throttling import SlidingWindowThrottle
+
+
+@pytest.fixture
+def rates(settings):
+    def factory(**rates):
+        settings.REST_FRAMEWORK = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}
+    return factory
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [600.0]
+    monkeypatch.setattr(SlidingWindowThrottle, 'timer', staticmethod(lambda: now[0]))
+    return now
+
+
+class View:
+    throttle_scope = 'scope'
+
+
+def allowed(count, request=None):
+    request = request or APIRequestFactory().get('/')
+    request.user = None
+    results = []
+    for _ in range(count):
+        throttle = SlidingWindowThrottle()
+        results.append(throttle.allow_request(request, View()))
+    return results, throttle
+
+
+def test_sliding_window(rates, clock):
+    rates(scope='4/min')
+    results, throttle = allowed(5)
+    assert results == [True] * 4 + [False]
+    assert throttle.wait() == 60
+
+    # a quarter of the previous window still counts: 5 * 0.75 + 1 > 4
+    clock[0] += 75
+    results, throttle = allowed(1)
+    assert results == [False]
+    assert throttle.wait() == pytest.approx(60 * (1 - (4 - 1) / 5) - 15)
+
+    # then only a tenth: 5 * 0.1 + 3 <= 4
+    clock[0] += 39
+    assert allowed(2)[0] == [True, True]
+
+    # clients are counted apart
+    assert allowed(1, APIRequestFactory().get('/', REMOTE_ADDR='10.0.0.2'))[0] == [True]
+
+
+def test_scope_without_rate_is_not_throttled(rates):
+    rates(user='1/min')
+    assert allowed(3)[0] == [True] * 3
+
+
+@pytest.mark.django_db
+def test_view_scopes(api_client, rates):
+    rates(anon='1/min', catalog='3/min', registration='1/min')
+    for _ in range(3):
+        assert api_client.get(reverse('products-list')).status_code == HTTP_200_OK
+    resp = api_client.get(reverse('products-list'))
+    assert resp.status_code == HTTP_429_TOO_MANY_REQUESTS
+    assert 0 < int(resp['Retry-After']) <= 60
+
+    assert api_client.post(reverse('registration'), {}).status_code != HTTP_429_TOO_MANY_REQUESTS
+    assert api_client.post(reverse('registration'), {}).status_code == HTTP_429_TOO_MANY_REQUESTS
@@ -0,0 +1,58 @@
+'''
+Analytics benchmark: reading partner sales from daily rollups against grouping confirmed orders on the fly.
+Run explicitly: pytest tests/benchmarks/bench_analytics.py -s
+Size is controlled with BENCH_ANALYTICS_ORDERS environment variable.
+'''
+import os
+import time
+from datetime import timedelta
+
+import pytest
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+from model_bakery import baker
+
+from api import analytics
+from api.models import Order
+from api.totals import ORDER_PRICE
+
+ORDERS = int(os.environ.get('BENCH_ANALYTICS_ORDERS', 20000))
+DAYS = 30
+REPEAT = 50
+
+
+def measure(function):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        function()
+    return (time.perf_counter() - start) / REPEAT
+
+
+@pytest.mark.django_db
+def test_bench_analytics(auth_admin_user):
+    user = auth_admin_user['user']
+    shop = baker.make('Shop', user=user)
+    infos = baker.make('ProductInfo', shop=shop, quantity=10 ** 6, price=100, _quantity=50)
+    now = timezone.now()
+    baskets = [baker.make('ConfirmedBasket', user=user, city=f'city {day % 5}',
+                          confirmed_at=now - timedelta(days=day, hours=day % 24)) for day in range(DAYS)]
+    Order.objects.bulk_create([Order(user=user, product=infos[number % len(infos)], quantity=1 + number % 3, price=100,
+                                     confirmed_basket=baskets[number % DAYS])
+                               for number in range(ORDERS)], batch_size=1000)
+    date_to = timezone.localdate()
+    date_from = date_to - timedelta(days=DAYS)
+    analytics.backfill(date_from, date_to)
+
+    rollup = measure(lambda: analytics.sales(shop, date_from, date_to, 'product'))
+    raw = measure(lambda: list(Order.objects.filter(product__shop=shop, confirmed_basket__isnull=False,
+                                                    confirmed_basket__confirmed_at__date__gte=date_from,
+                                                    confirmed_basket__confirmed_at__date__lte=date_to)
+                               .values('product').annotate(orders=Count('id'), items=Sum('quantity'),
+                                                           revenue=Sum(ORDER_PRICE * F('quantity')))
+                               .order_by('product')))
+    series = analytics.revenue_series(analytics.sales(shop, date_from, date_to, 'hour'), 'hour', date_from, date_to)
+    stats = measure(lambda: analytics.series_stats(series, 24))
+
+    print(f'\n{ORDERS} orders: sales by product {rollup * 1000:.2f}ms from rollups / {raw * 1000:.2f}ms grouped, '
+          f'stats of {len(series)} hours {stats * 1000:.2f}ms ({"numpy" if analytics.numpy else "pure python"})')
+    assert rollup < raw
@@ -0,0 +1,101 @@
+'''
+API benchmark suite: latency and query count of the main endpoints on synthetic data, checked against
+the recorded baseline, see conftest.
+Run explicitly: pytest tests/benchmarks/bench_api.py -s
+Record a new baseline with BENCH_UPDATE_BASELINE=1, on SQLite or PostgreSQL (DB_* settings).
+'''
+from itertools import count
+
+import pytest
+import yaml
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_202_ACCEPTED
+from rest_framework.views import APIView
+
+from api.cache import response_cache
+from api.models import ImportJob
+from generator import CONFIRM_DATA, SCALE, SCALES
+
+IMPORT_ROUNDS = 5
+
+
+@pytest.fixture
+def client(api_client, monkeypatch):
+    # rounds of a scenario are a burst from one client
+    monkeypatch.setattr(APIView, 'throttle_classes', [])
+    return api_client
+
+
+def login(client, user):
+    client.credentials(HTTP_AUTHORIZATION='Token ' + user.key)
+
+
+def get(client, url):
+    resp = client.get(url)
+    assert resp.status_code == HTTP_200_OK
+    return resp
+
+
+def test_import(client, generator, price_list_factory, benchmark, celery_eager):
+    numbers = count(1)
+
+    def setup():
+        # every round imports a new shop of a new partner
+        number = next(numbers)
+        login(client, generator.users(1, is_staff=True)[0])
+        price_list = price_list_factory(shop=f'import {number}', goods_count=SCALES[SCALE]['products'],
+                                        category_id=10 ** 6 + number, first_id=10 ** 7 * number)
+        file = SimpleUploadedFile('shop.yaml', yaml.dump(price_list, allow_unicode=True).encode())
+        return (file,), {}
+
+    def post(file):
+        resp = client.post(reverse('import'), {'file': file}, format='multipart')
+        assert resp.status_code == HTTP_202_ACCEPTED
+        return resp
+
+    benchmark.pedantic(post, setup=setup, rounds=IMPORT_ROUNDS)
+    assert not ImportJob.objects.exclude(phase=ImportJob.DONE).exists()
+
+
+def test_catalog_list(client, dataset, benchmark):
+    # every round follows a catalog change
+    resp = benchmark.pedantic(get, (client, reverse('products-list')),
+                              setup=lambda: response_cache.invalidate('catalog'))
+    assert resp.data['results']
+
+
+def test_catalog_list_cached(client, dataset, benchmark):
+    resp = benchmark(get, client, reverse('products-list'))
+    assert resp.data['results']
+
+
+def test_basket(client, dataset, benchmark):
+    login(client, dataset['users'][0])
+    resp = benchmark(get, client, reverse('basket'))
+    assert len(resp.json()['orders']) == SCALES[SCALE]['orders']
+
+
+def test_confirm(client, generator, dataset, benchmark):
+    users = iter(dataset['users'])
+
+    def setup():
+        # baskets of the dataset users are confirmed one by one, refilled when they run out
+        user = next(users, None)
+        if user is None:
+            user = generator.users(1)[0]
+            generator.basket(user, dataset['offers'], SCALES[SCALE]['orders'])
+        login(client, user)
+
+    def post():
+        resp = client.post(reverse('basket_confirm'), CONFIRM_DATA)
+        assert resp.status_code == HTTP_200_OK
+        return resp
+
+    benchmark.pedantic(post, setup=setup)
+
+
+def test_partner_list(client, dataset, benchmark):
+    login(client, dataset['shops'][0].user)
+    resp = benchmark(get, client, reverse('partner_order-list'))
+    assert resp.data['results']
@@ -0,0 +1,33 @@
+'''
+Authentication benchmark: cached token authentication against REST framework TokenAuthentication.
+Run explicitly: pytest tests/benchmarks/bench_authentication.py -s
+'''
+import time
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+
+from api.authentication import CachedTokenAuthentication
+
+REPEAT = 2000
+
+
+def measure(authentication, key):
+    start = time.perf_counter()
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(REPEAT):
+            user, _ = authentication.authenticate_credentials(key)
+            user.userprofile.basket.id
+    return (time.perf_counter() - start) / REPEAT, len(queries) / REPEAT
+
+
+@pytest.mark.django_db
+def test_bench_authentication(auth_admin_user):
+    key = auth_admin_user['token']
+    plain, plain_queries = measure(TokenAuthentication(), key)
+    cached, cached_queries = measure(CachedTokenAuthentication(), key)
+    print(f'\ntoken with profile and basket: {plain * 10 ** 6:.0f}us and {plain_queries:.1f} queries plain, '
+          f'{cached * 10 ** 6:.0f}us and {cached_queries:.3f} queries cached')
+    assert cached < plain
@@ -0,0 +1,46 @@
+'''
+Basket confirmation benchmark: latency and query count of ConfirmOrderView for growing basket sizes.
+Run explicitly: pytest tests/benchmarks/bench_confirm.py -s
+Sizes are controlled with BENCH_CONFIRM_SIZES environment variable, comma separated.
+'''
+import os
+import time
+
+import pytest
+from django.db import connection
+from django.urls import reverse
+
+SIZES = [int(size) for size in os.environ.get('BENCH_CONFIRM_SIZES', '10,100,1000').split(',')]
+CONFIRM_DATA = {'address': 'address', 'city': 'city', 'mail': 'новая почта', 'phone': '+38064554', 'index': 55235}
+
+
+@pytest.mark.django_db
+def test_bench_confirm(api_client, auth_admin_user, orders_factory):
+    user = auth_admin_user['user']
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+    # every order is of its own stocked product info and shop, the first request caches the token
+    orders_factory(user=user, basket=user.userprofile.basket)
+    assert api_client.post(reverse('basket_confirm'), CONFIRM_DATA).status_code == 200
+
+    results = []
+    for size in SIZES:
+        orders_factory(user=user, basket=user.userprofile.basket, _quantity=size)
+        queries = []
+
+        def counter(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            resp = api_client.post(reverse('basket_confirm'), CONFIRM_DATA)
+            elapsed = time.perf_counter() - start
+        assert resp.status_code == 200
+        results.append((size, elapsed, len(queries)))
+
+    print()
+    for size, elapsed, count in results:
+        print(f'{size} orders: {elapsed * 1000:.1f}ms, {count} queries')
+    # SQLite splits bulk inserts of sales rollups and shop revenue rows by its limit of query parameters, 999,
+    # so there only baskets whose rows fit into one insert are compared
+    assert len({count for size, _, count in results if connection.vendor != 'sqlite' or size <= 100}) == 1
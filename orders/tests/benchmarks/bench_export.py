@@ -0,0 +1,51 @@
+'''
+Export benchmark: peak Python memory of streaming partner orders against serializing the whole list.
+Run explicitly: pytest tests/benchmarks/bench_export.py -s
+Size is controlled with BENCH_EXPORT_ORDERS environment variable.
+'''
+import os
+import time
+import tracemalloc
+
+import pytest
+from model_bakery import baker
+
+from api.exports import export_lines, partner_orders
+from api.models import Order
+from api.serializers import OrderPartnerSerializer
+
+ORDERS = int(os.environ.get('BENCH_EXPORT_ORDERS', 50000))
+CHUNK_SIZE = 2000
+
+
+def measure(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20
+
+
+@pytest.mark.django_db
+def test_bench_export(auth_admin_user):
+    user = auth_admin_user['user']
+    shop = baker.make('Shop', user=user)
+    infos = baker.make('ProductInfo', shop=shop, quantity=10 ** 6, price=100, _quantity=50)
+    Order.objects.bulk_create([Order(user=user, product=infos[number % len(infos)], quantity=1, price=100)
+                               for number in range(ORDERS)], batch_size=1000)
+
+    def stream(format):
+        for _ in export_lines(partner_orders(user), format, CHUNK_SIZE):
+            pass
+
+    csv_time, csv_peak = measure(lambda: stream('csv'))
+    jsonl_time, jsonl_peak = measure(lambda: stream('jsonl'))
+    list_time, list_peak = measure(lambda: OrderPartnerSerializer(
+        Order.objects.filter(product__shop__user=user).select_related('product'), many=True).data)
+
+    print(f'\n{ORDERS} orders: csv stream {csv_time:.2f}s {csv_peak:.1f}MiB, jsonl stream {jsonl_time:.2f}s '
+          f'{jsonl_peak:.1f}MiB, serialized list {list_time:.2f}s {list_peak:.1f}MiB')
+    assert csv_peak < list_peak
+    assert jsonl_peak < list_peak
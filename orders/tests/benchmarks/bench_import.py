@@ -0,0 +1,64 @@
+'''
+Import benchmark: set-based CatalogImporter against the former per-row get_or_create loop.
+Run explicitly: pytest tests/benchmarks/bench_import.py -s
+Size is controlled with BENCH_IMPORT_SIZE environment variable.
+'''
+import os
+import time
+
+import pytest
+from django.db import connection
+
+from api.importer import CatalogImporter
+from api.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter
+
+SIZE = int(os.environ.get('BENCH_IMPORT_SIZE', 2000))
+
+
+def legacy_import(user, data):
+    shop, _ = Shop.objects.get_or_create(name=data['shop'], user=user)
+
+    for category in data['categories']:
+        Category.objects.get_or_create(name=category['name'], id=category['id'])
+
+    for product in data['goods']:
+        product_obj, _ = Product.objects.get_or_create(name=product['name'],
+                                                       category=Category.objects.get(id=product['category']))
+        product_info_obj, _ = ProductInfo.objects.get_or_create(product=product_obj,
+                                                                shop=shop,
+                                                                quantity=product['quantity'],
+                                                                id=product['id'],
+                                                                model=product['model'],
+                                                                price=product['price'],
+                                                                price_rrc=product['price_rrc'])
+
+        for parameter, value in product['parameters'].items():
+            parameter_obj, _ = Parameter.objects.get_or_create(name=parameter)
+            ProductParameter.objects.get_or_create(product_info=product_info_obj, parameter=parameter_obj, value=value)
+
+
+def measure(function, *args):
+    queries = []
+
+    def counter(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(counter):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+    return elapsed, len(queries)
+
+
+@pytest.mark.django_db
+def test_bench_import(auth_admin_user, created_user_without_password, price_list_factory):
+    legacy_time, legacy_queries = measure(legacy_import, created_user_without_password,
+                                          price_list_factory(shop='legacy', goods_count=SIZE))
+    bulk_time, bulk_queries = measure(CatalogImporter(auth_admin_user['user']).run,
+                                      price_list_factory(shop='bulk', goods_count=SIZE, category_id=2, first_id=SIZE + 1))
+
+    print(f'\n{SIZE} goods: legacy {legacy_time:.2f}s / {legacy_queries} queries, '
+          f'bulk {bulk_time:.2f}s / {bulk_queries} queries, x{legacy_time / bulk_time:.0f}')
+    assert bulk_queries * 100 < legacy_queries
+    assert bulk_time < legacy_time
@@ -0,0 +1,57 @@
+'''
+Mail benchmark: sending emails one connection per message, as send_email task did, against outbox flush
+reusing one connection per batch. Emails are delivered to a local aiosmtpd server (pip install aiosmtpd).
+Run explicitly: pytest tests/benchmarks/bench_mail.py -s
+Size is controlled with BENCH_MAIL_EMAILS environment variable.
+'''
+import os
+import time
+
+import pytest
+from django.core.mail import EmailMultiAlternatives
+
+from api import mail
+from api.models import OutgoingEmail
+
+controller = pytest.importorskip('aiosmtpd.controller')
+handlers = pytest.importorskip('aiosmtpd.handlers')
+
+EMAILS = int(os.environ.get('BENCH_MAIL_EMAILS', 500))
+
+
+@pytest.fixture
+def smtp_server(settings):
+    server = controller.Controller(handlers.Sink(), hostname='127.0.0.1', port=8025)
+    server.start()
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    settings.EMAIL_HOST, settings.EMAIL_PORT = server.hostname, server.port
+    settings.EMAIL_USE_SSL = settings.EMAIL_USE_TLS = False
+    settings.EMAIL_HOST_USER = settings.EMAIL_HOST_PASSWORD = ''
+    yield server
+    server.stop()
+
+
+def emails():
+    return [mail.render(f'user{number}@example.com', 'Confirm your email', 'email/confirm_email',
+                        {'user': None, 'token': number}) for number in range(EMAILS)]
+
+
+@pytest.mark.django_db
+def test_bench_mail(smtp_server, settings):
+    start = time.perf_counter()
+    for email in emails():
+        message = EmailMultiAlternatives(email.subject, email.body, settings.EMAIL_HOST_USER, [email.to])
+        message.attach_alternative(email.html, 'text/html')
+        message.send()
+    per_message = time.perf_counter() - start
+
+    OutgoingEmail.objects.bulk_create(emails())
+    start = time.perf_counter()
+    while mail.flush(settings.MAIL_BATCH_SIZE):
+        pass
+    batched = time.perf_counter() - start
+
+    assert OutgoingEmail.objects.filter(state=OutgoingEmail.SENT).count() == EMAILS
+    print(f'\n{EMAILS} emails: connection per message {EMAILS / per_message:.0f}/s, '
+          f'outbox batches of {settings.MAIL_BATCH_SIZE} {EMAILS / batched:.0f}/s')
+    assert batched < per_message
@@ -0,0 +1,35 @@
+'''
+Instrumentation benchmark: overhead of PerformanceMiddleware on the basket view.
+Run explicitly: pytest tests/benchmarks/bench_middleware.py -s
+'''
+import time
+
+import pytest
+from django.urls import reverse
+from rest_framework.views import APIView
+
+REPEAT = 300
+
+
+def measure(client):
+    client.get(reverse('basket'))
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        client.get(reverse('basket'))
+    return (time.perf_counter() - start) / REPEAT
+
+
+@pytest.mark.django_db
+def test_bench_middleware(api_client, auth_admin_user, orders_factory, settings, monkeypatch):
+    monkeypatch.setattr(APIView, 'throttle_classes', [])
+    user = auth_admin_user['user']
+    orders_factory(user=user, basket=user.userprofile.basket, _quantity=20)
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+
+    settings.PERFORMANCE_METRICS = {**settings.PERFORMANCE_METRICS, 'ENABLED': False}
+    plain = measure(api_client)
+    settings.PERFORMANCE_METRICS = {**settings.PERFORMANCE_METRICS, 'ENABLED': True}
+    instrumented = measure(api_client)
+    print(f'\nbasket with 20 orders: {plain * 10 ** 3:.2f}ms plain, {instrumented * 10 ** 3:.2f}ms instrumented, '
+          f'overhead {(instrumented / plain - 1) * 100:.1f}%')
+    assert instrumented < plain * 1.25
@@ -0,0 +1,49 @@
+'''
+Batch order benchmark: latency of one batch request against one request per line.
+Run explicitly: pytest tests/benchmarks/bench_order_batch.py -s
+Line counts are controlled with BENCH_ORDER_BATCH_SIZES environment variable, comma separated.
+'''
+import os
+import time
+
+import pytest
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.views import APIView
+
+from api.models import Order
+
+SIZES = [int(size) for size in os.environ.get('BENCH_ORDER_BATCH_SIZES', '1,10,100,500').split(',')]
+
+
+@pytest.mark.django_db
+def test_bench_order_batch(api_client, auth_admin_user, monkeypatch):
+    # one request per line would be throttled long before the end
+    monkeypatch.setattr(APIView, 'throttle_classes', [])
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + auth_admin_user['token'])
+
+    print()
+    timings = []
+    for size in SIZES:
+        infos = baker.make('ProductInfo', quantity=1000, reserved=0, is_active=True, _quantity=size)
+
+        start = time.perf_counter()
+        for info in infos:
+            assert api_client.post(reverse('orders'), {'product': info.id, 'quantity': 1}).status_code == 200
+        single = time.perf_counter() - start
+        Order.objects.all().delete()
+
+        start = time.perf_counter()
+        resp = api_client.post(reverse('orders_batch'), {'lines': [{'product': info.id, 'quantity': 1}
+                                                                   for info in infos]}, format='json')
+        batch = time.perf_counter() - start
+        assert resp.json()['Status']
+        Order.objects.all().delete()
+
+        timings.append((size, batch))
+        print(f'{size} lines: batch {batch * 1000:.1f}ms, one request per line {single * 1000:.1f}ms')
+
+    # small sizes are dominated by the fixed cost of a request, past it rows are written in bulk and latency
+    # grows with the number of lines, faster growth means work repeated per line like a query or a WHEN per line
+    (small_size, small_time), (large_size, large_time) = timings[-2], timings[-1]
+    assert large_time / small_time < large_size / small_size * 1.25
@@ -0,0 +1,50 @@
+'''
+Streaming parser benchmark: peak memory of walking price lists of growing size.
+Run explicitly: pytest tests/benchmarks/bench_parsers.py -s
+'''
+import io
+import time
+import tracemalloc
+
+import yaml
+
+from api.parsers import parse_price_list, YamlLoader
+
+
+def price_list_yaml(size):
+    lines = ['shop: shop', 'categories:', '  - {id: 1, name: category}', 'goods:']
+    lines += [f'  - {{id: {number}, category: 1, name: product {number}, model: model/{number}, price: 10, '
+              f'price_rrc: 12, quantity: 3, parameters: {{color: black, size: {number}}}}}' for number in range(size)]
+    return '\n'.join(lines).encode()
+
+
+def measure(function, data):
+    tracemalloc.start()
+    start = time.perf_counter()
+    function(io.BytesIO(data))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def stream(file):
+    for _ in parse_price_list(file):
+        pass
+
+
+def load(file):
+    yaml.load(file, Loader=yaml.Loader)
+
+
+def test_bench_parse_memory_is_flat():
+    print(f'\nloader: {YamlLoader.__name__}')
+    peaks = {}
+    for size in (1000, 10000):
+        data = price_list_yaml(size)
+        stream_time, stream_peak = measure(stream, data)
+        load_time, load_peak = measure(load, data)
+        peaks[size] = stream_peak
+        print(f'{size} goods: streaming {stream_time:.2f}s / {stream_peak / 2 ** 10:.0f} KiB peak, '
+              f'yaml.load {load_time:.2f}s / {load_peak / 2 ** 10:.0f} KiB peak')
+    assert peaks[10000] < peaks[1000] * 2
@@ -0,0 +1,41 @@
+'''
+Registration load test: signups per second through the registration endpoint, with the configured password
+hasher and with a fast one to show the cost of everything but hashing.
+Run explicitly: pytest tests/benchmarks/bench_registration.py -s
+Size is controlled with BENCH_SIGNUPS environment variable.
+'''
+import os
+import time
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK
+from rest_framework.views import APIView
+
+SIGNUPS = int(os.environ.get('BENCH_SIGNUPS', 50))
+
+
+def signup(api_client, prefix):
+    start = time.perf_counter()
+    with CaptureQueriesContext(connection) as queries:
+        for number in range(SIGNUPS):
+            resp = api_client.post(reverse('registration'), {
+                'first_name': 'first', 'last_name': 'last', 'email': f'{prefix}{number}@example.com',
+                'username': f'{prefix}{number}', 'password': 'asdasdasd123456789',
+            })
+            assert resp.status_code == HTTP_200_OK
+    return SIGNUPS / (time.perf_counter() - start), len(queries) / SIGNUPS
+
+
+@pytest.mark.django_db
+def test_bench_registration(api_client, settings, monkeypatch):
+    # a signup burst from one client is throttled otherwise
+    monkeypatch.setattr(APIView, 'throttle_classes', [])
+    hasher = settings.PASSWORD_HASHERS[0].rsplit('.', 1)[-1]
+    hashed_rate, queries = signup(api_client, 'hashed')
+    settings.PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+    fast_rate, _ = signup(api_client, 'fast')
+    print(f'\n{SIGNUPS} signups: {hashed_rate:.1f}/s with {hasher}, '
+          f'{fast_rate:.1f}/s with MD5 hasher, {queries:.0f} queries per signup')
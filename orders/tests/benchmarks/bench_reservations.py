@@ -0,0 +1,89 @@
+'''
+Reservation stress benchmark: threads hold and confirm one hot product info concurrently,
+stock must never be oversold. Reports throughput for growing numbers of threads.
+Run explicitly: pytest tests/benchmarks/bench_reservations.py -s
+Meaningful numbers need PostgreSQL, SQLite serializes writers and the benchmark retries on its lock errors.
+Stock and thread counts are controlled with BENCH_RESERVATION_STOCK and BENCH_RESERVATION_THREADS.
+'''
+import os
+import threading
+import time
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection, transaction, OperationalError
+from model_bakery import baker
+
+from api.inventory import reserve, commit_basket, OutOfStockError
+from api.models import Basket, Order
+
+STOCK = int(os.environ.get('BENCH_RESERVATION_STOCK', 200))
+THREADS = [int(count) for count in os.environ.get('BENCH_RESERVATION_THREADS', '1,4,8').split(',')]
+ATTEMPTS_PER_THREAD = STOCK // 2
+
+
+def retry(function, *args):
+    while True:
+        try:
+            return function(*args)
+        except OperationalError:
+            time.sleep(0.001)
+
+
+def hold(user, product_info_id):
+    '''
+    Put one item into the basket, return False when it is out of stock
+    '''
+    try:
+        with transaction.atomic():
+            order = Order.objects.create(user=user, product_id=product_info_id, quantity=1,
+                                         basket=Basket.objects.get(user__user=user))
+            reserve(order)
+    except OutOfStockError:
+        return False
+    return True
+
+
+def confirm(user):
+    with transaction.atomic():
+        basket = Basket.objects.select_for_update().get(user__user=user)
+        commit_basket(basket)
+        Order.objects.filter(basket=basket).update(basket=None)
+
+
+def run(threads, product_info_id):
+    users = [User.objects.create_user(username=f'buyer-{threads}-{number}') for number in range(threads)]
+    sold = []
+
+    def worker(user):
+        try:
+            for _ in range(ATTEMPTS_PER_THREAD):
+                if retry(hold, user, product_info_id):
+                    retry(confirm, user)
+                    sold.append(1)
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker, args=(user,)) for user in users]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return len(sold), time.perf_counter() - start
+
+
+@pytest.mark.django_db(transaction=True)
+def test_bench_reservations_no_oversell():
+    print()
+    for threads in THREADS:
+        product_info = baker.make('ProductInfo', quantity=STOCK, reserved=0)
+        sold, elapsed = run(threads, product_info.id)
+        product_info.refresh_from_db()
+
+        attempts = threads * ATTEMPTS_PER_THREAD
+        print(f'{threads} threads: {attempts} attempts, {sold} sold of {STOCK} in {elapsed:.2f}s, '
+              f'{attempts / elapsed:.0f} attempts/s')
+        assert sold == min(STOCK, attempts)
+        assert product_info.quantity == STOCK - sold
+        assert product_info.reserved == 0
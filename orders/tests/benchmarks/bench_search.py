@@ -0,0 +1,49 @@
+'''
+Search benchmark: p50/p95 latency of ranked prefix search on a synthetic catalog.
+Run explicitly: pytest tests/benchmarks/bench_search.py -s
+Catalog size is controlled with BENCH_SEARCH_SIZE environment variable (1000000 for the production estimate,
+run against PostgreSQL to measure the GIN index instead of the fallback inverted index).
+'''
+import os
+import random
+import statistics
+import time
+
+import pytest
+from django.db import connection
+
+from api.importer import CatalogImporter
+from api.search import search_products
+
+SIZE = int(os.environ.get('BENCH_SEARCH_SIZE', 20000))
+QUERIES = int(os.environ.get('BENCH_SEARCH_QUERIES', 200))
+WORDS = ['apple', 'samsung', 'xiaomi', 'phone', 'tablet', 'watch', 'black', 'white', 'pro', 'max', 'mini', 'lite']
+
+
+def synthetic_goods(size):
+    generator = random.Random(size)
+    for number in range(size):
+        words = generator.sample(WORDS, 3)
+        yield {'id': number + 1, 'category': 1, 'name': f'{" ".join(words)} {number}',
+               'model': f'{words[0]}/{number}', 'price': generator.randint(100, 1000), 'price_rrc': 1000,
+               'quantity': 10, 'parameters': {'color': generator.choice(WORDS)}}
+
+
+@pytest.mark.django_db
+def test_bench_search_latency(auth_admin_user):
+    records = [('shop', 'shop'), ('categories', {'id': 1, 'name': 'category'})]
+    records += [('goods', item) for item in synthetic_goods(SIZE)]
+    start = time.perf_counter()
+    CatalogImporter(auth_admin_user['user']).run(iter(records))
+    print(f'\n{connection.vendor}: imported and indexed {SIZE} products in {time.perf_counter() - start:.1f}s')
+
+    generator = random.Random(0)
+    latencies = []
+    for _ in range(QUERIES):
+        query = ' '.join([generator.choice(WORDS), generator.choice(WORDS)[:3]])
+        start = time.perf_counter()
+        search_products(query, 20)
+        latencies.append(time.perf_counter() - start)
+
+    quantiles = statistics.quantiles(latencies, n=20)
+    print(f'{QUERIES} queries: p50 {quantiles[9] * 1000:.1f}ms, p95 {quantiles[18] * 1000:.1f}ms')
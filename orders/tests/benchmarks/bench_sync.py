@@ -0,0 +1,49 @@
+'''
+Sync benchmark: re-upload of a price list with 1% of goods changed, full import against diff-based sync.
+Run explicitly: pytest tests/benchmarks/bench_sync.py -s
+Size is controlled with BENCH_SYNC_SIZE environment variable.
+'''
+import os
+import time
+
+import pytest
+from django.db import connection
+
+from api.importer import CatalogImporter
+
+SIZE = int(os.environ.get('BENCH_SYNC_SIZE', 10000))
+
+
+def measure(function, *args):
+    queries = []
+
+    def counter(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(counter):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+    return elapsed, len(queries)
+
+
+@pytest.mark.django_db
+def test_bench_sync_one_percent_change(auth_admin_user, price_list_factory):
+    user = auth_admin_user['user']
+    price_list = price_list_factory(goods_count=SIZE)
+    CatalogImporter(user).run(price_list)
+
+    for item in price_list['goods'][::100]:
+        item['price'] += 1
+    full_time, full_queries = measure(CatalogImporter(user).run, price_list)
+
+    for item in price_list['goods'][::100]:
+        item['quantity'] += 1
+    importer = CatalogImporter(user, sync=True)
+    sync_time, sync_queries = measure(importer.run, price_list)
+
+    print(f'\n{SIZE} goods, 1% changed: full import {full_time:.2f}s / {full_queries} queries, '
+          f'sync {sync_time:.2f}s / {sync_queries} queries, diff {importer.stats["diff"]}')
+    assert importer.stats['diff']['changed'] == len(price_list['goods'][::100])
+    assert sync_time < full_time
@@ -0,0 +1,55 @@
+'''
+Throttle benchmark: overhead per request and cache space per client of the sliding window throttle against
+REST framework UserRateThrottle keeping request history, for a small and a large rate.
+Timings are taken over the configured cache, with a local memory cache they hide the network round trip
+of the history read and write, which the sliding window replaces by an atomic increment.
+Run explicitly: pytest tests/benchmarks/bench_throttle.py -s
+'''
+import pickle
+import time
+
+from django.core.cache import cache
+from rest_framework.test import APIRequestFactory
+from rest_framework.throttling import UserRateThrottle
+
+from api.throttling import SlidingWindowThrottle
+
+RATES = (100, 10000)
+
+
+class View:
+    throttle_scope = 'bench'
+
+
+def measure(throttle_class, count):
+    '''
+    Seconds per request of a client making count requests, and bytes stored for the client
+    '''
+    request = APIRequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+    request.user = None
+    cache.clear()
+    start = time.perf_counter()
+    for _ in range(count):
+        throttle = throttle_class()
+        throttle.allow_request(request, View())
+    elapsed = (time.perf_counter() - start) / count
+    if isinstance(throttle, UserRateThrottle):
+        keys = [throttle.key]
+    else:
+        window = int(throttle.timer() // throttle.duration)
+        keys = [f'{throttle.KEY_PREFIX}bench:10.0.0.1:{window}', f'{throttle.KEY_PREFIX}bench:10.0.0.1:{window - 1}']
+    stored = sum(len(pickle.dumps(value)) for value in cache.get_many(keys).values())
+    return elapsed, stored
+
+
+def test_bench_throttle(settings):
+    print()
+    for count in RATES:
+        rate = f'{count}/min'
+        settings.REST_FRAMEWORK = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'bench': rate}}
+        # rates of REST framework throttles are read once at import
+        history, history_size = measure(type('HistoryThrottle', (UserRateThrottle,), {'rate': rate}), count)
+        sliding, sliding_size = measure(SlidingWindowThrottle, count)
+        print(f'{rate}: history {history * 10 ** 6:.1f}us and {history_size} bytes, '
+              f'sliding window {sliding * 10 ** 6:.1f}us and {sliding_size} bytes per client')
+        assert sliding_size < history_size
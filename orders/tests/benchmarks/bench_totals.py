@@ -0,0 +1,52 @@
+'''
+Totals benchmark: reading running basket totals and shop revenue against aggregating orders on the fly.
+Run explicitly: pytest tests/benchmarks/bench_totals.py -s
+Size is controlled with BENCH_TOTALS_ORDERS environment variable.
+'''
+import os
+import time
+
+import pytest
+from django.db.models import Count, F, Sum
+from model_bakery import baker
+
+from api.models import Basket, Order, ShopDailyRevenue
+from api.totals import ORDER_PRICE, verify
+
+ORDERS = int(os.environ.get('BENCH_TOTALS_ORDERS', 20000))
+REPEAT = 50
+
+
+def measure(function):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        function()
+    return (time.perf_counter() - start) / REPEAT
+
+
+@pytest.mark.django_db
+def test_bench_totals(auth_admin_user):
+    user = auth_admin_user['user']
+    basket = user.userprofile.basket
+    shop = baker.make('Shop', user=user)
+    infos = baker.make('ProductInfo', shop=shop, quantity=10 ** 6, price=100, _quantity=50)
+    confirmed_basket = baker.make('ConfirmedBasket', user=user)
+    Order.objects.bulk_create([Order(user=user, product=infos[number % len(infos)], quantity=1, price=100,
+                                     basket=basket if number % 10 == 0 else None,
+                                     confirmed_basket=None if number % 10 == 0 else confirmed_basket)
+                               for number in range(ORDERS)], batch_size=1000)
+    verify(repair=True)
+
+    basket_read = measure(lambda: Basket.objects.values_list('items', 'total').get(id=basket.id))
+    basket_aggregate = measure(lambda: Order.objects.filter(basket=basket).aggregate(
+        items=Sum('quantity'), total=Sum(ORDER_PRICE * F('quantity'))))
+    revenue_read = measure(lambda: list(ShopDailyRevenue.objects.filter(shop__user=user).values()))
+    revenue_aggregate = measure(lambda: list(Order.objects.filter(product__shop__user=user,
+                                                                  confirmed_basket__isnull=False)
+                                             .values('confirmed_basket__confirmed_at__date')
+                                             .annotate(orders=Count('id'), revenue=Sum(ORDER_PRICE * F('quantity')))))
+
+    print(f'\n{ORDERS} orders: basket total {basket_read * 1000:.2f}ms read / {basket_aggregate * 1000:.2f}ms '
+          f'aggregated, shop revenue {revenue_read * 1000:.2f}ms read / {revenue_aggregate * 1000:.2f}ms aggregated')
+    assert basket_read < basket_aggregate
+    assert revenue_read < revenue_aggregate
@@ -0,0 +1,117 @@
+'''
+Benchmark fixtures: synthetic data and benchmark fixture in the manner of pytest-benchmark,
+checking latency and query count of a scenario against the baseline recorded in baseline.json.
+Environment:
+BENCH_SCALE - data size preset of generator.SCALES, small by default
+BENCH_ROUNDS - measured rounds of a scenario
+BENCH_TOLERANCE - allowed slowdown of the median against the baseline, 1 (twice as slow) by default
+BENCH_UPDATE_BASELINE=1 - record the results as the new baseline instead of checking them
+Baselines are kept per database vendor and scale, latency baselines are only meaningful on the machine
+they were recorded on, query counts anywhere.
+'''
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+
+import pytest
+from django.db import connection
+
+from api.metrics import QueryRecorder
+from generator import DataGenerator, SCALE, SCALES
+
+BASELINE = Path(__file__).with_name('baseline.json')
+ROUNDS = int(os.environ.get('BENCH_ROUNDS', 20))
+TOLERANCE = float(os.environ.get('BENCH_TOLERANCE', 1))
+UPDATE_BASELINE = os.environ.get('BENCH_UPDATE_BASELINE') == '1'
+
+
+class Benchmark:
+    '''
+    Run a function for rounds, measuring wall time and queries of every round, and compare the median time
+    and the queries of a round with the baseline of the scenario
+    '''
+
+    def __init__(self, name, baseline):
+        self.name = name
+        self.baseline = baseline
+        self.stats = None
+
+    def __call__(self, function, *args, **kwargs):
+        return self.pedantic(function, args, kwargs)
+
+    def pedantic(self, function, args=(), kwargs=None, setup=None, rounds=ROUNDS, warmup_rounds=1):
+        '''
+        setup is called before every round outside of the measurement, it may return args and kwargs of the round
+        '''
+        timings, queries = [], []
+        for number in range(warmup_rounds + rounds):
+            if setup is not None:
+                prepared = setup()
+                if prepared is not None:
+                    args, kwargs = prepared
+            recorder = QueryRecorder()
+            with connection.execute_wrapper(recorder):
+                start = time.perf_counter()
+                result = function(*args, **(kwargs or {}))
+                elapsed = time.perf_counter() - start
+            if number >= warmup_rounds:
+                timings.append(elapsed)
+                queries.append(recorder.count)
+
+        self.stats = {
+            'rounds': rounds,
+            'min_ms': round_ms(min(timings)),
+            'median_ms': round_ms(statistics.median(timings)),
+            'max_ms': round_ms(max(timings)),
+            'queries': max(queries),
+        }
+        self.check()
+        return result
+
+    def check(self):
+        scenarios = self.baseline.setdefault(baseline_key(), {})
+        expected = scenarios.get(self.name)
+        print(f'\n{self.name}: median {self.stats["median_ms"]}ms, {self.stats["queries"]} queries'
+              + (f' (baseline {expected["median_ms"]}ms, {expected["queries"]} queries)' if expected else ''))
+        if UPDATE_BASELINE:
+            scenarios[self.name] = self.stats
+            return
+        if expected is None:
+            return
+        assert self.stats['queries'] <= expected['queries'], \
+            f'{self.name}: {self.stats["queries"]} queries per round, baseline {expected["queries"]}'
+        assert self.stats['median_ms'] <= expected['median_ms'] * (1 + TOLERANCE), \
+            f'{self.name}: median {self.stats["median_ms"]}ms, baseline {expected["median_ms"]}ms'
+
+
+def round_ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def baseline_key():
+    return f'{connection.vendor}:{SCALE}'
+
+
+@pytest.fixture(scope='session')
+def baseline():
+    data = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    yield data
+    if UPDATE_BASELINE:
+        BASELINE.write_text(json.dumps(data, indent=2, sort_keys=True) + '\n')
+
+
+@pytest.fixture
+def benchmark(request, baseline):
+    return Benchmark(request.node.name.removeprefix('test_'), baseline)
+
+
+@pytest.fixture
+def generator(db, product_info_factory, orders_factory):
+    return DataGenerator(product_info_factory, orders_factory)
+
+
+@pytest.fixture
+def dataset(generator):
+    return generator.dataset(**SCALES[SCALE])
@@ -0,0 +1,124 @@
+'''
+Synthetic data for benchmarks: catalogs of shops, categories, products, offers and parameters, users with
+tokens and orders in baskets or confirmed. Rows are prepared with the conftest factories and bulk created,
+the data is the same for the same seed.
+Size is a preset of SCALES chosen with BENCH_SCALE environment variable.
+'''
+import os
+import random
+from itertools import cycle
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+
+from api.catalog import refresh_shop_facets
+from api.models import create_profiles, Basket, Order, ProductInfo, ProductParameter
+
+SCALES = {
+    'small': {'shops': 3, 'categories': 5, 'products': 200, 'parameters': 4, 'users': 20, 'orders': 10},
+    'medium': {'shops': 10, 'categories': 20, 'products': 5000, 'parameters': 8, 'users': 200, 'orders': 20},
+    'large': {'shops': 50, 'categories': 100, 'products': 100000, 'parameters': 10, 'users': 2000, 'orders': 50},
+}
+SCALE = os.environ.get('BENCH_SCALE', 'small')
+PASSWORD = 'password'
+BATCH_SIZE = 5000
+CONFIRM_DATA = {'address': 'address', 'city': 'city', 'mail': 'новая почта', 'phone': '+38064554', 'index': 55235}
+
+
+class DataGenerator:
+    '''
+    Builds benchmark data with product_info_factory and orders_factory of tests conftest
+    '''
+
+    def __init__(self, product_info_factory, orders_factory, seed=0):
+        self.product_info_factory = product_info_factory
+        self.orders_factory = orders_factory
+        self.random = random.Random(seed)
+        self.password = make_password(PASSWORD)
+        self.users_made = 0
+
+    def users(self, count, is_staff=False):
+        '''
+        Active users with profiles, baskets and tokens, token keys are in key attribute
+        '''
+        first = self.users_made
+        self.users_made += count
+        users = User.objects.bulk_create([User(username=f'bench{number}', email=f'bench{number}@example.com',
+                                               password=self.password, is_staff=is_staff)
+                                          for number in range(first, first + count)])
+        create_profiles(users)
+        tokens = Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in users])
+        for user, token in zip(users, tokens):
+            user.key = token.key
+        return users
+
+    def catalog(self, shops, categories, products, parameters):
+        '''
+        Every product is offered by one to three shops with parameters values, facets of the shops are
+        refreshed as by the import. Returns the shops, owned by staff users, and the offers
+        '''
+        partners = self.users(shops, is_staff=True)
+        shops = baker.make('Shop', user=iter(partners), name=iter(f'shop {number}' for number in range(shops)),
+                           _quantity=shops, _bulk_create=True)
+        categories = baker.make('Category', name=iter(f'category {number}' for number in range(categories)),
+                                _quantity=categories, _bulk_create=True)
+        for category in categories:
+            category.shops.set(shops)
+        products = baker.make('Product', category=cycle(categories),
+                              name=iter(f'product {number}' for number in range(products)),
+                              _quantity=products, _bulk_create=True)
+
+        pairs = [(product, shop) for product in products
+                 for shop in self.random.sample(shops, self.random.randint(1, min(3, len(shops))))]
+        offers = ProductInfo.objects.bulk_create(self.product_info_factory(
+            product=iter(product for product, _ in pairs), shop=iter(shop for _, shop in pairs),
+            model=iter(f'model/{number}' for number in range(len(pairs))),
+            price=iter(self.random.randint(100, 10000) for _ in pairs), price_rrc=10000, quantity=10 ** 6,
+            is_active=True, _quantity=len(pairs), _save=False), batch_size=BATCH_SIZE)
+
+        parameters = baker.make('Parameter', name=iter(f'parameter {number}' for number in range(parameters)),
+                                _quantity=parameters, _bulk_create=True)
+        ProductParameter.objects.bulk_create([
+            ProductParameter(product_info=offer, parameter=parameter, value=str(self.random.randint(1, 10)))
+            for offer in offers for parameter in parameters], batch_size=BATCH_SIZE)
+        for shop in shops:
+            refresh_shop_facets(shop)
+        return shops, offers
+
+    def basket(self, user, offers, count):
+        '''
+        Orders of random offers in the basket of user, basket totals are kept in step
+        '''
+        chosen = self.random.sample(offers, min(count, len(offers)))
+        basket = user.userprofile.basket
+        orders = self.orders(chosen, user=user, basket=basket)
+        Basket.objects.filter(id=basket.id).update(items=len(chosen), total=sum(offer.price for offer in chosen))
+        return orders
+
+    def confirmed(self, user, offers, count):
+        '''
+        Confirmed basket of user with orders of random offers
+        '''
+        chosen = self.random.sample(offers, min(count, len(offers)))
+        confirmed_basket = baker.make('ConfirmedBasket', user=user, items=len(chosen),
+                                      total=sum(offer.price for offer in chosen), **CONFIRM_DATA)
+        self.orders(chosen, user=user, confirmed_basket=confirmed_basket)
+        return confirmed_basket
+
+    def orders(self, offers, **kwargs):
+        return Order.objects.bulk_create(self.orders_factory(product=iter(offers),
+                                                             price=iter(offer.price for offer in offers),
+                                                             _quantity=len(offers), _save=False, **kwargs))
+
+    def dataset(self, shops, categories, products, parameters, users, orders):
+        '''
+        Catalog and users, each with orders in the basket and one confirmed basket
+        '''
+        shops, offers = self.catalog(shops, categories, products, parameters)
+        customers = self.users(users)
+        for user in customers:
+            self.basket(user, offers, orders)
+            self.confirmed(user, offers, orders)
+        return {'shops': shops, 'offers': offers, 'users': customers}
@@ -1,9 +1,32 @@
 import pytest
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from model_bakery import baker
 
+from api.cache import response_cache, token_cache
+from api.metrics import metrics
+from orders.celery import app as celery_app
+
+
+@pytest.fixture(scope='session', autouse=True)
+def local_cache():
+    '''
+    Tests run without Redis and leave its data alone
+    '''
+    with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_caches(local_cache):
+    cache.clear()
+    response_cache.clear()
+    token_cache.clear()
+    metrics.clear()
+
 
 @pytest.fixture
 def created_user_without_password():
@@ -25,13 +48,44 @@ def api_client():
 
 @pytest.fixture
 def product_info_factory():
-    def factory(**kwargs):
-        return baker.make('ProductInfo', **kwargs)
+    def factory(_save=True, **kwargs):
+        return (baker.make if _save else baker.prepare)('ProductInfo', **kwargs)
     return factory
 
 
 @pytest.fixture
 def orders_factory():
-    def factory(**kwargs):
-        return baker.make('Order', **kwargs)
-    return factory
\ No newline at end of file
+    def factory(_save=True, **kwargs):
+        # enough stock for the order to be confirmed
+        kwargs.setdefault('quantity', 1)
+        if 'product' not in kwargs:
+            kwargs.setdefault('product__quantity', 100)
+        return (baker.make if _save else baker.prepare)('Order', **kwargs)
+    return factory
+
+@pytest.fixture
+def price_list_factory():
+    def factory(shop='shop', goods_count=3, category_id=1, first_id=1):
+        return {
+            'shop': shop,
+            'categories': [{'id': category_id, 'name': f'category {category_id}'}],
+            'goods': [{'id': first_id + number,
+                       'category': category_id,
+                       'model': f'model/{number}',
+                       'name': f'product {number}',
+                       'price': 100 + number,
+                       'price_rrc': 120 + number,
+                       'quantity': 10,
+                       'parameters': {'color': 'black', 'size': number}}
+                      for number in range(goods_count)],
+        }
+    return factory
+
+
+@pytest.fixture
+def celery_eager(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    celery_app.conf.task_always_eager = True
+    celery_app.conf.task_eager_propagates = True
+    yield
+    celery_app.conf.task_always_eager = False